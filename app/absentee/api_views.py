@@ -14,7 +14,8 @@ from action.mixin_apiview import IncompleteActionViewSet
 from action.tasks import action_check_unfinished, action_finish
 from common.enums import SubmissionType, TurnoutActionStatus
 from common.rollouts import flag_enabled_for_state
-from election.models import State, StateInformation
+from election.models import State
+from election.snapshot import get_snapshot
 from integration.lob import check_deliverable, generate_lob_token
 from official.match import get_regions_for_address
 from official.models import Region
@@ -46,23 +47,14 @@ def get_esign_method_for_region(state: State, region: Region) -> SubmissionType:
 
     # From that prioritized list, select the first one that is legal in this
     # state, and that we have the contact info for
-    state_infos = StateInformation.objects.select_related("field_type").filter(
-        field_type__slug__in=("vbm_app_submission_email", "vbm_app_submission_fax"),
-        state=state,
-    )
+    snapshot = get_snapshot()
 
-    email_allowed_for_state = any(
-        info.boolean_value()
-        for info in state_infos
-        if info.field_type.slug == "vbm_app_submission_email"
+    email_allowed_for_state = (
+        snapshot.get(state.code, "vbm_app_submission_email") is True
     )
     email_allowed_for_region = email_allowed_for_state and contact_info.email
 
-    fax_allowed_for_state = any(
-        info.boolean_value()
-        for info in state_infos
-        if info.field_type.slug == "vbm_app_submission_fax"
-    )
+    fax_allowed_for_state = snapshot.get(state.code, "vbm_app_submission_fax") is True
     fax_allowed_for_region = fax_allowed_for_state and contact_info.fax
 
     for submission_option in submission_options:
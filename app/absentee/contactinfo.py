@@ -1,10 +1,9 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
 from common import enums
-from official.models import Address
-
-from .models import LeoContactOverride
+from official.contactinfo import get_region_contact_info, get_region_contact_infos
+from official.models import Address, RegionContactInfo
 
 
 @dataclass
@@ -40,64 +39,43 @@ class AbsenteeContactInfo:
         )
 
 
-def absentee_address_score(addr: Address) -> int:
-    """
-    Returns a "score" for selecting the optimal address to tell the user to
-    contact for questions about their absentee ballot.
+def absentee_contact_info(
+    info: Optional[RegionContactInfo], skip_overrides=False
+) -> AbsenteeContactInfo:
+    contact_info = AbsenteeContactInfo()
+    if not info:
+        return contact_info
 
-    1: This is an office that accept absentee ballot forms and is a physical address
-    2: This is an office that processes absentee ballot forms
-    3: All other offices
+    contact_info.address = info.absentee_address
+    contact_info.email = info.absentee_email
+    contact_info.phone = info.absentee_phone
+    contact_info.fax = info.absentee_fax
+    if not skip_overrides:
+        if info.override_email is not None:
+            contact_info.email = info.override_email
+        if info.override_phone is not None:
+            contact_info.phone = info.override_phone
+        if info.override_fax is not None:
+            contact_info.fax = info.override_fax
+        contact_info.submission_method_override = info.submission_method_override
 
-    We prioritize physical addresses over mailing addresses because the physical
-    offices can always receive mail, and some kinds of mail (USPS express) can
-    only be delivered to the physical addresses (the mailing addresses are
-    typically PO boxes).
-    """
-    if addr.process_absentee_requests and addr.is_physical:
-        return 1
-    elif addr.process_absentee_requests:
-        return 2
-    else:
-        return 3
+    return contact_info
 
 
 def get_absentee_contact_info(
     region_external_id: int, skip_overrides=False
 ) -> AbsenteeContactInfo:
-    contact_info = AbsenteeContactInfo()
-
-    if not skip_overrides:
-        try:
-            override = LeoContactOverride.objects.get(pk=region_external_id)
-            contact_info.email = override.email
-            contact_info.fax = override.fax
-            contact_info.phone = override.phone
-            contact_info.submission_method_override = override.submission_method
-        except LeoContactOverride.DoesNotExist:
-            pass
-
-    office_addresses = sorted(
-        Address.objects.filter(office__region__external_id=region_external_id),
-        key=absentee_address_score,
+    return absentee_contact_info(
+        get_region_contact_info(region_external_id), skip_overrides
     )
 
-    # Find contact info
-    contact_info.address = next((addr for addr in office_addresses), None)
 
-    if contact_info.email is None:
-        contact_info.email = next(
-            (addr.email for addr in office_addresses if addr.email), None
-        )
-
-    if contact_info.phone is None:
-        contact_info.phone = next(
-            (addr.phone for addr in office_addresses if addr.phone), None
-        )
-
-    if contact_info.fax is None:
-        contact_info.fax = next(
-            (addr.fax for addr in office_addresses if addr.fax), None
-        )
-
-    return contact_info
+def get_absentee_contact_infos(
+    region_external_ids: Iterable[int], skip_overrides=False
+) -> Dict[int, AbsenteeContactInfo]:
+    region_external_ids = list(region_external_ids)
+    infos = get_region_contact_infos(region_external_ids)
+    return {
+        region_id: absentee_contact_info(infos.get(region_id), skip_overrides)
+        for region_id in region_external_ids
+    }
@@ -13,7 +13,7 @@ from common.i90 import get_shortened_url, shorten_url
 from common.models import DelayedTask
 from common.pdf.pdftemplate import fill_pdf_template
 from common.utils.format import StringFormatter
-from election.models import StateInformation
+from election.snapshot import get_snapshot
 from storage.models import StorageItem
 
 from .contactinfo import get_absentee_contact_info
@@ -53,19 +53,10 @@ def state_text_property(state_code: str, slug: str, lower=False) -> Optional[str
     """
     Helper to read a sigle StateInformation field
     """
-    try:
-        text = (
-            StateInformation.objects.only("field_type", "text")
-            .get(state=state_code, field_type__slug=slug)
-            .text
-        )
-
-        if lower:
-            text = text.lower()
-
-        return text
-    except StateInformation.DoesNotExist:
-        return None
+    text = get_snapshot().text(state_code, slug)
+    if text is not None and lower:
+        text = text.lower()
+    return text
 
 
 @tracer.wrap()
@@ -271,22 +262,14 @@ def prepare_formdata(
 
     # ballot tracker tool
     short_url = ""
-    try:
-        tracker_url = (
-            StateInformation.objects.only("field_type", "text")
-            .get(
-                state=ballot_request.state,
-                field_type__slug="external_tool_absentee_ballot_tracker",
-            )
-            .text
+    tracker_url = state_text_property(
+        ballot_request.state_id, "external_tool_absentee_ballot_tracker"
+    )
+    if tracker_url:
+        # use a shortened version
+        short_url = get_short_url(
+            tracker_url, f"track-ballot-{ballot_request.state_id}"
         )
-        if tracker_url:
-            # use a shortened version
-            short_url = get_short_url(
-                tracker_url, f"track-ballot-{ballot_request.state_id}"
-            )
-    except StateInformation.DoesNotExist:
-        pass
 
     form_data["external_tool_absentee_ballot_tracker"] = short_url
 
@@ -371,17 +354,9 @@ def generate_pdf_template(
         if not os.path.exists(form_path):
             form_path = f"absentee/templates/pdf/states/{state_code}.pdf"
 
-        try:
-            tracker_url = (
-                StateInformation.objects.only("field_type", "text")
-                .get(
-                    state_id=state_code,
-                    field_type__slug="external_tool_absentee_ballot_tracker",
-                )
-                .text
-            )
-        except StateInformation.DoesNotExist:
-            tracker_url = None
+        tracker_url = state_text_property(
+            state_code, "external_tool_absentee_ballot_tracker"
+        )
         if tracker_url:
             cover_path = PRINT_AND_FORWARD_COVER_SHEET_PATH
         else:
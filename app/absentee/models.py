@@ -3,6 +3,8 @@ import math
 import reversion
 from django.contrib.postgres.fields import JSONField
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from phonenumber_field.modelfields import PhoneNumberField
 
 from action.mixin_models import ActionModel
@@ -213,3 +215,23 @@ class EsignSubmitStats(models.Model):
     class Meta:
         managed = False
         ordering = ["state_id", "region__name"]
+
+
+@receiver(post_save, sender=LeoContactOverride)
+def process_leo_contact_override(sender, instance, **kwargs):
+    from official.contactinfo import rebuild_contact_info
+
+    rebuild_contact_info([instance.region_id])
+
+
+@receiver(post_delete, sender=LeoContactOverride)
+def process_leo_contact_override_delete(sender, instance, **kwargs):
+    from official.models import RegionContactInfo
+
+    # (not a rebuild: the region itself may be on its way out)
+    RegionContactInfo.objects.filter(pk=instance.region_id).update(
+        override_email=None,
+        override_phone=None,
+        override_fax=None,
+        submission_method_override=None,
+    )
@@ -0,0 +1,78 @@
+import datetime
+import logging
+from typing import List
+
+from django.db import connection
+
+from common.analytics import statsd
+from common.apm import tracer
+
+from .migrations import ACTION_DETAILS_COMPUTE_SQL
+
+logger = logging.getLogger("action")
+
+ROLLUP_COLUMNS = [
+    "finished",
+    "self_print",
+    "finish_external",
+    "finish_leo",
+    "download_total",
+    "download_count",
+    "latest_event",
+    "finish_lob",
+]
+
+MISMATCH_SQL = """
+SELECT c.action_id
+FROM ({compute}) c
+LEFT JOIN action_details d ON d.action_id = c.action_id
+WHERE d.action_id IS NULL OR ({stored}) IS DISTINCT FROM ({computed})
+"""
+
+
+@tracer.wrap()
+def find_action_details_mismatches(since: datetime.datetime = None) -> List[str]:
+    """
+    Compare action_details with a from-scratch rollup of the events, for
+    actions created or with events since the given time (or for all
+    actions).  Returns the ids of actions whose rows are missing or wrong.
+    """
+    params: List[datetime.datetime] = []
+    if since:
+        where = (
+            "a.created_at >= %s OR a.uuid IN ("
+            "SELECT action_id FROM event_tracking_event WHERE modified_at >= %s)"
+        )
+        params = [since, since]
+    else:
+        where = "true"
+
+    sql = MISMATCH_SQL.format(
+        compute=ACTION_DETAILS_COMPUTE_SQL.format(where=where),
+        stored=", ".join(f"d.{c}" for c in ROLLUP_COLUMNS),
+        computed=", ".join(f"c.{c}" for c in ROLLUP_COLUMNS),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+@tracer.wrap()
+def check_action_details(since: datetime.datetime = None, repair: bool = True) -> int:
+    mismatches = find_action_details_mismatches(since)
+    statsd.gauge("turnout.action.details.mismatches", len(mismatches))
+    if not mismatches:
+        return 0
+
+    logger.warning(
+        f"Found {len(mismatches)} inconsistent action_details rows since {since}, "
+        f"e.g. {mismatches[:10]}"
+    )
+    if repair:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT action_details_recompute(aid) FROM unnest(%s::uuid[]) aid",
+                [mismatches],
+            )
+        logger.info(f"Recomputed {len(mismatches)} action_details rows")
+    return len(mismatches)
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.17 on 2021-01-05 18:12
+
+import common.enums
+import common.fields
+from django.db import migrations
+
+# In get_source_item order, so an action with more than one source item
+# gets the same one it always has.
+BACKFILL_SQL = """
+UPDATE action_action a SET source_type = 'ballotrequest'
+FROM absentee_ballotrequest i WHERE i.action_id = a.uuid AND a.source_type IS NULL;
+
+UPDATE action_action a SET source_type = 'registration'
+FROM register_registration i WHERE i.action_id = a.uuid AND a.source_type IS NULL;
+
+UPDATE action_action a SET source_type = 'reminderrequest'
+FROM reminder_reminderrequest i WHERE i.action_id = a.uuid AND a.source_type IS NULL;
+
+UPDATE action_action a SET source_type = 'lookup'
+FROM verifier_lookup i WHERE i.action_id = a.uuid AND a.source_type IS NULL;
+
+UPDATE action_action a SET source_type = 'moverlead'
+FROM integration_moverlead i WHERE i.blank_register_forms_action_id = a.uuid AND a.source_type IS NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absentee', '0026_created_at_index_20201106_2034'),
+        ('integration', '0008_adjust_migration_names'),
+        ('register', '0023_created_at_index_20201106_2034'),
+        ('reminder', '0004_index_phone'),
+        ('verifier', '0024_created_at_index_20201106_2034'),
+        ('action', '0013_action_visible_to_subscriber'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='source_type',
+            field=common.fields.TurnoutEnumField(enum=common.enums.ActionSourceType, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.17 on 2021-01-06 16:40
+
+from django.db import migrations, models
+
+from action.migrations import (
+    ACTION_DETAILS_BACKFILL_SQL,
+    ACTION_DETAILS_CREATE_SQL,
+    ACTION_DETAILS_REVERSE_SQL,
+    ACTION_DETAILS_VIEW_CREATION_SQL,
+    ACTIONDETAIL_VIEW_CREATION_SQL,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('action', '0014_action_source_type'),
+        ('event_tracking', '0005_smalluuid_to_uuid'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    [
+                        ACTION_DETAILS_CREATE_SQL,
+                        ACTION_DETAILS_BACKFILL_SQL,
+                        ACTION_DETAILS_VIEW_CREATION_SQL,
+                    ],
+                    reverse_sql=[
+                        ACTIONDETAIL_VIEW_CREATION_SQL,
+                        ACTION_DETAILS_REVERSE_SQL,
+                    ],
+                ),
+            ],
+            state_operations=[
+                migrations.AlterModelOptions(
+                    name='actiondetails',
+                    options={},
+                ),
+                migrations.AlterModelTable(
+                    name='actiondetails',
+                    table='action_details',
+                ),
+                migrations.AddField(
+                    model_name='actiondetails',
+                    name='latest_event',
+                    field=models.DateTimeField(db_column='latest_event', null=True),
+                ),
+                migrations.AddField(
+                    model_name='actiondetails',
+                    name='finished_print_and_forward',
+                    field=models.BooleanField(db_column='finish_lob', null=True),
+                ),
+                migrations.AddField(
+                    model_name='actiondetails',
+                    name='download_total',
+                    field=models.BigIntegerField(default=0),
+                ),
+            ],
+        ),
+    ]
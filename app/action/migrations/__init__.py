@@ -35,3 +35,174 @@ FROM (
 ACTIONDETAIL_VIEW_REVERSE_SQL = """
 DROP VIEW IF EXISTS action_actiondetails;
 """
+
+# The action_details rollup table replaces the aggregate view above: it has
+# the view's columns (plus download_total, the raw count of downloads behind
+# download_count), and is kept up to date by triggers on action_action and
+# event_tracking_event.  action_actiondetails becomes a pass-through view
+# of it, so the reporting views keep working unchanged.
+
+ACTION_DETAILS_FINISHED_EVENTS = "ARRAY['Finish', 'FinishExternal', 'FinishExternalAPI', 'FinishExternalConfirmed', 'FinishLEO', 'FinishLEOFaxPending', 'FinishLEOFaxSent', 'FinishLEOFaxFailed', 'Download', 'FinishLobConfirm']"
+ACTION_DETAILS_SELF_PRINT_EVENTS = "ARRAY['FinishPrint']"
+ACTION_DETAILS_FINISH_EXTERNAL_EVENTS = "ARRAY['FinishExternal', 'FinishExternalConfirmed']"
+ACTION_DETAILS_FINISH_LEO_EVENTS = "ARRAY['FinishLEO', 'FinishLEOFaxPending', 'FinishLEOFaxSent', 'FinishLEOFaxFailed']"
+ACTION_DETAILS_FINISH_LOB_EVENTS = "ARRAY['FinishLobConfirm']"
+
+# The rollup of each action's events, as computed by the original view,
+# for the actions matching {where}
+ACTION_DETAILS_COMPUTE_SQL = f"""
+SELECT
+  action.uuid AS action_id,
+  action.events && {ACTION_DETAILS_FINISHED_EVENTS} AS finished,
+  action.events && {ACTION_DETAILS_SELF_PRINT_EVENTS} AS self_print,
+  action.events && {ACTION_DETAILS_FINISH_EXTERNAL_EVENTS} AS finish_external,
+  action.events && {ACTION_DETAILS_FINISH_LEO_EVENTS} AS finish_leo,
+  action.download_total,
+  CASE
+    WHEN action.events && {ACTION_DETAILS_SELF_PRINT_EVENTS}
+    THEN action.download_total
+    ELSE NULL
+  END AS download_count,
+  action.latest_event,
+  action.events && {ACTION_DETAILS_FINISH_LOB_EVENTS} AS finish_lob
+FROM (
+	SELECT
+	  a.uuid,
+	  COALESCE(array_agg(e.event_type) FILTER (WHERE event_type IS NOT NULL), ARRAY[]::text[]) AS events,
+	  COALESCE(COUNT(action_id) FILTER (WHERE event_type = 'Download'), 0) AS download_total,
+	  MAX(e.modified_at) AS latest_event
+	FROM
+	  action_action a
+	  LEFT JOIN
+	    event_tracking_event e
+	    ON e.action_id = a.uuid
+	WHERE {{where}}
+	GROUP BY a.uuid
+) action
+"""
+
+ACTION_DETAILS_COLUMNS = "action_id, finished, self_print, finish_external, finish_leo, download_total, download_count, latest_event, finish_lob"
+
+ACTION_DETAILS_CREATE_SQL = f"""
+CREATE TABLE action_details (
+  action_id uuid PRIMARY KEY REFERENCES action_action (uuid) ON DELETE CASCADE,
+  finished boolean NOT NULL DEFAULT false,
+  self_print boolean DEFAULT false,
+  finish_external boolean DEFAULT false,
+  finish_leo boolean DEFAULT false,
+  download_total bigint NOT NULL DEFAULT 0,
+  download_count bigint,
+  latest_event timestamp with time zone,
+  finish_lob boolean DEFAULT false
+);
+
+-- Recompute one action's row from scratch.  The row lock serializes this
+-- with concurrent incremental updates.
+CREATE OR REPLACE FUNCTION action_details_recompute(aid uuid) RETURNS void AS $$
+BEGIN
+  PERFORM 1 FROM action_details WHERE action_id = aid FOR UPDATE;
+  INSERT INTO action_details ({ACTION_DETAILS_COLUMNS})
+  {ACTION_DETAILS_COMPUTE_SQL.format(where='a.uuid = aid')}
+  ON CONFLICT (action_id) DO UPDATE SET
+    finished = EXCLUDED.finished,
+    self_print = EXCLUDED.self_print,
+    finish_external = EXCLUDED.finish_external,
+    finish_leo = EXCLUDED.finish_leo,
+    download_total = EXCLUDED.download_total,
+    download_count = EXCLUDED.download_count,
+    latest_event = EXCLUDED.latest_event,
+    finish_lob = EXCLUDED.finish_lob;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION action_details_action_inserted() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO action_details (action_id) VALUES (NEW.uuid)
+  ON CONFLICT (action_id) DO NOTHING;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New events are folded into the row incrementally; every column is a
+-- commutative update (OR, +, GREATEST), so concurrent inserts for the same
+-- action can't lose each other's changes.  Updates and deletes (which are
+-- rare) recompute the row.
+CREATE OR REPLACE FUNCTION action_details_event_changed() RETURNS trigger AS $$
+DECLARE
+  etype text;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    etype := COALESCE(NEW.event_type, '');
+    INSERT INTO action_details AS d ({ACTION_DETAILS_COLUMNS})
+    VALUES (
+      NEW.action_id,
+      etype = ANY({ACTION_DETAILS_FINISHED_EVENTS}),
+      etype = ANY({ACTION_DETAILS_SELF_PRINT_EVENTS}),
+      etype = ANY({ACTION_DETAILS_FINISH_EXTERNAL_EVENTS}),
+      etype = ANY({ACTION_DETAILS_FINISH_LEO_EVENTS}),
+      (etype = 'Download')::int,
+      CASE WHEN etype = ANY({ACTION_DETAILS_SELF_PRINT_EVENTS}) THEN 0 ELSE NULL END,
+      NEW.modified_at,
+      etype = ANY({ACTION_DETAILS_FINISH_LOB_EVENTS})
+    )
+    ON CONFLICT (action_id) DO UPDATE SET
+      finished = d.finished OR EXCLUDED.finished,
+      self_print = d.self_print OR EXCLUDED.self_print,
+      finish_external = d.finish_external OR EXCLUDED.finish_external,
+      finish_leo = d.finish_leo OR EXCLUDED.finish_leo,
+      download_total = d.download_total + EXCLUDED.download_total,
+      download_count = CASE
+        WHEN d.self_print OR EXCLUDED.self_print
+        THEN d.download_total + EXCLUDED.download_total
+        ELSE NULL
+      END,
+      latest_event = GREATEST(d.latest_event, EXCLUDED.latest_event),
+      finish_lob = d.finish_lob OR EXCLUDED.finish_lob;
+    RETURN NULL;
+  END IF;
+
+  PERFORM action_details_recompute(OLD.action_id);
+  IF TG_OP = 'UPDATE' AND NEW.action_id IS DISTINCT FROM OLD.action_id THEN
+    PERFORM action_details_recompute(NEW.action_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER action_details_action_inserted
+AFTER INSERT ON action_action
+FOR EACH ROW EXECUTE PROCEDURE action_details_action_inserted();
+
+CREATE TRIGGER action_details_event_changed
+AFTER INSERT OR UPDATE OR DELETE ON event_tracking_event
+FOR EACH ROW EXECUTE PROCEDURE action_details_event_changed();
+"""
+
+ACTION_DETAILS_BACKFILL_SQL = f"""
+INSERT INTO action_details ({ACTION_DETAILS_COLUMNS})
+{ACTION_DETAILS_COMPUTE_SQL.format(where='true')}
+ON CONFLICT (action_id) DO NOTHING;
+"""
+
+ACTION_DETAILS_VIEW_CREATION_SQL = """
+CREATE OR REPLACE VIEW action_actiondetails AS
+SELECT
+  action_id,
+  finished,
+  self_print,
+  finish_external,
+  finish_leo,
+  download_count,
+  latest_event,
+  finish_lob
+FROM action_details
+"""
+
+ACTION_DETAILS_REVERSE_SQL = """
+DROP TRIGGER IF EXISTS action_details_event_changed ON event_tracking_event;
+DROP TRIGGER IF EXISTS action_details_action_inserted ON action_action;
+DROP FUNCTION IF EXISTS action_details_event_changed();
+DROP FUNCTION IF EXISTS action_details_action_inserted();
+DROP FUNCTION IF EXISTS action_details_recompute(uuid);
+DROP TABLE IF EXISTS action_details;
+"""
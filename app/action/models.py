@@ -1,9 +1,12 @@
-from typing import Any
+from typing import Any, Iterable, List
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models import prefetch_related_objects
 
 from absentee.models import BallotRequest
+from common import enums
+from common.fields import TurnoutEnumField
 from common.utils.models import TimestampModel, UUIDModel
 from event_tracking.models import Event
 from integration.models import MoverLead
@@ -11,11 +14,41 @@ from register.models import Registration
 from reminder.models import ReminderRequest
 from verifier.models import Lookup
 
+# source type -> reverse relation from Action, in the order get_source_item
+# checks them for actions created before source_type was recorded
+SOURCE_RELATIONS = [
+    (enums.ActionSourceType.BALLOT_REQUEST, "ballotrequest"),
+    (enums.ActionSourceType.REGISTRATION, "registration"),
+    (enums.ActionSourceType.REMINDER_REQUEST, "reminderrequest"),
+    (enums.ActionSourceType.LOOKUP, "lookup"),
+    (enums.ActionSourceType.MOVER_LEAD, "moverlead_set"),
+]
+
+SOURCE_TYPES_BY_MODEL = {
+    BallotRequest: enums.ActionSourceType.BALLOT_REQUEST,
+    Registration: enums.ActionSourceType.REGISTRATION,
+    ReminderRequest: enums.ActionSourceType.REMINDER_REQUEST,
+    Lookup: enums.ActionSourceType.LOOKUP,
+    MoverLead: enums.ActionSourceType.MOVER_LEAD,
+}
+
+
+class ActionQuerySet(models.QuerySet):
+    def with_source_items(self) -> "ActionQuerySet":
+        """
+        Prefetch every action's source item, so get_source_item() doesn't
+        need a query per action.
+        """
+        return self.prefetch_related(*[name for _, name in SOURCE_RELATIONS])
+
 
 class Action(UUIDModel, TimestampModel):
     voter = models.ForeignKey("voter.Voter", null=True, on_delete=models.SET_NULL)
     last_voter_lookup = models.DateTimeField(null=True, blank=True, db_index=True)
     visible_to_subscriber = models.BooleanField(null=True, db_index=True, default=True)
+    source_type = TurnoutEnumField(enums.ActionSourceType, null=True)
+
+    objects = ActionQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
@@ -26,20 +59,46 @@ class Action(UUIDModel, TimestampModel):
     def track_event(self, event_type: Any) -> Event:
         return Event.objects.create(action=self, event_type=event_type)
 
-    def get_source_item(self):
-        for cls in BallotRequest, Registration, ReminderRequest, Lookup:
-            try:
-                return cls.objects.get(action=self)
-            except ObjectDoesNotExist:
-                pass
+    def _get_source_relation(self, name: str) -> Any:
+        if name == "moverlead_set":
+            # a foreign key, not a one-to-one; the slice is served from the
+            # prefetch cache if there is one
+            return next(iter(self.moverlead_set.all()[:1]), None)
         try:
-            return MoverLead.objects.get(blank_register_forms_action=self)
+            return getattr(self, name)
         except ObjectDoesNotExist:
-            pass
+            return None
+
+    def get_source_item(self):
+        for source_type, name in SOURCE_RELATIONS:
+            if self.source_type and self.source_type != source_type:
+                continue
+            item = self._get_source_relation(name)
+            if item is not None:
+                return item
         return None
 
+    @classmethod
+    def get_source_items(cls, actions: Iterable["Action"]) -> List[Any]:
+        """
+        Bulk version of get_source_item: one query per source type for the
+        whole batch, rather than one (or, for older actions, up to five) per
+        action.  Returns the source items, in the order of the actions that
+        have one, each with its action already attached.
+        """
+        actions = list(actions)
+        prefetch_related_objects(actions, *[name for _, name in SOURCE_RELATIONS])
+        items = [action.get_source_item() for action in actions]
+        return [item for item in items if item is not None]
+
 
 class ActionDetails(models.Model):
+    """
+    Rollup of each action's events.  Rows are maintained by triggers on
+    action_action and event_tracking_event (see action.migrations), and
+    checked by action.tasks.check_action_details.
+    """
+
     action = models.OneToOneField(
         "action.Action",
         on_delete=models.DO_NOTHING,
@@ -55,6 +114,8 @@ class ActionDetails(models.Model):
     total_downloads = models.IntegerField(null=True, db_column="download_count")
     latest_event = models.DateTimeField(null=True, db_column="latest_event")
     finished_print_and_forward = models.BooleanField(null=True, db_column="finish_lob")
+    # downloads, regardless of self_print
+    download_total = models.BigIntegerField(default=0)
 
     class Meta:
-        managed = False
+        db_table = "action_details"
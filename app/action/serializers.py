@@ -10,7 +10,7 @@ from common import enums
 from common.apm import tracer
 from multi_tenant.mixins_serializers import SubscriberSerializerMixin
 
-from .models import Action
+from .models import SOURCE_TYPES_BY_MODEL, Action
 
 if TYPE_CHECKING:
     from rest_framework.utils.model_meta import FieldInfo
@@ -30,7 +30,8 @@ class ActionSerializer(
 
     def create(self, validated_data: Dict[(str, Any)]) -> "Model":
         validated_data["action"] = Action.objects.create(
-            visible_to_subscriber=self.request_subscriber().plan_has_data_access()
+            visible_to_subscriber=self.request_subscriber().plan_has_data_access(),
+            source_type=SOURCE_TYPES_BY_MODEL.get(self.Meta.model),
         )
         return super().create(validated_data)
 
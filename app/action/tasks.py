@@ -1,3 +1,5 @@
+import datetime
+
 from celery import shared_task
 from django.conf import settings
 
@@ -5,7 +7,7 @@ from action.models import Action
 from common.enums import EventType
 from common.i90 import shorten_url
 from common.rollouts import get_feature_bool
-from election.models import StateInformation
+from election.snapshot import get_snapshot
 from event_tracking.models import Event
 from integration.tasks import sync_action_to_actionnetwork
 from smsbot.tasks import _send_welcome_sms, send_welcome_sms
@@ -70,7 +72,6 @@ def action_check_unfinished(action_pk: str) -> None:
     else:
         voter_lookup_action.delay(action_pk)
 
-    item = action.get_source_item()
     if item.phone and get_feature_bool("drip", "action_unfinished"):
         n = _send_welcome_sms(str(item.phone))
         if not n:
@@ -84,9 +85,7 @@ def action_check_unfinished(action_pk: str) -> None:
 
         if "BallotRequest" in str(type(item)):
             # no need to nag in vbm_universal states
-            if StateInformation.objects.filter(
-                state=item.state, field_type__slug="vbm_universal", text="True",
-            ).exists():
+            if get_snapshot().text(item.state_id, "vbm_universal") == "True":
                 return
 
             what = "requesting your absentee ballot"
@@ -103,3 +102,17 @@ def action_check_unfinished(action_pk: str) -> None:
         n.send_sms(
             f"If you weren't able to finish {what}, please visit {shorten_url(url)}"
         )
+
+
+@shared_task
+def check_action_details(days: int = None) -> None:
+    from .details import check_action_details
+
+    if days is None:
+        days = settings.ACTION_DETAILS_CHECK_DAYS
+    since = None
+    if days:
+        since = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(
+            days=days
+        )
+    check_action_details(since)
@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+from model_bakery import baker
+
+from action.details import check_action_details, find_action_details_mismatches
+from action.models import ActionDetails
+from common import enums
+from event_tracking.models import Event
+
+
+@pytest.mark.django_db
+def test_new_action():
+    action = baker.make_recipe("action.action")
+
+    details = ActionDetails.objects.get(action=action)
+    assert details.finished is False
+    assert details.self_print is False
+    assert details.total_downloads is None
+    assert details.latest_event is None
+
+
+@pytest.mark.django_db
+def test_incremental_downloads():
+    action = baker.make_recipe("action.action")
+    action.track_event(enums.EventType.DOWNLOAD)
+    action.track_event(enums.EventType.FINISH_SELF_PRINT)
+    event = action.track_event(enums.EventType.DOWNLOAD)
+
+    details = ActionDetails.objects.get(action=action)
+    assert details.finished is True
+    assert details.self_print is True
+    assert details.download_total == 2
+    assert details.total_downloads == 2
+    assert details.latest_event == Event.objects.get(pk=event.pk).modified_at
+
+    Event.objects.filter(pk=event.pk).delete()
+    details.refresh_from_db()
+    assert details.total_downloads == 1
+
+    assert find_action_details_mismatches() == []
+
+
+@pytest.mark.django_db
+def test_check_action_details():
+    action = baker.make_recipe("action.action")
+    action.track_event(enums.EventType.FINISH_LOB_CONFIRM)
+    other = baker.make_recipe("action.action")
+
+    ActionDetails.objects.filter(action=action).update(finished=False)
+    ActionDetails.objects.filter(action=other).delete()
+
+    since = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=1)
+    assert sorted(find_action_details_mismatches(since)) == sorted(
+        [action.pk, other.pk]
+    )
+    assert check_action_details(since) == 2
+
+    assert ActionDetails.objects.get(action=action).finished is True
+    assert ActionDetails.objects.filter(action=other).exists()
+    assert check_action_details() == 0
@@ -1,7 +1,7 @@
 import pytest
 from model_bakery import baker
 
-from action.models import ActionDetails
+from action.models import Action, ActionDetails
 from common import enums
 from event_tracking.models import Event
 
@@ -91,3 +91,42 @@ def test_finished_download():
     assert actiondetail.finished_external_service == False
     assert actiondetail.leo_message_sent == False
     assert actiondetail.total_downloads == 2
+
+
+@pytest.mark.django_db
+def test_get_source_item(django_assert_num_queries):
+    registration = baker.make_recipe(
+        "register.registration",
+        action__source_type=enums.ActionSourceType.REGISTRATION,
+    )
+    action = Action.objects.get(pk=registration.action_id)
+    with django_assert_num_queries(1):
+        assert action.get_source_item() == registration
+
+
+@pytest.mark.django_db
+def test_get_source_item_untyped():
+    registration = baker.make_recipe("register.registration")
+    assert registration.action.source_type is None
+
+    action = Action.objects.get(pk=registration.action_id)
+    assert action.get_source_item() == registration
+    assert baker.make_recipe("action.action").get_source_item() is None
+
+
+@pytest.mark.django_db
+def test_with_source_items(django_assert_num_queries):
+    registrations = baker.make_recipe("register.registration", _quantity=3)
+    ballot_request = baker.make_recipe("absentee.ballot_request")
+    baker.make_recipe("action.action")
+
+    # the actions, plus one query per source type
+    with django_assert_num_queries(6):
+        actions = list(Action.objects.with_source_items())
+        items = {action.pk: action.get_source_item() for action in actions}
+
+    assert len(items) == 5
+    for registration in registrations:
+        assert items[registration.action_id] == registration
+    assert items[ballot_request.action_id] == ballot_request
+    assert list(items.values()).count(None) == 1
@@ -0,0 +1,16 @@
+import logging
+
+from celery import shared_task
+
+from .utils import flush_purges
+
+logger = logging.getLogger("cdn")
+
+
+@shared_task(
+    autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 5}
+)
+def flush_cdn_purges():
+    purged = flush_purges()
+    if purged:
+        logger.info(f"Purged {purged} cache tags")
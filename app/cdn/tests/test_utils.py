@@ -1,6 +1,8 @@
 import pytest
 from model_bakery import baker
 
+from cdn.utils import flush_purges, purge_cdn_tags
+
 
 @pytest.mark.django_db
 def test_purge_cdn_tags(settings, mocker):
@@ -11,6 +13,8 @@ def test_purge_cdn_tags(settings, mocker):
     mock_cloudflare_api_client = mocker.Mock()
     cloudflare_patch = mocker.patch("cdn.utils.CloudFlare")
     cloudflare_patch.CloudFlare.return_value = mock_cloudflare_api_client
+    # if we can't queue purges, they go out right away
+    mocker.patch("cdn.utils.get_redis_connection", side_effect=Exception("down"))
 
     information = baker.make_recipe("election.markdown_information")
 
@@ -40,8 +44,43 @@ def test_purge_cdn_tags(settings, mocker):
 def test_cloudflare_disabled(settings, mocker):
     settings.CLOUDFLARE_ENABLED = False
     cloudflare_patch = mocker.patch("cdn.utils.CloudFlare")
+    mocker.patch("cdn.utils.get_redis_connection", side_effect=Exception("down"))
     information = baker.make_recipe("election.markdown_information")
     information.text = "New Text"
     information.save()
 
     assert not cloudflare_patch.CloudFlare.called
+
+
+def test_purge_cdn_tags_queued(settings, mocker):
+    settings.CDN_PURGE_DEBOUNCE_SECONDS = 10
+    conn = mocker.patch("cdn.utils.get_redis_connection").return_value
+    cache = mocker.patch("cdn.utils.cache")
+    cache.add.side_effect = [True, False]
+    send = mocker.patch("cdn.utils.send_cdn_purge")
+    flush = mocker.patch("cdn.tasks.flush_cdn_purges")
+
+    purge_cdn_tags(["state", "XX"])
+    purge_cdn_tags(["XX"])
+
+    assert conn.zadd.call_count == 2
+    assert set(conn.zadd.call_args_list[0][0][1]) == {"topyteststate", "topytestxx"}
+    # only the first purge schedules a flush
+    flush.apply_async.assert_called_once_with(countdown=10)
+    send.assert_not_called()
+
+
+def test_flush_purges(settings, mocker):
+    settings.CLOUDFLARE_PURGE_MAX_TAGS = 2
+    conn = mocker.patch("cdn.utils.get_redis_connection").return_value
+    conn.pipeline.return_value.execute.return_value = [
+        [(b"topytesta", 1.0), (b"topytestb", 2.0), (b"topytestc", 3.0)],
+        1,
+    ]
+    send = mocker.patch("cdn.utils.send_cdn_purge")
+
+    assert flush_purges() == 3
+    assert [c[0][0] for c in send.call_args_list] == [
+        ["topytesta", "topytestb"],
+        ["topytestc"],
+    ]
@@ -1,15 +1,29 @@
+# CDN cache purges.
+#
+# Saving content purges the cache tags that depend on it, but we don't
+# purge right away: tags are queued in redis (a sorted set, scored by when
+# each was first queued) and, CDN_PURGE_DEBOUNCE_SECONDS after the first
+# of them, flush_purges() sends them all, de-duplicated and in as few
+# requests as Cloudflare allows.  So a bulk edit in the admin makes a
+# purge request or two (from a worker), not one per row (in the request).
 import logging
-from typing import Iterable
+import time
+from typing import Iterable, List
 
 import CloudFlare
 from django.conf import settings
+from django.core.cache import cache
 from django.template.defaultfilters import slugify
+from django_redis import get_redis_connection
 
 from common.analytics import statsd
 from common.apm import tracer
 
 logger = logging.getLogger("cdn")
 
+PENDING_KEY = "cdn_purge:pending"
+SCHEDULED_KEY = "cdn_purge:scheduled"
+
 
 def generate_scoped_tag(raw_tag):
     """
@@ -22,8 +36,7 @@ def generate_scoped_tag(raw_tag):
 
 
 @statsd.timed("turnout.cdn.purge_tags")
-def purge_cdn_tags(tags: Iterable[str]) -> None:
-    final_tags = [generate_scoped_tag(tag) for tag in tags]
+def send_cdn_purge(final_tags: List[str]) -> None:
     extra = {
         "tags": final_tags,
     }
@@ -36,7 +49,63 @@ def purge_cdn_tags(tags: Iterable[str]) -> None:
         cf.zones.purge_cache.delete(
             identifier1=settings.CLOUDFLARE_ZONE, data={"tags": final_tags}
         )
+    statsd.increment("turnout.cdn.purge.requests")
+    statsd.increment("turnout.cdn.purge.tags", len(final_tags))
+
+
+def purge_cdn_tags(tags: Iterable[str]) -> None:
+    final_tags = [generate_scoped_tag(tag) for tag in tags]
+    if not final_tags:
+        return
+
+    try:
+        get_redis_connection("default").zadd(
+            cache.make_key(PENDING_KEY),
+            {tag: time.time() for tag in final_tags},
+            nx=True,
+        )
+        schedule = cache.add(SCHEDULED_KEY, True, settings.CDN_PURGE_DEBOUNCE_SECONDS)
+    except Exception as e:
+        logger.warning(f"Unable to queue cache tag purge, purging now: {e}")
+        send_cdn_purge(final_tags)
+        return
+    statsd.increment("turnout.cdn.purge.queued", len(final_tags))
+
+    if schedule:
+        from .tasks import flush_cdn_purges
+
+        flush_cdn_purges.apply_async(countdown=settings.CDN_PURGE_DEBOUNCE_SECONDS)
 
 
 def purge_cdn_tag(tag: str) -> None:
     purge_cdn_tags([tag])
+
+
+def flush_purges() -> int:
+    """
+    Purge all of the queued tags.  Returns the number of tags purged.
+    """
+    conn = get_redis_connection("default")
+    key = cache.make_key(PENDING_KEY)
+
+    # tags queued from here on need another flush
+    cache.delete(SCHEDULED_KEY)
+    pipe = conn.pipeline(transaction=True)
+    pipe.zrange(key, 0, -1, withscores=True)
+    pipe.delete(key)
+    pending, _ = pipe.execute()
+    if not pending:
+        return 0
+
+    oldest = min(queued_at for _, queued_at in pending)
+    batch_size = settings.CLOUDFLARE_PURGE_MAX_TAGS
+    for i in range(0, len(pending), batch_size):
+        try:
+            send_cdn_purge([tag.decode() for tag, _ in pending[i : i + batch_size]])
+        except Exception:
+            # put back what we didn't get to
+            conn.zadd(key, dict(pending[i:]), nx=True)
+            raise
+
+    statsd.timing("turnout.cdn.purge.latency", (time.time() - oldest) * 1000)
+    return len(pending)
@@ -28,11 +28,5 @@ class FilterTrivialResource(object):
 
 tracer = TurnoutTracer()
 tracer.configure(
-    settings={
-        "FILTERS": [
-            FilterTrivialResource("common.tasks.enqueue_tokens"),
-            FilterTrivialResource("common.tasks.process_token"),
-            ddtrace.filters.FilterRequestsOnUrl(r".+/-/health/$"),
-        ],
-    }
+    settings={"FILTERS": [ddtrace.filters.FilterRequestsOnUrl(r".+/-/health/$")]}
 )
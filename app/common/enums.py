@@ -189,6 +189,14 @@ class ToolName(Enum, metaclass=EnumMeta):
         LEO = "LEO"
 
 
+class ActionSourceType(Enum, metaclass=EnumMeta):
+    BALLOT_REQUEST = "ballotrequest"
+    REGISTRATION = "registration"
+    REMINDER_REQUEST = "reminderrequest"
+    LOOKUP = "lookup"
+    MOVER_LEAD = "moverlead"
+
+
 class ReportType(Enum, metaclass=EnumMeta):
     VERIFY = "verify"
     REGISTER = "register"
@@ -202,6 +210,15 @@ class ReportType(Enum, metaclass=EnumMeta):
         LOCATOR = "Locator Tool Export"
 
 
+class ReportFormat(Enum, metaclass=EnumMeta):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+    class Labels:
+        CSV = "CSV"
+        PARQUET = "Parquet (typed, compressed)"
+
+
 class ReportStatus(Enum, metaclass=EnumMeta):
     PENDING = "Pending"
     COMPLETE = "Complete"
@@ -293,6 +310,15 @@ class BlastType(Enum, metaclass=EnumMeta):
         MMS_MAP = "MMS map"
 
 
+class BlastRecipientStatus(Enum, metaclass=EnumMeta):
+    PENDING = "pending"
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+
 class SubscriberPlan(Enum, metaclass=EnumMeta):
     FREE = "free"
     PREMIUM = "premium"
@@ -302,3 +328,9 @@ class SubscriberPlan(Enum, metaclass=EnumMeta):
         FREE = "Free"
         PREMIUM = "Premium"
         NONPROFIT = "Nonprofit"
+
+
+class SyncChangeAction(Enum, metaclass=EnumMeta):
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
@@ -1,20 +1,31 @@
+import datetime
+import hashlib
+import json
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
 from urllib.parse import urlencode
 
-import requests
 import sentry_sdk
 from django.conf import settings
-from django.db import utils
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from django.core.cache import cache
+from shapely.geometry import Point, Polygon
+from shapely.prepared import prep
 
 from common.analytics import statsd
 from common.apm import tracer
-from official.models import RegionGeomMA, RegionGeomWI
+from common.http import get_session
+from official import region_geom
 
 API_ENDPOINT = "https://api.geocod.io/v1.5/geocode"
 
+# how many keys to look up in the db (durable cache) at once
+CACHE_QUERY_CHUNK_SIZE = 1000
+
+# (results, error) for one address of a batch
+BatchResult = Tuple[Optional[List[Dict[str, Any]]], Optional[str]]
+
 ODD_STREET_NUMBER_RE = re.compile(r"^(\d+)[a-zA-Z]+$")
 
 
@@ -25,10 +36,6 @@ class GeocodioAPIError(Exception):
     pass
 
 
-class GISDataError(Exception):
-    pass
-
-
 def strip_address_number_alpha_suffix(address: str) -> str:
     """
     Remove any alpha suffix from the street number ("40A St Paul St" ->
@@ -46,11 +53,135 @@ def strip_address_number_alpha_suffix(address: str) -> str:
     return " ".join(ls)
 
 
-@tracer.wrap()
-def geocode(**kwargs):
-    RETRIES = 2
-    TIMEOUT = 6.0  # seems to be enough to handle slow apartment build queries
+def normalize_geocode_args(args: Dict[str, str]) -> Dict[str, str]:
+    """
+    Normalize geocode.io query args so that trivially different spellings
+    of the same address share a cache entry.
+    """
+    r = {}
+    for k, v in args.items():
+        if v is None:
+            continue
+        v = " ".join(str(v).lower().split())
+        if k == "fields":
+            v = ",".join(sorted(f.strip() for f in v.split(",") if f.strip()))
+        r[k] = v
+    return r
+
+
+def geocode_cache_key(args: Dict[str, str]) -> str:
+    normalized = json.dumps(normalize_geocode_args(args), sort_keys=True)
+    return f"geocode_{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+
+def geocode_cache_get(key: str) -> Tuple[bool, Optional[List[Dict[str, Any]]]]:
+    """
+    Returns (hit, results).  A hit with results of None is a cached
+    bogus address.
+    """
+    from .models import GeocodeResult
+
+    entry = cache.get(key)
+    if entry is not None:
+        statsd.increment("turnout.common.geocode.cache_hit")
+        return True, entry["results"]
+
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    row = GeocodeResult.objects.filter(key=key, expires_at__gt=now).first()
+    if row:
+        statsd.increment("turnout.common.geocode.cache_hit_db")
+        cache.set(
+            key,
+            {"results": row.results},
+            max(int((row.expires_at - now).total_seconds()), 1),
+        )
+        return True, row.results
+
+    statsd.increment("turnout.common.geocode.cache_miss")
+    return False, None
+
+
+def geocode_cache_set(key: str, results: Optional[List[Dict[str, Any]]]) -> None:
+    from .models import GeocodeResult
+
+    if results:
+        ttl = settings.GEOCODE_CACHE_TTL_SECONDS
+    else:
+        ttl = settings.GEOCODE_CACHE_NEGATIVE_TTL_SECONDS
+    cache.set(key, {"results": results}, ttl)
+    GeocodeResult.objects.update_or_create(
+        key=key,
+        defaults={
+            "results": results,
+            "expires_at": datetime.datetime.now(tz=datetime.timezone.utc)
+            + datetime.timedelta(seconds=ttl),
+        },
+    )
+
+
+def geocode_cache_get_many(
+    keys: Collection[str],
+) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+    """
+    Like geocode_cache_get(), for many keys at once; returns the results
+    for the keys that were hits.
+    """
+    from .models import GeocodeResult
 
+    found = {key: entry["results"] for key, entry in cache.get_many(keys).items()}
+    statsd.increment("turnout.common.geocode.cache_hit", len(found))
+
+    missing = [key for key in keys if key not in found]
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    for i in range(0, len(missing), CACHE_QUERY_CHUNK_SIZE):
+        rows = list(
+            GeocodeResult.objects.filter(
+                key__in=missing[i : i + CACHE_QUERY_CHUNK_SIZE], expires_at__gt=now
+            )
+        )
+        if not rows:
+            continue
+        statsd.increment("turnout.common.geocode.cache_hit_db", len(rows))
+        ttl = min(int((row.expires_at - now).total_seconds()) for row in rows)
+        cache.set_many({row.key: {"results": row.results} for row in rows}, max(ttl, 1))
+        found.update({row.key: row.results for row in rows})
+
+    statsd.increment("turnout.common.geocode.cache_miss", len(keys) - len(found))
+    return found
+
+
+def geocode_cache_set_many(entries: Dict[str, Optional[List[Dict[str, Any]]]]) -> None:
+    from .models import GeocodeResult
+
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    rows = []
+    for ttl, group in (
+        (settings.GEOCODE_CACHE_TTL_SECONDS, {k: v for k, v in entries.items() if v}),
+        (
+            settings.GEOCODE_CACHE_NEGATIVE_TTL_SECONDS,
+            {k: v for k, v in entries.items() if not v},
+        ),
+    ):
+        if not group:
+            continue
+        cache.set_many({k: {"results": v} for k, v in group.items()}, ttl)
+        expires_at = now + datetime.timedelta(seconds=ttl)
+        rows += [
+            GeocodeResult(key=k, results=v, expires_at=expires_at)
+            for k, v in group.items()
+        ]
+
+    keys = list(entries)
+    for i in range(0, len(keys), CACHE_QUERY_CHUNK_SIZE):
+        GeocodeResult.objects.filter(
+            key__in=keys[i : i + CACHE_QUERY_CHUNK_SIZE]
+        ).delete()
+    GeocodeResult.objects.bulk_create(
+        rows, batch_size=CACHE_QUERY_CHUNK_SIZE, ignore_conflicts=True
+    )
+
+
+def geocode_args(kwargs: Dict[str, Any]) -> Dict[str, str]:
     args = {}
     for k in ["street", "city", "state", "q", "fields"]:
         if k in kwargs:
@@ -60,16 +191,155 @@ def geocode(**kwargs):
                 args[k] = kwargs[k]
     if "zipcode" in kwargs:
         args["postal_code"] = kwargs["zipcode"]
+    return args
+
+
+@tracer.wrap()
+def geocode(**kwargs):
+    args = geocode_args(kwargs)
+
+    if not settings.GEOCODE_CACHE_ENABLED:
+        _, results = geocode_request(args)
+        return results
+
+    key = geocode_cache_key(args)
+    hit, results = geocode_cache_get(key)
+    if hit:
+        return results
+
+    cacheable, results = geocode_request(args)
+    if cacheable:
+        geocode_cache_set(key, results)
+    return results
+
+
+@tracer.wrap()
+def geocode_batch(queries: Sequence[Dict[str, Any]]) -> List[BatchResult]:
+    """
+    Geocode many addresses at once.  Each query takes the same arguments
+    as geocode().  Returns (results, error) for each query, in order;
+    results is None (and error says why) if it couldn't be geocoded.
+
+    Cache misses are sent to geocod.io's batch endpoint,
+    GEOCODE_BATCH_SIZE addresses per request, with up to
+    GEOCODE_BATCH_CONCURRENCY requests in flight at once.
+    """
+    keys = []
+    misses: Dict[str, Dict[str, str]] = {}
+    for query in queries:
+        args = geocode_args(query)
+        key = geocode_cache_key(args)
+        keys.append(key)
+        misses[key] = args
+
+    answers: Dict[str, BatchResult] = {}
+    if settings.GEOCODE_CACHE_ENABLED:
+        for key, results in geocode_cache_get_many(list(misses)).items():
+            answers[key] = (results, None if results else "Unable to geocode")
+            del misses[key]
+
+    # addresses with different fields go in different requests
+    by_fields: Dict[Optional[str], List[Tuple[str, Dict[str, str]]]] = {}
+    for key, args in misses.items():
+        fields = args.pop("fields", None)
+        by_fields.setdefault(fields, []).append((key, args))
+    jobs = [
+        (fields, items[i : i + settings.GEOCODE_BATCH_SIZE])
+        for fields, items in by_fields.items()
+        for i in range(0, len(items), settings.GEOCODE_BATCH_SIZE)
+    ]
+
+    cacheable = {}
+    if jobs:
+        with ThreadPoolExecutor(
+            max_workers=min(len(jobs), settings.GEOCODE_BATCH_CONCURRENCY)
+        ) as executor:
+            for batch in executor.map(lambda job: geocode_batch_request(*job), jobs):
+                for key, (can_cache, results, error) in batch.items():
+                    answers[key] = (results, error)
+                    if can_cache:
+                        cacheable[key] = results
+    if settings.GEOCODE_CACHE_ENABLED and cacheable:
+        geocode_cache_set_many(cacheable)
+
+    return [answers[key] for key in keys]
+
+
+def batch_query(args: Dict[str, str]) -> Any:
+    if "q" in args:
+        return args["q"]
+    return {k: v for k, v in args.items() if v is not None}
+
+
+def geocode_batch_request(
+    fields: Optional[str], items: List[Tuple[str, Dict[str, str]]]
+) -> Dict[str, Tuple[bool, Optional[List[Dict[str, Any]]], Optional[str]]]:
+    """
+    Query geocod.io's batch endpoint for (key, args) items.  Returns
+    (cacheable, results, error) by key.
+    """
+    params = {"api_key": settings.GEOCODIO_KEY}
+    if fields:
+        params["fields"] = fields
+    url = f"{API_ENDPOINT}?{urlencode(params)}"
+    body = {key: batch_query(args) for key, args in items}
+
+    statsd.increment("turnout.common.geocode.batch_addresses", len(items))
+    with statsd.timed("turnout.common.geocode.geocode_batch"):
+        try:
+            with tracer.trace("geocode_batch", service="geocodioclient"):
+                r = get_session("geocodio_batch").post(url, json=body)
+        except Exception as e:
+            extra = {"url": API_ENDPOINT, "count": len(items), "exception": str(e)}
+            logger.warning(
+                "Error batch querying geocodio for %(count)s addresses, exception %(exception)s",
+                extra,
+                extra=extra,
+            )
+            sentry_sdk.capture_exception(
+                GeocodioAPIError(f"Error querying {API_ENDPOINT}, exception {str(e)}")
+            )
+            return {key: (False, None, "Error querying geocod.io") for key in body}
+    if r.status_code != 200:
+        extra = {"url": API_ENDPOINT, "count": len(items), "status_code": r.status_code}
+        logger.warning(
+            "Error batch querying geocodio for %(count)s addresses, status code %(status_code)s",
+            extra,
+            extra=extra,
+        )
+        sentry_sdk.capture_exception(
+            GeocodioAPIError(
+                f"Error querying {API_ENDPOINT}, status code {r.status_code}"
+            )
+        )
+        error = f"Error querying geocod.io, status code {r.status_code}"
+        return {key: (False, None, error) for key in body}
+
+    answers = {}
+    batch = r.json().get("results", {})
+    for key in body:
+        response = batch.get(key, {}).get("response", {})
+        if "results" not in response:
+            # e.g., an address geocod.io rejected as bogus, like a 422
+            answers[key] = (True, None, response.get("error", "Unable to geocode"))
+        else:
+            results = response["results"]
+            answers[key] = (True, results, None if results else "No results")
+    return answers
+
+
+def geocode_request(
+    args: Dict[str, str]
+) -> Tuple[bool, Optional[List[Dict[str, Any]]]]:
+    """
+    Query geocod.io.  Returns (cacheable, results); errors that might go
+    away on retry are not cacheable.
+    """
     url = f"{API_ENDPOINT}?{urlencode({**args, 'api_key': settings.GEOCODIO_KEY})}"
     with statsd.timed("turnout.common.geocode.geocode", sample_rate=0.2):
-        retries = Retry(
-            total=RETRIES, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
-        )
-        http = requests.Session()
-        http.mount("https://", HTTPAdapter(max_retries=retries))
         try:
             with tracer.trace("geocode", service="geocodioclient"):
-                r = http.get(url, timeout=TIMEOUT)
+                r = get_session("geocodio").get(url)
         except Exception as e:
             extra = {"url": API_ENDPOINT, "api_args": str(args), "exception": str(e)}
             logger.warning(
@@ -80,7 +350,7 @@ def geocode(**kwargs):
             sentry_sdk.capture_exception(
                 GeocodioAPIError(f"Error querying {API_ENDPOINT}, exception {str(e)}")
             )
-            return None
+            return False, None
     if r.status_code != 200:
         extra = {
             "url": API_ENDPOINT,
@@ -92,176 +362,155 @@ def geocode(**kwargs):
             extra,
             extra=extra,
         )
-        if r.status_code != 422:  # we get this from bogus addresses
-            sentry_sdk.capture_exception(
-                GeocodioAPIError(
-                    f"Error querying {API_ENDPOINT}, status code {r.status_code}"
-                )
+        if r.status_code == 422:  # we get this from bogus addresses
+            return True, None
+        sentry_sdk.capture_exception(
+            GeocodioAPIError(
+                f"Error querying {API_ENDPOINT}, status code {r.status_code}"
             )
-        return None
-    return r.json().get("results", None)
+        )
+        return False, None
+    return True, r.json().get("results", None)
 
 
 def wi_location_to_mcd(location):
     """
-    query API with official WI state data as of jan 2020
+    look up the location in official WI state data as of jan 2020
     see: https://data-ltsb.opendata.arcgis.com/datasets/wi-cities-towns-and-villages-january-2020/geoservice
 
-    This same data set can be imported; see scripts/import_region_geom.sh
+    This same data set can be imported; see importgisdata
     """
-    try:
-        mcds = list(RegionGeomWI.objects.filter(geom__intersects=location))
-        if mcds:
-            return mcds[0].mcd_name.title()
-    except utils.ProgrammingError:
-        # table doesn't exist; fall back to querying the API below
-        logger.warning(f"Table official_region_geom_wi does not exist")
-        sentry_sdk.capture_exception(
-            GISDataError(f"Table official_region_geom_wi does not exist")
-        )
-    return None
+    mcd = region_geom.lookup("wi_mcd", location)
+    return mcd.title() if mcd else None
 
 
 def ma_location_to_mcd(location):
     """
-    query API with official MA state data as of fall 2018
+    look up the location in official MA state data as of fall 2018
     see:
       https://www.arcgis.com/home/item.html?id=e847265dcae6420f97b9eb55730a81df
       https://services.arcgis.com/40CMVGZPtmu7aNof/arcgis/rest/services/Massachusetts_Wards_and_Precincts/FeatureServer/0
 
-    This same data set can be imported; see scripts/import_region_geom.sh
+    This same data set can be imported; see importgisdata
     """
-    try:
-        precincts = list(RegionGeomMA.objects.filter(geom__intersects=location))
-        if precincts:
-            return precincts[0].town.title()
-    except utils.ProgrammingError:
-        # table doesn't exist; fall back to querying the API below
-        logger.warning(f"Table official_region_geom_ma does not exist")
-        sentry_sdk.capture_exception(
-            GISDataError(f"Table official_region_geom_ma does not exist")
-        )
-    return None
+    town = region_geom.lookup("ma_town", location)
+    return town.title() if town else None
 
 
-def al_jefferson_county_bessemer_division(location):
-    """
-    Given a point that is within Jefferson county, True if Bessemer division, False if Birmingham division.
-    """
-    from shapely.geometry import Point, Polygon
-
-    # bessemer cutoff from https://gis.jccal.org/arcgis/rest/services/Political/BessemerCutOff/MapServer/0/query
-    bessemer_cutoff = [
-        (-87.202590939145551, 33.570360872366507),
-        (-87.197031114413534, 33.570403784258737),
-        (-87.179598771244613, 33.570114693254951),
-        (-87.170204761542934, 33.570028514834412),
-        (-87.162295364843828, 33.56993103713922),
-        (-87.153303858487689, 33.569940850545869),
-        (-87.144483504998163, 33.569923694535859),
-        (-87.135671512539616, 33.569772027969861),
-        (-87.126883755627532, 33.569583834911398),
-        (-87.118161631599037, 33.569361663546978),
-        (-87.109523609191967, 33.569162538748586),
-        (-87.10037005449233, 33.569168477701766),
-        (-87.091259779060223, 33.569278776214226),
-        (-87.082779706580894, 33.569170581515152),
-        (-87.074222319946514, 33.569040197270745),
-        (-87.065284864026367, 33.568999198811333),
-        (-87.057168408316528, 33.568958720611533),
-        (-87.048510700313244, 33.568785869410156),
-        (-87.040045152463563, 33.568699192772172),
-        (-87.031014865927133, 33.568537660327742),
-        (-87.022010207594164, 33.568298522555672),
-        (-87.012939367665908, 33.568294455034177),
-        (-87.003927241239964, 33.568140933903287),
-        (-86.995493787913475, 33.568151207601581),
-        (-86.987027808583903, 33.568077872243272),
-        (-86.978315968017483, 33.567975986870252),
-        (-86.969618415110105, 33.567869749097916),
-        (-86.969679885252305, 33.56061672718392),
-        (-86.969736642795297, 33.55335751916305),
-        (-86.961059790077357, 33.553283455325094),
-        (-86.952337113296238, 33.553096592473075),
-        (-86.943582795401326, 33.552918956264008),
-        (-86.934868537495305, 33.552762819021488),
-        (-86.934853192376664, 33.545533787574314),
-        (-86.934822864080246, 33.538290641617039),
-        (-86.934984053212247, 33.531024990894892),
-        (-86.935048139690551, 33.523786448386836),
-        (-86.935118542304338, 33.516120877646443),
-        (-86.935133632512532, 33.508501406009096),
-        (-86.935198790309116, 33.501229014835779),
-        (-86.935276061943327, 33.493888695021582),
-        (-86.926563057526394, 33.493802310163971),
-        (-86.917888040428551, 33.493727797575389),
-        (-86.917363435795977, 33.493720433237741),
-        (-86.916222831480127, 33.495181253688372),
-        (-86.915309014297918, 33.49632397631909),
-        (-86.91226392088744, 33.500125824934287),
-        (-86.911918824963223, 33.500587260043382),
-        (-86.911283513111883, 33.500309073226262),
-        (-86.910753339418619, 33.500125516820461),
-        (-86.910301938487265, 33.499936834884082),
-        (-86.909245985038481, 33.499529874463924),
-        (-86.905899236814548, 33.497732684105948),
-        (-86.904814425315692, 33.497716480854557),
-        (-86.904800409414875, 33.493771684060356),
-        (-86.904860159760204, 33.493187973533132),
-        (-86.90486463677459, 33.492533573271125),
-        (-86.90489986904592, 33.491459188567092),
-        (-86.904909618299428, 33.490033934905846),
-        (-86.904915532338649, 33.489169306239909),
-        (-86.904921925410576, 33.488234601653772),
-        (-86.904925280490104, 33.487744052047141),
-        (-86.904987273962576, 33.486832976870033),
-        (-86.905020735158672, 33.486015533881904),
-        (-86.905028244416286, 33.484917306086565),
-        (-86.905040065284425, 33.483188384856845),
-        (-86.905047733144443, 33.482066803795199),
-        (-86.905029288479355, 33.4806881288279),
-        (-86.905061149129764, 33.480104292175234),
-        (-86.905123594944968, 33.479006327023257),
-        (-86.902812616612209, 33.478987426664595),
-        (-86.900674009874038, 33.478973125152393),
-        (-86.90057231471377, 33.471724903598947),
-        (-86.900466377703296, 33.464465960628772),
-        (-86.900511718130474, 33.457164571752323),
-        (-86.900353549337098, 33.451028975813102),
-        (-86.900341199280959, 33.449984728356355),
-        (-86.896997967953524, 33.449855689284405),
-        (-86.895860016367735, 33.449786600487933),
-        (-86.891582623961412, 33.44961452330466),
-        (-86.882782729367818, 33.449312550450294),
-        (-86.873909058685456, 33.449093054823372),
-        (-86.865009137890368, 33.448767710776124),
-        (-86.865164400489874, 33.441632530176399),
-        (-86.865078633436696, 33.434160933392391),
-        (-86.865351523054116, 33.427123283557329),
-        (-86.865289116692153, 33.419710238082644),
-        (-86.864967444608126, 33.412533873053299),
-        (-86.864909473861132, 33.407044227648875),
-        (-86.864900594744668, 33.405194903491356),
-        (-86.856196321375322, 33.404989100039622),
-        (-86.847485989811929, 33.404770178900087),
-        (-86.843921346062871, 33.404653851390492),
-        (-86.838827087835554, 33.404582982117233),
-        (-86.830125351957591, 33.404416564481018),
-        (-86.821536487890455, 33.404182093857962),
-        (-86.817127538403582, 33.404097397393031),
-        (-86.814108689582767, 33.404087765376993),
-        (-86.812880806187934, 33.404069653599237),
-        (-86.81289856075162, 33.396764279624463),
-        (-86.812951709601862, 33.389483655493748),
-        (-86.812962656890093, 33.382227013276108),
-        (-86.812954385943414, 33.374994379043308),
-        (-86.813045944762663, 33.367701162733489),
-        (-86.813111523708713, 33.360390613941547),
-    ]
+# bessemer cutoff from https://gis.jccal.org/arcgis/rest/services/Political/BessemerCutOff/MapServer/0/query
+BESSEMER_CUTOFF = [
+    (-87.202590939145551, 33.570360872366507),
+    (-87.197031114413534, 33.570403784258737),
+    (-87.179598771244613, 33.570114693254951),
+    (-87.170204761542934, 33.570028514834412),
+    (-87.162295364843828, 33.56993103713922),
+    (-87.153303858487689, 33.569940850545869),
+    (-87.144483504998163, 33.569923694535859),
+    (-87.135671512539616, 33.569772027969861),
+    (-87.126883755627532, 33.569583834911398),
+    (-87.118161631599037, 33.569361663546978),
+    (-87.109523609191967, 33.569162538748586),
+    (-87.10037005449233, 33.569168477701766),
+    (-87.091259779060223, 33.569278776214226),
+    (-87.082779706580894, 33.569170581515152),
+    (-87.074222319946514, 33.569040197270745),
+    (-87.065284864026367, 33.568999198811333),
+    (-87.057168408316528, 33.568958720611533),
+    (-87.048510700313244, 33.568785869410156),
+    (-87.040045152463563, 33.568699192772172),
+    (-87.031014865927133, 33.568537660327742),
+    (-87.022010207594164, 33.568298522555672),
+    (-87.012939367665908, 33.568294455034177),
+    (-87.003927241239964, 33.568140933903287),
+    (-86.995493787913475, 33.568151207601581),
+    (-86.987027808583903, 33.568077872243272),
+    (-86.978315968017483, 33.567975986870252),
+    (-86.969618415110105, 33.567869749097916),
+    (-86.969679885252305, 33.56061672718392),
+    (-86.969736642795297, 33.55335751916305),
+    (-86.961059790077357, 33.553283455325094),
+    (-86.952337113296238, 33.553096592473075),
+    (-86.943582795401326, 33.552918956264008),
+    (-86.934868537495305, 33.552762819021488),
+    (-86.934853192376664, 33.545533787574314),
+    (-86.934822864080246, 33.538290641617039),
+    (-86.934984053212247, 33.531024990894892),
+    (-86.935048139690551, 33.523786448386836),
+    (-86.935118542304338, 33.516120877646443),
+    (-86.935133632512532, 33.508501406009096),
+    (-86.935198790309116, 33.501229014835779),
+    (-86.935276061943327, 33.493888695021582),
+    (-86.926563057526394, 33.493802310163971),
+    (-86.917888040428551, 33.493727797575389),
+    (-86.917363435795977, 33.493720433237741),
+    (-86.916222831480127, 33.495181253688372),
+    (-86.915309014297918, 33.49632397631909),
+    (-86.91226392088744, 33.500125824934287),
+    (-86.911918824963223, 33.500587260043382),
+    (-86.911283513111883, 33.500309073226262),
+    (-86.910753339418619, 33.500125516820461),
+    (-86.910301938487265, 33.499936834884082),
+    (-86.909245985038481, 33.499529874463924),
+    (-86.905899236814548, 33.497732684105948),
+    (-86.904814425315692, 33.497716480854557),
+    (-86.904800409414875, 33.493771684060356),
+    (-86.904860159760204, 33.493187973533132),
+    (-86.90486463677459, 33.492533573271125),
+    (-86.90489986904592, 33.491459188567092),
+    (-86.904909618299428, 33.490033934905846),
+    (-86.904915532338649, 33.489169306239909),
+    (-86.904921925410576, 33.488234601653772),
+    (-86.904925280490104, 33.487744052047141),
+    (-86.904987273962576, 33.486832976870033),
+    (-86.905020735158672, 33.486015533881904),
+    (-86.905028244416286, 33.484917306086565),
+    (-86.905040065284425, 33.483188384856845),
+    (-86.905047733144443, 33.482066803795199),
+    (-86.905029288479355, 33.4806881288279),
+    (-86.905061149129764, 33.480104292175234),
+    (-86.905123594944968, 33.479006327023257),
+    (-86.902812616612209, 33.478987426664595),
+    (-86.900674009874038, 33.478973125152393),
+    (-86.90057231471377, 33.471724903598947),
+    (-86.900466377703296, 33.464465960628772),
+    (-86.900511718130474, 33.457164571752323),
+    (-86.900353549337098, 33.451028975813102),
+    (-86.900341199280959, 33.449984728356355),
+    (-86.896997967953524, 33.449855689284405),
+    (-86.895860016367735, 33.449786600487933),
+    (-86.891582623961412, 33.44961452330466),
+    (-86.882782729367818, 33.449312550450294),
+    (-86.873909058685456, 33.449093054823372),
+    (-86.865009137890368, 33.448767710776124),
+    (-86.865164400489874, 33.441632530176399),
+    (-86.865078633436696, 33.434160933392391),
+    (-86.865351523054116, 33.427123283557329),
+    (-86.865289116692153, 33.419710238082644),
+    (-86.864967444608126, 33.412533873053299),
+    (-86.864909473861132, 33.407044227648875),
+    (-86.864900594744668, 33.405194903491356),
+    (-86.856196321375322, 33.404989100039622),
+    (-86.847485989811929, 33.404770178900087),
+    (-86.843921346062871, 33.404653851390492),
+    (-86.838827087835554, 33.404582982117233),
+    (-86.830125351957591, 33.404416564481018),
+    (-86.821536487890455, 33.404182093857962),
+    (-86.817127538403582, 33.404097397393031),
+    (-86.814108689582767, 33.404087765376993),
+    (-86.812880806187934, 33.404069653599237),
+    (-86.81289856075162, 33.396764279624463),
+    (-86.812951709601862, 33.389483655493748),
+    (-86.812962656890093, 33.382227013276108),
+    (-86.812954385943414, 33.374994379043308),
+    (-86.813045944762663, 33.367701162733489),
+    (-86.813111523708713, 33.360390613941547),
+]
+
 
-    # make an ugly polygon that contains all of bessemer division but none of
-    # birmingham division.
-    bessemer_poly = Polygon(
+# an ugly polygon that contains all of bessemer division but none of
+# birmingham division
+BESSEMER_DIVISION = prep(
+    Polygon(
         [
             # start at east endpoint
             (-86.813111523708713, 33.360390613941547),
@@ -273,9 +522,13 @@ def al_jefferson_county_bessemer_division(location):
             (-90, 33.570360872366507),
             # ...and continue at west endpoint
         ]
-        + bessemer_cutoff
+        + BESSEMER_CUTOFF
     )
-    p = Point(location.x, location.y)
-    if p.within(bessemer_poly):
-        return True
-    return False
+)
+
+
+def al_jefferson_county_bessemer_division(location):
+    """
+    Given a point that is within Jefferson county, True if Bessemer division, False if Birmingham division.
+    """
+    return BESSEMER_DIVISION.contains(Point(location.x, location.y))
@@ -0,0 +1,137 @@
+# Shared, pooled HTTP sessions for outbound integrations.
+#
+# Building a requests.Session per call means a new connection (and TLS
+# handshake) per request.  Instead, each process keeps one session per
+# (service, headers) pair, with the connection pool, timeout and retry
+# policy configured for that service below.
+#
+# Sessions are created lazily, after gunicorn/celery fork and after
+# gevent monkey-patching, so the underlying urllib3 pools are safe to
+# share between greenlets.
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from common.analytics import statsd
+from common.apm import tracer
+
+SERVICES: Dict[str, Dict[str, Any]] = {
+    "geocodio": {
+        "timeout": 6.0,  # seems to be enough to handle slow apartment build queries
+        "retries": Retry(
+            total=2, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
+        ),
+        "pool_maxsize": 20,
+    },
+    # a batch of up to 10k addresses can take geocod.io several minutes
+    "geocodio_batch": {
+        "timeout": 600.0,
+        "retries": Retry(
+            total=2,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            method_whitelist=["POST"],
+        ),
+        "pool_maxsize": 4,
+    },
+    "targetsmart": {
+        "timeout": 10.0,
+        "retries": Retry(
+            total=1,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            method_whitelist=["HEAD", "GET"],
+        ),
+        "pool_maxsize": 20,
+    },
+    "usvf": {
+        "timeout": 30.0,
+        "retries": Retry(
+            total=5,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            method_whitelist=["HEAD", "GET"],
+        ),
+        # (official.usvf fetches several passes at once)
+        "pool_maxsize": 6,
+    },
+    "actionnetwork": {
+        "timeout": 20.0,
+        "retries": Retry(
+            total=1,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            method_whitelist=["HEAD", "GET", "POST", "PUT"],
+        ),
+        "pool_maxsize": 10,
+    },
+    "i90": {"timeout": 5.0, "retries": Retry(total=0), "pool_maxsize": 20},
+    "pollproxy": {"timeout": 10.0, "retries": Retry(total=0), "pool_maxsize": 10},
+    "civic": {"timeout": 10.0, "retries": Retry(total=0), "pool_maxsize": 10},
+    "mapbox": {"timeout": 10.0, "retries": Retry(total=0), "pool_maxsize": 10},
+    # smsbot.sender handles retries (and 429s) itself
+    "twilio": {"timeout": 10.0, "retries": Retry(total=0), "pool_maxsize": 20},
+}
+
+
+class ServiceHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that applies a default timeout and emits a trace span
+    and latency/status metrics tagged with the service name.
+    """
+
+    def __init__(self, service: str, timeout: float, **kwargs):
+        self.service = service
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        with tracer.trace("http.request", service=self.service) as span:
+            span.set_tag("http.method", request.method)
+            with statsd.timed(f"turnout.common.http.{self.service}", sample_rate=0.2):
+                response = super().send(request, **kwargs)
+            span.set_tag("http.status_code", response.status_code)
+        statsd.increment(
+            f"turnout.common.http.{self.service}.status_{response.status_code // 100}xx"
+        )
+        return response
+
+
+_pid: Optional[int] = None
+_sessions: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], requests.Session] = {}
+
+
+def get_session(service: str, headers: Dict[str, str] = None) -> requests.Session:
+    """
+    Return the shared session for a service (as configured in SERVICES),
+    with the given default headers.
+    """
+    global _pid
+
+    # never share sockets with a parent process
+    if _pid != os.getpid():
+        _sessions.clear()
+        _pid = os.getpid()
+
+    key = (service, tuple(sorted((headers or {}).items())))
+    session = _sessions.get(key)
+    if session is None:
+        config = SERVICES[service]
+        adapter = ServiceHTTPAdapter(
+            service,
+            config["timeout"],
+            max_retries=config["retries"],
+            pool_connections=4,
+            pool_maxsize=config["pool_maxsize"],
+        )
+        session = requests.Session()
+        session.headers.update(headers or {})
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _sessions[key] = session
+    return session
@@ -1,8 +1,9 @@
 import logging
 
-import requests
 from django.conf import settings
 
+from common.http import get_session as get_http_session
+
 logger = logging.getLogger("i90")
 
 
@@ -11,10 +12,12 @@ CLAIM_ENDPOINT = f"{settings.I90_URL}/v1/claim"
 GET_ENDPOINT = f"{settings.I90_URL}/v1/redirect"
 
 
+def get_session():
+    return get_http_session("i90", headers={"x-api-key": settings.I90_KEY})
+
+
 def get_shortened_url(token: str) -> bool:
-    response = requests.get(
-        f"{GET_ENDPOINT}/{token}", headers={"x-api-key": settings.I90_KEY},
-    )
+    response = get_session().get(f"{GET_ENDPOINT}/{token}")
     if response.status_code != 200:
         return None
     return response.json()["destination"]
@@ -22,16 +25,13 @@ def get_shortened_url(token: str) -> bool:
 
 def shorten_url(url, token=None, app_name="turnout"):
     if token:
-        response = requests.post(
+        response = get_session().post(
             CLAIM_ENDPOINT,
-            headers={"x-api-key": settings.I90_KEY, "content-type": "application/json"},
             json={"destination": url, "token": token, "_app_name": app_name},
         )
     else:
-        response = requests.post(
-            CONCEIVE_ENDPOINT,
-            headers={"x-api-key": settings.I90_KEY, "content-type": "application/json"},
-            json={"destination": url, "_app_name": app_name},
+        response = get_session().post(
+            CONCEIVE_ENDPOINT, json={"destination": url, "_app_name": app_name},
         )
     if response.status_code != 200:
         logger.error(
@@ -5,6 +5,8 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import connection
 
+from official.region_geom import invalidate_region_geom
+
 
 class Command(BaseCommand):
     help = "Import GIS data for address matching"
@@ -42,3 +44,5 @@ class Command(BaseCommand):
             f"cd {td.name} && shp2pgsql -s 26986:4326 WARDSPRECINCTS_POLY.shp official_region_geom_ma | {psql}"
         )
         assert r == 0
+
+        invalidate_region_geom()
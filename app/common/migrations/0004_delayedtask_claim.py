@@ -0,0 +1,22 @@
+# Generated by Django 2.2.17 on 2021-01-24 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_geocoderesult'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='delayedtask',
+            name='started_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='delayedtask',
+            index=models.Index(condition=models.Q(started_at__isnull=True), fields=['due_at'], name='delayedtask_pending_idx'),
+        ),
+    ]
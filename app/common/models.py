@@ -1,9 +1,10 @@
 import datetime
 import logging
+from typing import List
 
 import sentry_sdk
 from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.db import models, transaction
 
 from common.utils.models import TimestampModel, UUIDModel
 from turnout.celery_app import app
@@ -17,12 +18,17 @@ class DelayedTask(UUIDModel, TimestampModel):
     kwargs = JSONField(null=True)
     due_at = models.DateTimeField(null=True)
 
-    started_at = models.DateTimeField(null=True)
+    started_at = models.DateTimeField(null=True, db_index=True)
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["due_at", "started_at"]),
+            models.Index(
+                fields=["due_at"],
+                name="delayedtask_pending_idx",
+                condition=models.Q(started_at__isnull=True),
+            ),
         ]
 
     @staticmethod
@@ -92,14 +98,58 @@ class DelayedTask(UUIDModel, TimestampModel):
             state_id, 1, task_name, *args, **kwargs
         )
 
+    @staticmethod
+    def claim_due(limit: int) -> List["DelayedTask"]:
+        """
+        Mark up to limit due tasks (oldest first) as started, and return
+        them for delivery.  Tasks another deliverer is claiming are skipped,
+        so concurrent callers never get the same task.
+        """
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        with transaction.atomic():
+            tasks = list(
+                DelayedTask.objects.select_for_update(skip_locked=True)
+                .filter(started_at__isnull=True, due_at__lte=now)
+                .order_by("due_at")[:limit]
+            )
+            DelayedTask.objects.filter(uuid__in=[t.uuid for t in tasks]).update(
+                started_at=now, modified_at=now
+            )
+        for t in tasks:
+            t.started_at = now
+        return tasks
+
+    @staticmethod
+    def send_all(tasks: List["DelayedTask"]) -> None:
+        # one broker connection for the whole batch
+        with app.producer_or_acquire() as producer:
+            for t in tasks:
+                t.send(producer=producer)
+
     def deliver(self):
         self.started_at = datetime.datetime.now().replace(tzinfo=datetime.timezone.utc)
         self.save()
+        self.send()
 
+    def send(self, producer=None):
         try:
-            new_id = app.send_task(self.task_name, args=self.args, kwargs=self.kwargs)
+            app.send_task(
+                self.task_name, args=self.args, kwargs=self.kwargs, producer=producer
+            )
         except Exception as e:
             logger.exception(
                 f"failed to run task {self.task_name} args {self.args} kwargs {self.kwargs}"
             )
             sentry_sdk.capture_exception(e)
+
+
+class GeocodeResult(TimestampModel):
+    """
+    Durable copy of the geocode cache, used when the entry has fallen out
+    of (or never made it into) redis.  results is null for addresses
+    geocod.io rejected as bogus.
+    """
+
+    key = models.TextField(primary_key=True)
+    results = JSONField(null=True)
+    expires_at = models.DateTimeField(db_index=True)
@@ -1,8 +1,9 @@
 import base64
 import dataclasses
+import json
 import numbers
 import unicodedata
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from pdf_template import PDFTemplate, PDFTemplateSection
 from pydash.strings import deburr
@@ -81,3 +82,47 @@ def serialize_template_section(section: PDFTemplateSection) -> Dict[str, Any]:
 @tracer.wrap()
 def serialize_template(template: PDFTemplate) -> List[Dict[str, Any]]:
     return [serialize_template_section(section) for section in template.template_files]
+
+
+def template_key(template: PDFTemplate) -> Tuple[str, ...]:
+    # PDFTemplateSection is an (unhashable) dataclass; its repr covers every
+    # field, including signature locations
+    return tuple(repr(section) for section in template.template_files)
+
+
+# Serialized templates, as JSON, keyed by template_key.  These are a few
+# hundred KB each, so encoding them once per process (rather than on every
+# call) matters when filling forms in bulk.
+TEMPLATE_JSON_CACHE: Dict[Tuple[str, ...], str] = {}
+
+
+def serialize_template_json(template: PDFTemplate) -> str:
+    key = template_key(template)
+    if key not in TEMPLATE_JSON_CACHE:
+        TEMPLATE_JSON_CACHE[key] = json.dumps(serialize_template(template))
+    return TEMPLATE_JSON_CACHE[key]
+
+
+def build_lambda_payload(
+    template_json: str,
+    data: Dict[str, Any],
+    signature_url: Optional[str],
+    output_url: str,
+) -> bytes:
+    # splice the pre-encoded template into the payload instead of
+    # re-encoding it along with the (small) per-request fields
+    rest = json.dumps({"data": data, "signature": signature_url, "output": output_url})
+    return bytes(f'{{"template": {template_json}, {rest[1:]}', "utf-8")
+
+
+PDF_TEMPLATE_CACHE: Dict[Tuple[str, ...], PDFTemplate] = {}
+
+
+def get_pdf_template(sections: Sequence[PDFTemplateSection]) -> PDFTemplate:
+    """
+    Return a process-wide PDFTemplate for these sections, so callers that
+    build a template per form (e.g., the movers blank forms) share one
+    template -- and one serialized copy of it.
+    """
+    template = PDFTemplate(list(sections))
+    return PDF_TEMPLATE_CACHE.setdefault(template_key(template), template)
@@ -1,8 +1,9 @@
 import base64
-import json
+import dataclasses
 import logging
 import os
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
 
 from django.conf import settings
 from django.core.files import File
@@ -10,11 +11,13 @@ from django.core.files.base import ContentFile
 from pdf_template import PDFTemplate
 from PIL import Image
 
+from common.analytics import statsd
 from common.apm import tracer
 from common.aws import lambda_client, s3_client
 from storage.models import SecureUploadItem, StorageItem
 
-from .lambdahelpers import clean_data, serialize_template
+from .lambdahelpers import build_lambda_payload, clean_data, serialize_template_json
+from .templatestore import serialize_template_refs_json
 
 logger = logging.getLogger("pypdftk")
 
@@ -26,8 +29,7 @@ class PDFFillerLambdaError(Exception):
         super().__init__(message)
 
 
-@tracer.wrap()
-def fill_pdf_template_lambda(
+def _fill_lambda(
     template: PDFTemplate,
     data: Dict[str, Any],
     item: StorageItem,
@@ -41,7 +43,10 @@ def fill_pdf_template_lambda(
 
     cleaned_data = clean_data(data)
 
-    template_data = serialize_template(template)
+    if settings.PDF_TEMPLATE_STORE_BUCKET:
+        template_json = serialize_template_refs_json(template)
+    else:
+        template_json = serialize_template_json(template)
 
     with tracer.trace("common.pdf.pdftemplate.save_blank"):
         # Save an empty blob to S3 to set the headers, etc., then generate
@@ -57,16 +62,8 @@ def fill_pdf_template_lambda(
     )
 
     with tracer.trace("common.pdf.pdftemplate.generate_payload"):
-        lambda_payload = bytes(
-            json.dumps(
-                {
-                    "template": template_data,
-                    "data": cleaned_data,
-                    "signature": signature_url,
-                    "output": output_url,
-                }
-            ),
-            "utf-8",
+        lambda_payload = build_lambda_payload(
+            template_json, cleaned_data, signature_url, output_url
         )
 
     with tracer.trace("common.pdf.pdftemplate.call_lambda"):
@@ -87,11 +84,8 @@ def fill_pdf_template_lambda(
 
         raise PDFFillerLambdaError(logs, msg)
 
-    item.save()
-
 
-@tracer.wrap()
-def fill_pdf_template_local(
+def _fill_local(
     template: PDFTemplate,
     data: Dict[str, Any],
     item: StorageItem,
@@ -104,7 +98,31 @@ def fill_pdf_template_local(
         signature_image = Image.open(signature.file)
 
     with template.fill(data, signature_image) as filled_pdf:
-        item.file.save(file_name, File(filled_pdf), True)
+        item.file.save(file_name, File(filled_pdf), False)
+
+
+@tracer.wrap()
+def fill_pdf_template_lambda(
+    template: PDFTemplate,
+    data: Dict[str, Any],
+    item: StorageItem,
+    file_name: str,
+    signature: Optional[SecureUploadItem] = None,
+):
+    _fill_lambda(template, data, item, file_name, signature)
+    item.save()
+
+
+@tracer.wrap()
+def fill_pdf_template_local(
+    template: PDFTemplate,
+    data: Dict[str, Any],
+    item: StorageItem,
+    file_name: str,
+    signature: Optional[SecureUploadItem] = None,
+):
+    _fill_local(template, data, item, file_name, signature)
+    item.save()
 
 
 def fill_pdf_template(
@@ -118,3 +136,61 @@ def fill_pdf_template(
         fill_pdf_template_lambda(template, data, item, file_name, signature)
     else:
         fill_pdf_template_local(template, data, item, file_name, signature)
+
+
+@dataclasses.dataclass
+class PDFFillJob:
+    template: PDFTemplate
+    data: Dict[str, Any]
+    item: StorageItem
+    file_name: str
+    signature: Optional[SecureUploadItem] = None
+
+
+@tracer.wrap()
+def fill_pdf_templates(jobs: Sequence[PDFFillJob]) -> List[Optional[Exception]]:
+    """
+    Fill and upload a batch of PDFs concurrently.
+
+    The fills themselves run in pdftk subprocesses (or in the lambda), so a
+    thread pool is enough to keep PDF_BATCH_CONCURRENCY of them going at
+    once, along with their uploads.  Only the fill and upload happen on the
+    pool; each StorageItem is saved from the calling thread once its file is
+    uploaded.
+
+    Returns a list parallel to jobs, holding the exception raised for each
+    job that failed, or None.
+    """
+    if not jobs:
+        return []
+
+    if settings.PDF_GENERATION_LAMBDA_ENABLED:
+        fill = _fill_lambda
+    else:
+        fill = _fill_local
+
+    results: List[Optional[Exception]] = []
+    with ThreadPoolExecutor(
+        max_workers=min(settings.PDF_BATCH_CONCURRENCY, len(jobs))
+    ) as executor:
+        futures = [
+            executor.submit(
+                fill, job.template, job.data, job.item, job.file_name, job.signature
+            )
+            for job in jobs
+        ]
+        for job, future in zip(jobs, futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.exception(f"Failed to fill PDF {job.file_name}")
+                statsd.increment("turnout.common.pdf.batch_fill.error")
+                results.append(e)
+                continue
+            job.item.save()
+            results.append(None)
+
+    statsd.increment(
+        "turnout.common.pdf.batch_fill.filled", results.count(None),
+    )
+    return results
@@ -0,0 +1,100 @@
+# Content-addressed store for PDF templates used by the filler lambda.
+#
+# Rather than inlining every template section's PDF (base64) in each
+# invocation, each distinct PDF is uploaded once to
+# s3://PDF_TEMPLATE_STORE_BUCKET/<prefix><sha256>.pdf and the payload
+# carries only a reference to it.  Objects are immutable -- a changed
+# template gets a new hash -- so the lambda can cache them by hash across
+# warm invocations, and we only ever upload a template the first time a
+# process sees a hash that isn't already in the bucket.
+import dataclasses
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Set, Tuple
+
+from botocore.exceptions import ClientError  # type: ignore
+from django.conf import settings
+from pdf_template import PDFTemplate, PDFTemplateSection
+
+from common.analytics import statsd
+from common.apm import tracer
+from common.aws import s3_client
+
+from .lambdahelpers import template_key
+
+logger = logging.getLogger("pypdftk")
+
+# path -> sha256 of the file's contents
+PDF_HASH_CACHE: Dict[str, str] = {}
+
+# hashes we know to be in the store
+STORED_HASHES: Set[str] = set()
+
+# template_key -> JSON list of section references
+TEMPLATE_REFS_JSON_CACHE: Dict[Tuple[str, ...], str] = {}
+
+
+def get_pdf_hash(path: str) -> str:
+    if path not in PDF_HASH_CACHE:
+        with open(path, "rb") as f:
+            PDF_HASH_CACHE[path] = hashlib.sha256(f.read()).hexdigest()
+    return PDF_HASH_CACHE[path]
+
+
+def store_key(pdf_hash: str) -> str:
+    return f"{settings.PDF_TEMPLATE_STORE_PREFIX}{pdf_hash}.pdf"
+
+
+@tracer.wrap()
+def ensure_stored(path: str, pdf_hash: str) -> None:
+    if pdf_hash in STORED_HASHES:
+        return
+
+    key = store_key(pdf_hash)
+    try:
+        s3_client.head_object(Bucket=settings.PDF_TEMPLATE_STORE_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+            raise
+        with open(path, "rb") as f:
+            s3_client.put_object(
+                Bucket=settings.PDF_TEMPLATE_STORE_BUCKET,
+                Key=key,
+                Body=f.read(),
+                ContentType="application/pdf",
+                Metadata={"source-path": path},
+            )
+        logger.info(f"Stored PDF template {path} as {key}")
+        statsd.increment("turnout.common.pdf.template_store.upload")
+
+    STORED_HASHES.add(pdf_hash)
+
+
+def serialize_template_section_ref(section: PDFTemplateSection) -> Dict[str, Any]:
+    serialized = dataclasses.asdict(section)
+    path = serialized.pop("path")
+    pdf_hash = get_pdf_hash(path)
+    ensure_stored(path, pdf_hash)
+    serialized["pdf_ref"] = {
+        "bucket": settings.PDF_TEMPLATE_STORE_BUCKET,
+        "key": store_key(pdf_hash),
+        "sha256": pdf_hash,
+    }
+    return serialized
+
+
+def serialize_template_refs_json(template: PDFTemplate) -> str:
+    """
+    Like serialize_template_json, but each section references its PDF in
+    the template store (as pdf_ref) instead of inlining it (as pdf).
+    """
+    key = template_key(template)
+    if key not in TEMPLATE_REFS_JSON_CACHE:
+        TEMPLATE_REFS_JSON_CACHE[key] = json.dumps(
+            [
+                serialize_template_section_ref(section)
+                for section in template.template_files
+            ]
+        )
+    return TEMPLATE_REFS_JSON_CACHE[key]
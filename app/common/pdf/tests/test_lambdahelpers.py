@@ -1,10 +1,17 @@
+import json
+
+from pdf_template import PDFTemplate, PDFTemplateSection
 from phonenumber_field.phonenumber import PhoneNumber
 
 from common.pdf.lambdahelpers import (
     BASE64_PDF_CACHE,
     MAX_FIELD_LEN,
+    TEMPLATE_JSON_CACHE,
+    build_lambda_payload,
     clean_data,
+    get_pdf_template,
     serialize_template,
+    serialize_template_json,
 )
 
 
@@ -36,3 +43,40 @@ def test_clean_data():
         "J": "(617) 555-1234",
         "K": "Hagatna",
     }
+
+
+def test_serialize_template_json(mocker):
+    TEMPLATE_JSON_CACHE.clear()
+    serialize = mocker.patch(
+        "common.pdf.lambdahelpers.serialize_template",
+        return_value=[{"pdf": "abc", "is_form": True}],
+    )
+    sections = [PDFTemplateSection(path="a.pdf", is_form=True)]
+
+    assert serialize_template_json(PDFTemplate(sections)) == (
+        '[{"pdf": "abc", "is_form": true}]'
+    )
+    # an equivalent template reuses the encoded copy
+    serialize_template_json(PDFTemplate(list(sections)))
+    assert serialize.call_count == 1
+
+    serialize_template_json(PDFTemplate([PDFTemplateSection(path="b.pdf")]))
+    assert serialize.call_count == 2
+
+
+def test_build_lambda_payload():
+    payload = build_lambda_payload(
+        '[{"pdf": "abc"}]', {"name": "Hagatna"}, None, "https://output"
+    )
+    assert json.loads(payload.decode()) == {
+        "template": [{"pdf": "abc"}],
+        "data": {"name": "Hagatna"},
+        "signature": None,
+        "output": "https://output",
+    }
+
+
+def test_get_pdf_template():
+    a = get_pdf_template([PDFTemplateSection(path="a.pdf", is_form=True)])
+    assert get_pdf_template([PDFTemplateSection(path="a.pdf", is_form=True)]) is a
+    assert get_pdf_template([PDFTemplateSection(path="a.pdf")]) is not a
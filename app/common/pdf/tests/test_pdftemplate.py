@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock
+
+from common.pdf.pdftemplate import PDFFillJob, fill_pdf_templates
+
+
+def test_fill_pdf_templates(mocker, settings):
+    settings.PDF_GENERATION_LAMBDA_ENABLED = False
+    settings.PDF_BATCH_CONCURRENCY = 2
+
+    def fill(template, data, item, file_name, signature):
+        if file_name == "bad.pdf":
+            raise ValueError("pdftk failed")
+
+    fill_local = mocker.patch("common.pdf.pdftemplate._fill_local", side_effect=fill)
+    fill_lambda = mocker.patch("common.pdf.pdftemplate._fill_lambda")
+
+    template = MagicMock()
+    jobs = [
+        PDFFillJob(template, {"n": i}, MagicMock(), name)
+        for i, name in enumerate(["a.pdf", "bad.pdf", "c.pdf"])
+    ]
+
+    errors = fill_pdf_templates(jobs)
+
+    assert errors[0] is None
+    assert isinstance(errors[1], ValueError)
+    assert errors[2] is None
+    assert fill_local.call_count == 3
+    assert not fill_lambda.called
+
+    jobs[0].item.save.assert_called_once_with()
+    jobs[1].item.save.assert_not_called()
+    jobs[2].item.save.assert_called_once_with()
+
+
+def test_fill_pdf_templates_lambda(mocker, settings):
+    settings.PDF_GENERATION_LAMBDA_ENABLED = True
+
+    fill_lambda = mocker.patch("common.pdf.pdftemplate._fill_lambda")
+    signature = MagicMock()
+    job = PDFFillJob(MagicMock(), {}, MagicMock(), "a.pdf", signature)
+
+    assert fill_pdf_templates([job]) == [None]
+    fill_lambda.assert_called_once_with(job.template, {}, job.item, "a.pdf", signature)
+
+
+def test_fill_pdf_templates_empty():
+    assert fill_pdf_templates([]) == []
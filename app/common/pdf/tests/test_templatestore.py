@@ -0,0 +1,83 @@
+import hashlib
+import json
+
+import pytest
+from botocore.exceptions import ClientError  # type: ignore
+from pdf_template import PDFTemplate, PDFTemplateSection
+
+from common.pdf import templatestore
+
+
+@pytest.fixture
+def store(mocker, settings):
+    settings.PDF_TEMPLATE_STORE_BUCKET = "templates-bucket"
+    settings.PDF_TEMPLATE_STORE_PREFIX = "pdf-templates/"
+    templatestore.PDF_HASH_CACHE.clear()
+    templatestore.STORED_HASHES.clear()
+    templatestore.TEMPLATE_REFS_JSON_CACHE.clear()
+    return mocker.patch("common.pdf.templatestore.s3_client")
+
+
+def write_pdf(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_serialize_template_refs_json(store, tmp_path):
+    store.head_object.side_effect = ClientError(
+        {"Error": {"Code": "404"}}, "HeadObject"
+    )
+    path = write_pdf(tmp_path, "a.pdf", b"%PDF-a")
+    pdf_hash = hashlib.sha256(b"%PDF-a").hexdigest()
+
+    template = PDFTemplate(
+        [
+            PDFTemplateSection(path=path, is_form=True),
+            PDFTemplateSection(path=path, is_form=False),
+        ]
+    )
+    refs = json.loads(templatestore.serialize_template_refs_json(template))
+
+    assert [r["is_form"] for r in refs] == [True, False]
+    for r in refs:
+        assert "path" not in r
+        assert "pdf" not in r
+        assert r["pdf_ref"] == {
+            "bucket": "templates-bucket",
+            "key": f"pdf-templates/{pdf_hash}.pdf",
+            "sha256": pdf_hash,
+        }
+
+    # uploaded once, even though two sections share the file
+    store.put_object.assert_called_once()
+    assert store.put_object.call_args[1]["Key"] == f"pdf-templates/{pdf_hash}.pdf"
+    assert store.put_object.call_args[1]["Body"] == b"%PDF-a"
+
+    # and not re-checked or re-serialized for the same template
+    templatestore.serialize_template_refs_json(PDFTemplate(template.template_files))
+    assert store.head_object.call_count == 1
+
+
+def test_already_stored(store, tmp_path):
+    path = write_pdf(tmp_path, "b.pdf", b"%PDF-b")
+
+    templatestore.serialize_template_refs_json(
+        PDFTemplate([PDFTemplateSection(path=path)])
+    )
+
+    store.head_object.assert_called_once()
+    store.put_object.assert_not_called()
+
+
+def test_head_error(store, tmp_path):
+    store.head_object.side_effect = ClientError(
+        {"Error": {"Code": "403"}}, "HeadObject"
+    )
+    path = write_pdf(tmp_path, "c.pdf", b"%PDF-c")
+
+    with pytest.raises(ClientError):
+        templatestore.serialize_template_refs_json(
+            PDFTemplate([PDFTemplateSection(path=path)])
+        )
+    store.put_object.assert_not_called()
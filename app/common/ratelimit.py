@@ -0,0 +1,179 @@
+# Distributed token buckets, kept in redis.
+#
+# Each bucket is a redis hash holding the tokens available and the time
+# they were last refilled.  A Lua script refills the bucket (at `rate`
+# tokens per second, up to `burst`) and takes tokens in one atomic step,
+# using redis's clock, so any number of processes on any number of hosts
+# can share a bucket and, together, never exceed its rate.
+#
+# This is also how the queues in BULK_QUEUE_RATE_LIMITS are rate limited:
+# RateLimitedTask, the base class for all of our tasks, takes a token from
+# the bucket for the queue a task was delivered from before running it.
+import logging
+import time
+from typing import Optional
+
+from celery import Task
+from celery.exceptions import Ignore
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from common.analytics import statsd
+
+logger = logging.getLogger("common")
+
+# KEYS: bucket; ARGV: rate, burst, tokens wanted
+# returns {tokens granted (0 or all), seconds to wait before retrying}
+ACQUIRE_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+if now > ts then
+  tokens = math.min(burst, tokens + (now - ts) * rate)
+  ts = now
+end
+
+local granted = 0
+local wait = 0
+if ts <= now and tokens >= want then
+  tokens = tokens - want
+  granted = want
+else
+  -- ts is in the future if the bucket is paused
+  wait = math.max(ts - now, 0) + (want - math.min(tokens, want)) / rate
+end
+
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', ts)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate + math.max(ts - now, 0)) + 60)
+return {granted, tostring(wait)}
+"""
+
+# KEYS: bucket; ARGV: seconds
+PAUSE_SCRIPT = """
+redis.replicate_commands()
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local paused_until = now + tonumber(ARGV[1])
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts')) or now
+if paused_until > ts then
+  redis.call('HMSET', KEYS[1], 'tokens', 0, 'ts', paused_until)
+  redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])) + 60)
+end
+return 0
+"""
+
+# the longest we sleep between attempts, so we notice a refill promptly
+MAX_SLEEP = 1.0
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: float = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.key = cache.make_key(f"ratelimit:{name}")
+
+    def _scripts(self):
+        conn = get_redis_connection("default")
+        return conn.register_script(ACQUIRE_SCRIPT), conn.register_script(PAUSE_SCRIPT)
+
+    def try_acquire(self, tokens: int = 1) -> float:
+        """
+        Take tokens from the bucket if they are available.  Returns 0 if
+        they were taken, otherwise the number of seconds until they are
+        expected to be.
+        """
+        acquire, _ = self._scripts()
+        granted, wait = acquire(keys=[self.key], args=[self.rate, self.burst, tokens])
+        if granted:
+            statsd.increment(f"turnout.common.ratelimit.{self.name}.granted", tokens)
+            return 0.0
+        statsd.increment(f"turnout.common.ratelimit.{self.name}.denied")
+        return max(float(wait), 0.001)
+
+    def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> bool:
+        """
+        Wait (up to timeout seconds, or forever) for tokens and take them.
+        Returns False if we timed out.
+        """
+        start = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                statsd.timing(
+                    f"turnout.common.ratelimit.{self.name}.waiting",
+                    (time.monotonic() - start) * 1000,
+                )
+                return True
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    statsd.increment(f"turnout.common.ratelimit.{self.name}.timeout")
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(min(wait, MAX_SLEEP))
+
+    def pause(self, seconds: float) -> None:
+        """
+        Empty the bucket and stop refilling it for the given number of
+        seconds, e.g., because the service it protects asked us to back off.
+        """
+        _, pause = self._scripts()
+        pause(keys=[self.key], args=[seconds])
+        logger.info(f"Paused rate limit {self.name} for {seconds}s")
+        statsd.increment(f"turnout.common.ratelimit.{self.name}.paused")
+
+
+def delivery_queue(request) -> Optional[str]:
+    """
+    The name of the queue a task was delivered from, if any.
+    """
+    routing_key = (request.delivery_info or {}).get("routing_key")
+    if not routing_key:
+        return None
+    for queue in settings.CELERY_TASK_QUEUES:
+        if queue.routing_key == routing_key:
+            return queue.name
+    # queues that aren't declared are created with a routing key that
+    # matches their name
+    return routing_key
+
+
+def queue_bucket(queue: str) -> Optional[TokenBucket]:
+    interval = settings.BULK_QUEUE_RATE_LIMITS.get(queue)
+    if not interval:
+        return None
+    return TokenBucket(queue, 1 / interval)
+
+
+class RateLimitedTask(Task):
+    """
+    If a task was delivered from a rate limited queue (see
+    BULK_QUEUE_RATE_LIMITS), wait for a token from that queue's bucket
+    before running it.  If we wait more than BULK_QUEUE_MAX_WAIT seconds,
+    the task goes to the back of its queue, so that a worker consuming
+    several rate limited queues isn't tied up by the slowest of them.
+    """
+
+    def __call__(self, *args, **kwargs):
+        if not self.request.called_directly:
+            queue = delivery_queue(self.request)
+            bucket = queue_bucket(queue) if queue else None
+            if bucket and not bucket.acquire(timeout=settings.BULK_QUEUE_MAX_WAIT):
+                logger.info(f"Requeueing {self.name} after waiting for {queue} token")
+                statsd.increment(f"turnout.common.ratelimit.{queue}.requeued")
+                # the same task (id, headers, retries, callbacks and the
+                # rest of its chain), just later
+                self.signature_from_request(
+                    self.request, args, kwargs, queue=queue
+                ).apply_async()
+                raise Ignore()
+        return super().__call__(*args, **kwargs)
@@ -1,90 +1,88 @@
 import datetime
-import json
 import logging
+import math
+import time
 
-import dateutil.parser
 from celery import shared_task
 from django.conf import settings
-from django.core.cache import cache
+from django.db.models import Count, Min
 
-from turnout.celery_app import app
-
-from .models import DelayedTask
+from .analytics import statsd
+from .models import DelayedTask, GeocodeResult
 
 logger = logging.getLogger("common")
-conn = app.connection_for_read()
+
+PRUNE_BATCH_SIZE = 10000
 
 
-# Process a single token: if there is work in the queue, run the task.
 @shared_task
-def process_token(name):
-    from celery.app.trace import _fast_trace_task
-    from celery.exceptions import Ignore
-    from queue import Empty
-
-    queue = conn.SimpleQueue(name, no_ack=True)
-    try:
-        item = queue.get(block=False)
-        _fast_trace_task(
-            item.headers["task"],
-            item.headers["id"],
-            item.headers,
-            json.loads(item.body),
-            None,
-            None,
-        )
-    except Empty:
-        pass
-    raise Ignore
+def deliver_delayed_tasks():
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    backlog = DelayedTask.objects.filter(
+        started_at__isnull=True, due_at__lte=now
+    ).aggregate(count=Count("uuid"), oldest=Min("due_at"))
+    statsd.gauge("turnout.common.delayed_tasks.backlog", backlog["count"])
+    lag = (now - backlog["oldest"]).total_seconds() if backlog["oldest"] else 0
+    statsd.gauge("turnout.common.delayed_tasks.lag", lag)
+    if not backlog["count"]:
+        return
+
+    # Big backlogs (e.g., everything scheduled "politely" for 1700 UTC) are
+    # drained by several deliverers at once; they claim disjoint batches.
+    deliverers = min(
+        settings.DELAYED_TASKS_DELIVERERS,
+        math.ceil(backlog["count"] / settings.DELAYED_TASKS_BATCH_SIZE),
+    )
+    logger.info(
+        f"{backlog['count']} delayed tasks due (lag {lag:.0f}s), {deliverers} deliverers"
+    )
+    for _ in range(deliverers - 1):
+        drain_delayed_tasks.delay()
+    drain_delayed_tasks()
 
 
 @shared_task
-def enqueue_tokens(seconds, slack):
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(seconds=seconds)
-
-    # don't reschedule any period we already scheduled
-    last = cache.get("bulk_tokens_watermark")
-    if last:
-        last = dateutil.parser.isoparse(last)
-        if last > start:
-            start = last
-    cache.set("bulk_tokens_watermark", end.isoformat())
-
-    span = (end - start).total_seconds()
-
-    for name, interval in settings.BULK_QUEUE_RATE_LIMITS.items():
-        # see if queue is empty
-        queue = conn.SimpleQueue(name, no_ack=True)
-        if not queue.qsize():
-            continue
-
-        # queue some tokens
-        for i in range(int(span / interval)):
-            process_token.apply_async(
-                args=(name,),
-                queue=settings.BULK_TOKEN_QUEUE,
-                eta=start + datetime.timedelta(seconds=i * interval),
-                expire=start + datetime.timedelta(seconds=(i * interval + slack)),
-            )
+def drain_delayed_tasks():
+    # stop working a bit before when we expect our successor to run
+    stop = time.monotonic() + settings.DELAYED_TASKS_INTERVAL * 60 - 5
+
+    delivered = 0
+    while time.monotonic() < stop:
+        tasks = DelayedTask.claim_due(settings.DELAYED_TASKS_BATCH_SIZE)
+        if not tasks:
+            break
+        DelayedTask.send_all(tasks)
+        statsd.increment("turnout.common.delayed_tasks.delivered", len(tasks))
+        delivered += len(tasks)
+    logger.info(f"Delivered {delivered} delayed tasks")
 
 
 @shared_task
-def deliver_delayed_tasks():
-    # stop working a bit before when we expect our successor to run
-    stop = (
-        datetime.datetime.now()
-        + datetime.timedelta(minutes=settings.DELAYED_TASKS_INTERVAL)
-        - datetime.timedelta(seconds=5)
+def prune_delayed_tasks():
+    cutoff = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(
+        days=settings.DELAYED_TASKS_RETENTION_DAYS
     )
-
-    for t in DelayedTask.objects.filter(
-        started_at__isnull=True,
-        due_at__lte=datetime.datetime.now().replace(tzinfo=datetime.timezone.utc),
-    ):
-        if datetime.datetime.now() >= stop:
+    pruned = 0
+    while True:
+        batch = list(
+            DelayedTask.objects.filter(started_at__lt=cutoff)
+            .order_by()
+            .values_list("uuid", flat=True)[:PRUNE_BATCH_SIZE]
+        )
+        if not batch:
             break
-        t.deliver()
+        deleted, _ = DelayedTask.objects.filter(uuid__in=batch).delete()
+        pruned += deleted
+    statsd.increment("turnout.common.delayed_tasks.pruned", pruned)
+    logger.info(f"Pruned {pruned} delivered delayed tasks")
+
+
+@shared_task
+def purge_expired_geocode_results():
+    deleted, _ = GeocodeResult.objects.filter(
+        expires_at__lt=datetime.datetime.now(tz=datetime.timezone.utc)
+    ).delete()
+    logger.info(f"Purged {deleted} expired geocode results")
 
 
 @shared_task
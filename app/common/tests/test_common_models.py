@@ -58,3 +58,22 @@ def test_schedule_tomorrow_polite():
     assert t.task_name == "foo"
     assert t.args == [1, 2]
     assert t.kwargs == {"kw1": 1, "kw2": 5}
+
+
+@pytest.mark.django_db
+def test_claim_due():
+    now = datetime.datetime.now().replace(tzinfo=datetime.timezone.utc)
+    old = DelayedTask.schedule(now - datetime.timedelta(hours=2), "foo")
+    due = DelayedTask.schedule(now - datetime.timedelta(hours=1), "foo")
+    DelayedTask.schedule(now + datetime.timedelta(hours=1), "foo")
+
+    tasks = DelayedTask.claim_due(1)
+    assert [t.uuid for t in tasks] == [old.uuid]
+    assert tasks[0].started_at is not None
+
+    tasks = DelayedTask.claim_due(10)
+    assert [t.uuid for t in tasks] == [due.uuid]
+    due.refresh_from_db()
+    assert due.started_at is not None
+
+    assert DelayedTask.claim_due(10) == []
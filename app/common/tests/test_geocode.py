@@ -1,14 +1,18 @@
 import pytest
 from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.core.cache.backends.locmem import LocMemCache
 from rest_framework.test import APIClient
 
 from common.geocode import (
     API_ENDPOINT,
     al_jefferson_county_bessemer_division,
     geocode,
+    geocode_batch,
+    geocode_cache_key,
     strip_address_number_alpha_suffix,
 )
+from common.models import GeocodeResult
 
 
 def test_well_formed_request(requests_mock):
@@ -67,6 +71,114 @@ def test_well_formed_request(requests_mock):
     ]
 
 
+@pytest.fixture
+def geocode_cache(mocker, settings):
+    settings.GEOCODE_CACHE_ENABLED = True
+    cache = LocMemCache("geocode", {})
+    mocker.patch("common.geocode.cache", cache)
+    return cache
+
+
+@pytest.mark.django_db
+def test_cached(requests_mock, geocode_cache):
+    results = [{"location": {"lat": 34.065729, "lng": -118.434999}}]
+    geocodio_call = requests_mock.register_uri(
+        "GET", API_ENDPOINT, json={"results": results},
+    )
+
+    assert geocode(street="123 Main St", zipcode="90024") == results
+    assert geocode(street=" 123  MAIN st", zipcode="90024") == results
+    assert geocodio_call.call_count == 1
+
+    # redis miss falls back to the db
+    geocode_cache.clear()
+    assert geocode(street="123 Main St", zipcode="90024") == results
+    assert geocodio_call.call_count == 1
+
+    # different field sets are cached separately
+    assert geocode(street="123 Main St", zipcode="90024", fields="stateleg") == results
+    assert geocodio_call.call_count == 2
+
+
+@pytest.mark.django_db
+def test_cached_bogus_address(requests_mock, geocode_cache):
+    geocodio_call = requests_mock.register_uri("GET", API_ENDPOINT, status_code=422)
+
+    assert geocode(street="nowhere") is None
+    assert geocode(street="nowhere") is None
+    assert geocodio_call.call_count == 1
+    assert GeocodeResult.objects.get(key=geocode_cache_key({"street": "nowhere"}))
+
+
+@pytest.mark.django_db
+def test_errors_not_cached(requests_mock, geocode_cache):
+    geocodio_call = requests_mock.register_uri("GET", API_ENDPOINT, status_code=403)
+
+    assert geocode(street="123 Main St") is None
+    assert geocode(street="123 Main St") is None
+    assert geocodio_call.call_count == 2
+    assert not GeocodeResult.objects.exists()
+
+
+def batch_response(request, context):
+    results = {}
+    for key, query in request.json().items():
+        if "nowhere" in str(query):
+            response = {"error": "Could not geocode address"}
+        else:
+            response = {"results": [{"query": query}]}
+        results[key] = {"query": query, "response": response}
+    return {"results": results}
+
+
+@pytest.mark.django_db
+def test_geocode_batch(requests_mock, geocode_cache, mocker):
+    mocker.patch.object(settings, "GEOCODE_BATCH_SIZE", 2)
+    geocodio_call = requests_mock.register_uri(
+        "POST", API_ENDPOINT, json=batch_response
+    )
+
+    queries = [
+        {"street": "123 Main St", "zipcode": "90024"},
+        {"q": "nowhere"},
+        {"street": "52A St Paul St", "state": "MA"},
+        {"street": " 123  MAIN st", "zipcode": "90024"},
+    ]
+    assert geocode_batch(queries) == [
+        ([{"query": {"street": "123 Main St", "postal_code": "90024"}}], None),
+        (None, "Could not geocode address"),
+        ([{"query": {"street": "52 St Paul St", "state": "MA"}}], None),
+        ([{"query": {"street": "123 Main St", "postal_code": "90024"}}], None),
+    ]
+    # 3 distinct addresses, 2 per request
+    assert geocodio_call.call_count == 2
+
+    # all cached, including the bogus address
+    assert geocode_batch(queries[:2]) == [
+        ([{"query": {"street": "123 Main St", "postal_code": "90024"}}], None),
+        (None, "Unable to geocode"),
+    ]
+    assert geocode(q="nowhere") is None
+    assert geocodio_call.call_count == 2
+
+
+@pytest.mark.django_db
+def test_geocode_batch_errors_not_cached(requests_mock, geocode_cache):
+    geocodio_call = requests_mock.register_uri("POST", API_ENDPOINT, status_code=500)
+
+    assert geocode_batch([{"q": "123 Main St"}]) == [
+        (None, "Error querying geocod.io, status code 500")
+    ]
+    assert "fields" not in geocodio_call.last_request.qs
+    assert not GeocodeResult.objects.exists()
+
+
+def test_cache_key_field_order():
+    assert geocode_cache_key({"q": "x", "fields": "cd,stateleg"}) == geocode_cache_key(
+        {"q": "X", "fields": "stateleg, cd"}
+    )
+
+
 @pytest.mark.parametrize(
     "location,inside",
     [
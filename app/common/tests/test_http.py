@@ -0,0 +1,31 @@
+import requests
+
+from common.http import get_session
+
+
+def test_sessions_are_shared():
+    s = get_session("geocodio")
+    assert get_session("geocodio") is s
+    assert get_session("targetsmart") is not s
+
+
+def test_sessions_by_headers():
+    s = get_session("actionnetwork", headers={"OSDI-API-Token": "a"})
+    assert get_session("actionnetwork", headers={"OSDI-API-Token": "a"}) is s
+    assert get_session("actionnetwork", headers={"OSDI-API-Token": "b"}) is not s
+    assert s.headers["OSDI-API-Token"] == "a"
+
+
+def test_default_timeout(mocker):
+    send = mocker.patch("requests.adapters.HTTPAdapter.send")
+    send.return_value.status_code = 200
+
+    url = "https://api.geocod.io/v1.5/geocode"
+    adapter = get_session("geocodio").get_adapter(url)
+    request = requests.Request("GET", url).prepare()
+
+    adapter.send(request)
+    assert send.call_args[1]["timeout"] == 6.0
+
+    adapter.send(request, timeout=1)
+    assert send.call_args[1]["timeout"] == 1
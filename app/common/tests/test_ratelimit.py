@@ -0,0 +1,76 @@
+import pytest
+from celery.exceptions import Ignore
+from celery.utils.threads import LocalStack
+
+from common.ratelimit import RateLimitedTask, delivery_queue, queue_bucket
+
+
+class Request:
+    def __init__(self, routing_key=None, called_directly=False):
+        self.delivery_info = {"routing_key": routing_key} if routing_key else None
+        self.called_directly = called_directly
+        self.expires = None
+
+
+def test_delivery_queue():
+    assert delivery_queue(Request("voter.#")) == "voter"
+    assert delivery_queue(Request("lob.#")) == "lob-status-updates"
+    # created on demand
+    assert delivery_queue(Request("voter-wi")) == "voter-wi"
+    assert delivery_queue(Request()) is None
+
+
+def test_queue_bucket(settings):
+    settings.BULK_QUEUE_RATE_LIMITS = {"voter": 1 / 10}
+    bucket = queue_bucket("voter")
+    assert bucket.name == "voter"
+    assert bucket.rate == 10
+    assert queue_bucket("default") is None
+
+
+class AddTask(RateLimitedTask):
+    name = "test.add"
+
+    def run(self, a, b):
+        return a + b
+
+
+@pytest.fixture
+def task(mocker):
+    task = AddTask()
+    task.request_stack = LocalStack()
+    mocker.patch.object(AddTask, "signature_from_request")
+    return task
+
+
+def test_rate_limited_task(task, mocker):
+    bucket = mocker.patch("common.ratelimit.queue_bucket").return_value
+    bucket.acquire.return_value = True
+
+    task.request_stack.push(Request("voter.#"))
+    assert task(1, 2) == 3
+    bucket.acquire.assert_called_once()
+
+
+def test_rate_limited_task_requeued(task, mocker, settings):
+    settings.BULK_QUEUE_MAX_WAIT = 10
+    bucket = mocker.patch("common.ratelimit.queue_bucket").return_value
+    bucket.acquire.return_value = False
+
+    task.request_stack.push(Request("voter.#"))
+    with pytest.raises(Ignore):
+        task(1, 2)
+    bucket.acquire.assert_called_once_with(timeout=10)
+    request = task.request_stack.top
+    task.signature_from_request.assert_called_once_with(
+        request, (1, 2), {}, queue="voter"
+    )
+    task.signature_from_request.return_value.apply_async.assert_called_once_with()
+
+
+def test_not_rate_limited(task, mocker):
+    queue_bucket = mocker.patch("common.ratelimit.queue_bucket")
+
+    task.request_stack.push(Request(called_directly=True))
+    assert task(1, 2) == 3
+    queue_bucket.assert_not_called()
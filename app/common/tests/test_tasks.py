@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+from common.models import DelayedTask
+from common.tasks import deliver_delayed_tasks, prune_delayed_tasks
+
+
+@pytest.mark.django_db
+def test_deliver_delayed_tasks(mocker, settings):
+    settings.DELAYED_TASKS_BATCH_SIZE = 2
+    settings.DELAYED_TASKS_DELIVERERS = 2
+    mocker.patch("common.models.app.producer_or_acquire")
+    send_task = mocker.patch("common.models.app.send_task")
+    drain = mocker.patch("common.tasks.drain_delayed_tasks.delay")
+    now = datetime.datetime.now().replace(tzinfo=datetime.timezone.utc)
+    for i in range(5):
+        DelayedTask.schedule(now - datetime.timedelta(minutes=i), "foo", i)
+    DelayedTask.schedule(now + datetime.timedelta(hours=1), "foo", 5)
+
+    deliver_delayed_tasks()
+
+    # one more deliverer was started, but we drained the whole backlog here
+    drain.assert_called_once()
+    assert send_task.call_count == 5
+    assert sorted(c[1]["args"][0] for c in send_task.call_args_list) == list(range(5))
+    assert DelayedTask.objects.filter(started_at__isnull=True).count() == 1
+
+
+@pytest.mark.django_db
+def test_prune_delayed_tasks(settings):
+    settings.DELAYED_TASKS_RETENTION_DAYS = 30
+    now = datetime.datetime.now().replace(tzinfo=datetime.timezone.utc)
+    old = DelayedTask.schedule(now - datetime.timedelta(days=60), "foo")
+    old.started_at = now - datetime.timedelta(days=60)
+    old.save()
+    recent = DelayedTask.schedule(now - datetime.timedelta(days=1), "foo")
+    recent.started_at = now - datetime.timedelta(days=1)
+    recent.save()
+    pending = DelayedTask.schedule(now - datetime.timedelta(days=60), "foo")
+
+    prune_delayed_tasks()
+
+    assert set(DelayedTask.objects.values_list("uuid", flat=True)) == {
+        recent.uuid,
+        pending.uuid,
+    }
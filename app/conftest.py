@@ -6,3 +6,12 @@ def mask_optimizely(mocker):
     mocker.patch("common.rollouts.PollingConfigManager")
     mocker.patch("common.rollouts.optimizely.Optimizely")
     mocker.patch("common.rollouts.optimizely_client")
+
+
+@pytest.fixture(autouse=True)
+def reset_state_snapshot():
+    # each process keeps its own snapshot of state information; don't let
+    # one test's states leak into the next
+    from election.snapshot import invalidate_local
+
+    invalidate_local()
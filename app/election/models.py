@@ -14,6 +14,7 @@ from common.fields import TurnoutEnumField
 from common.utils.models import TimestampModel, UUIDModel
 
 from .choices import STATES
+from .snapshot import get_snapshot, invalidate
 
 
 class NonTerritoryManager(models.Manager):
@@ -49,12 +50,7 @@ class State(TimestampModel):
 
     @cached_property
     def data(self) -> Dict[(str, Union[datetime.date, str, bool, None])]:
-        data = {}
-        for item in self.stateinformation_set.only(
-            "field_type__slug", "text", "field_type__field_format"
-        ):
-            data[item.field_type.slug] = item.formal_format
-        return data
+        return dict(get_snapshot().state(self.code))
 
 
 class StateInformationFieldType(UUIDModel, TimestampModel):
@@ -150,6 +146,7 @@ class UpdateNotificationWebhook(UUIDModel, TimestampModel):
 
 @receiver(post_save, sender=StateInformationFieldType)
 def process_information_field(sender, instance, **kwargs):
+    invalidate()
     purge_cdn_tags(["state", "stateinformationfield", "stateinformationfieldtype"])
     if kwargs["created"]:
         for state in State.states.all():
@@ -159,5 +156,9 @@ def process_information_field(sender, instance, **kwargs):
 
 @receiver(post_save, sender=StateInformation)
 def process_state_information(sender, instance, **kwargs):
+    from .tasks import schedule_netlify_trigger
+
+    invalidate()
     if not kwargs["created"]:
         purge_cdn_tag(str(instance.state_id))
+        schedule_netlify_trigger()
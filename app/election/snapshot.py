@@ -0,0 +1,226 @@
+# An in-process snapshot of every StateInformation value.
+#
+# State information is read on many hot paths, but changes rarely (and only
+# through the admin), so each process loads all of it at once and answers
+# lookups from memory.  The snapshot is immutable and stamped with the
+# latest modified_at of the rows (and field types) it was loaded from.
+#
+# Saving StateInformation (or a field type) publishes on a redis channel;
+# every process listens on a background thread and marks its snapshot
+# stale, and the next lookup reloads it.  If we can't listen (e.g., redis
+# is down), a snapshot is only trusted for STATE_SNAPSHOT_MAX_AGE seconds.
+# Even while listening, it is only trusted for
+# STATE_SNAPSHOT_LISTENING_MAX_AGE seconds, since a connection that has gone
+# half-open can look healthy for a long time before we notice.
+import datetime
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from common.analytics import statsd
+
+logger = logging.getLogger("election")
+
+CHANNEL = "state_information:invalidate"
+
+# how long to wait before listening again after losing the connection
+LISTEN_RETRY_SECONDS = 5
+# how long each poll for a message waits, and how often an idle listening
+# connection is checked with a PING
+LISTEN_POLL_SECONDS = 1
+LISTEN_HEALTH_CHECK_SECONDS = 30
+
+
+class StateSnapshot:
+    def __init__(
+        self,
+        version: Optional[datetime.datetime],
+        values: Dict[Tuple[str, str], Any],
+        texts: Dict[Tuple[str, str], str],
+    ):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._values = MappingProxyType(values)
+        self._texts = MappingProxyType(texts)
+        states: Dict[str, Dict[str, Any]] = {}
+        for (state, slug), value in values.items():
+            states.setdefault(state, {})[slug] = value
+        self._states = MappingProxyType(
+            {state: MappingProxyType(data) for state, data in states.items()}
+        )
+
+    def get(self, state: str, slug: str, default: Any = None) -> Any:
+        """
+        A field's value, typed per its field format (see
+        StateInformation.formal_format).
+        """
+        return self._values.get((state, slug), default)
+
+    def text(self, state: str, slug: str) -> Optional[str]:
+        """
+        A field's raw text, or None if the state doesn't have that field.
+        """
+        return self._texts.get((state, slug))
+
+    def state(self, state: str) -> Mapping[str, Any]:
+        """
+        All of a state's (typed) values, by slug.
+        """
+        return self._states.get(state, MappingProxyType({}))
+
+
+_lock = threading.Lock()
+_snapshot: Optional[StateSnapshot] = None
+_snapshot_generation = -1
+# bumped by every invalidation
+_generation = 0
+_listener_pid: Optional[int] = None
+_listening = False
+
+
+def load() -> StateSnapshot:
+    from .models import StateInformation
+
+    values = {}
+    texts = {}
+    version = None
+    for info in StateInformation.objects.select_related("field_type").only(
+        "state",
+        "text",
+        "modified_at",
+        "field_type__slug",
+        "field_type__field_format",
+        "field_type__modified_at",
+    ):
+        key = (info.state_id, info.field_type.slug)
+        values[key] = info.formal_format
+        texts[key] = info.text
+        modified_at = max(info.modified_at, info.field_type.modified_at)
+        if not version or modified_at > version:
+            version = modified_at
+    return StateSnapshot(version, values, texts)
+
+
+def get_snapshot() -> StateSnapshot:
+    global _snapshot, _snapshot_generation
+
+    _ensure_listener()
+    snapshot = _snapshot
+    if _listening:
+        max_age = settings.STATE_SNAPSHOT_LISTENING_MAX_AGE
+    else:
+        max_age = settings.STATE_SNAPSHOT_MAX_AGE
+    if (
+        snapshot
+        and _snapshot_generation == _generation
+        and time.monotonic() - snapshot.loaded_at < max_age
+    ):
+        return snapshot
+
+    with _lock:
+        # someone else may have just reloaded it
+        if (
+            _snapshot
+            and _snapshot is not snapshot
+            and _snapshot_generation == _generation
+        ):
+            return _snapshot
+        generation = _generation
+        with statsd.timed("turnout.election.state_snapshot.load"):
+            _snapshot = load()
+        _snapshot_generation = generation
+        logger.info(f"Loaded state information snapshot version {_snapshot.version}")
+        return _snapshot
+
+
+def invalidate_local() -> None:
+    global _generation
+    _generation += 1
+
+
+def invalidate() -> None:
+    """
+    Mark every process's snapshot stale, once the current transaction
+    commits.
+    """
+    invalidate_local()
+    transaction.on_commit(_publish)
+
+
+def _publish() -> None:
+    # (and in case we loaded the old data since invalidate())
+    invalidate_local()
+    try:
+        get_redis_connection("default").publish(cache.make_key(CHANNEL), "1")
+    except Exception as e:
+        logger.warning(f"Unable to publish state information invalidation: {e}")
+
+
+def _ensure_listener() -> None:
+    global _listener_pid, _listening
+
+    # one listener per process; threads don't survive a fork
+    if _listener_pid == os.getpid():
+        return
+    with _lock:
+        if _listener_pid == os.getpid():
+            return
+        # the parent's listener isn't listening for us
+        _listening = False
+        _listener_pid = os.getpid()
+        thread = threading.Thread(
+            target=_listen, name="state-snapshot-listener", daemon=True
+        )
+        thread.start()
+
+
+def _pubsub() -> redis.client.PubSub:
+    # A connection pool of our own, so that the listening connection is
+    # health checked (and times out) without changing how every other redis
+    # connection behaves.
+    pool = get_redis_connection("default").connection_pool
+    kwargs = dict(pool.connection_kwargs)
+    kwargs["health_check_interval"] = LISTEN_HEALTH_CHECK_SECONDS
+    kwargs["socket_timeout"] = LISTEN_HEALTH_CHECK_SECONDS
+    client = redis.Redis(
+        connection_pool=redis.ConnectionPool(
+            connection_class=pool.connection_class, max_connections=1, **kwargs
+        )
+    )
+    return client.pubsub(ignore_subscribe_messages=True)
+
+
+def _listen() -> None:
+    global _listening
+
+    while True:
+        pubsub = None
+        try:
+            pubsub = _pubsub()
+            pubsub.subscribe(cache.make_key(CHANNEL))
+            _listening = True
+            # we may have missed something while we weren't listening
+            invalidate_local()
+            while True:
+                # (this is also when the connection is health checked)
+                if pubsub.get_message(timeout=LISTEN_POLL_SECONDS):
+                    invalidate_local()
+                    statsd.increment("turnout.election.state_snapshot.invalidated")
+        except Exception as e:
+            logger.warning(f"Lost state information invalidation channel: {e}")
+        _listening = False
+        if pubsub:
+            try:
+                pubsub.reset()
+            except Exception:
+                pass
+        time.sleep(LISTEN_RETRY_SECONDS)
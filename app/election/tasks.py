@@ -2,6 +2,8 @@ import logging
 
 import requests
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from django.utils.timezone import now
 
@@ -13,30 +15,44 @@ from .models import StateInformation, UpdateNotificationWebhook
 logger = logging.getLogger("election")
 
 
+def last_updated():
+    if not StateInformation.objects.exists():
+        return None
+    return StateInformation.objects.latest("modified_at").modified_at
+
+
 @shared_task
 @statsd.timed("turnout.election.trigger_netlify_webhook")
 def trigger_netlify(webhook_pk):
     webhook = UpdateNotificationWebhook.objects.get(pk=webhook_pk)
+    # Several triggers for the same edits (from the cron and from the edits
+    # themselves) only rebuild once.
+    updated = last_updated()
+    if webhook.last_triggered and updated and webhook.last_triggered > updated:
+        logger.info(f"Netlify Trigger: {webhook} is already up to date")
+        statsd.increment("turnout.election.trigger_netlify_webhook.coalesced")
+        return
+
+    triggered = now()
     result = requests.post(webhook.trigger_url, data={})
     logger.info(f"Netlify Trigger: {webhook} triggered, status {result.status_code}")
-    webhook.last_triggered = now()
+    webhook.last_triggered = triggered
     webhook.save()
 
 
 @shared_task
 @statsd.timed("turnout.election.check_for_updates_cron")
 def trigger_netlify_if_updates():
-    if not StateInformation.objects.exists():
+    updated = last_updated()
+    if not updated:
         logger.info("Netlify Trigger: State Information API Empty")
         return
 
-    last_updated = StateInformation.objects.latest("modified_at").modified_at
-
-    logger.info(f"Netlify Trigger: Last Updated {last_updated}")
+    logger.info(f"Netlify Trigger: Last Updated {updated}")
 
     todo_webhooks = UpdateNotificationWebhook.objects.filter(
         active=True, type=NotificationWebhookTypes.NETLIFY,
-    ).filter(Q(last_triggered__isnull=True) | Q(last_triggered__lte=last_updated))
+    ).filter(Q(last_triggered__isnull=True) | Q(last_triggered__lte=updated))
 
     logger.info(
         f"Netlify Trigger: Found {todo_webhooks.count()} Netlify webhooks to trigger"
@@ -47,6 +63,23 @@ def trigger_netlify_if_updates():
         res = trigger_netlify.apply_async(args=(webhook.pk,), expires=timeout)
 
 
+def schedule_netlify_trigger():
+    """
+    Trigger the netlify webhooks NETLIFY_TRIGGER_DEBOUNCE_SECONDS from now,
+    unless that's already scheduled, so that a batch of edits makes one
+    rebuild.
+    """
+    debounce = settings.NETLIFY_TRIGGER_DEBOUNCE_SECONDS
+    try:
+        if not cache.add("netlify_trigger:scheduled", True, debounce):
+            return
+    except Exception as e:
+        # the cron will catch it
+        logger.warning(f"Unable to schedule netlify trigger: {e}")
+        return
+    trigger_netlify_if_updates.apply_async(countdown=debounce)
+
+
 @shared_task
 def publish_external_tool_redirects():
     from .external_redirects import publish
@@ -0,0 +1,111 @@
+import pytest
+from model_bakery import baker
+
+from common.enums import StateFieldFormats
+from election import snapshot as state_snapshot
+from election.models import StateInformation
+from election.snapshot import get_snapshot, load
+
+
+@pytest.fixture
+def boolean_field(mocker):
+    mocker.patch("election.models.purge_cdn_tags")
+    mocker.patch("election.models.purge_cdn_tag")
+    mocker.patch("election.tasks.schedule_netlify_trigger")
+    field_type = baker.make_recipe(
+        "election.markdown_field_type",
+        slug="vbm_universal",
+        field_format=StateFieldFormats.BOOLEAN,
+    )
+    info = StateInformation.objects.get(state_id="MA", field_type=field_type)
+    info.text = "True"
+    info.save()
+    return info
+
+
+@pytest.mark.django_db
+def test_load(boolean_field):
+    snapshot = load()
+    assert snapshot.get("MA", "vbm_universal") is True
+    assert snapshot.text("MA", "vbm_universal") == "True"
+    # every state gets every field, empty by default
+    assert snapshot.get("WI", "vbm_universal") is None
+    assert snapshot.text("WI", "vbm_universal") == ""
+    assert snapshot.get("MA", "nonexistent", "default") == "default"
+    assert snapshot.text("MA", "nonexistent") is None
+    assert snapshot.state("MA")["vbm_universal"] is True
+    assert snapshot.state("ZZ") == {}
+    assert snapshot.version == boolean_field.modified_at
+
+
+@pytest.mark.django_db
+def test_snapshot_reused():
+    assert get_snapshot() is get_snapshot()
+
+
+@pytest.mark.django_db
+def test_snapshot_invalidated_by_save(boolean_field):
+    snapshot = get_snapshot()
+    assert snapshot.get("MA", "vbm_universal") is True
+
+    boolean_field.text = "False"
+    boolean_field.save()
+
+    reloaded = get_snapshot()
+    assert reloaded is not snapshot
+    assert reloaded.get("MA", "vbm_universal") is False
+    assert reloaded.version == boolean_field.modified_at
+
+
+@pytest.mark.django_db
+def test_snapshot_expires(mocker, settings):
+    settings.STATE_SNAPSHOT_MAX_AGE = 60
+    snapshot = get_snapshot()
+
+    monotonic = mocker.patch("election.snapshot.time.monotonic")
+    monotonic.return_value = snapshot.loaded_at + 30
+    assert get_snapshot() is snapshot
+    monotonic.return_value = snapshot.loaded_at + 61
+    assert get_snapshot() is not snapshot
+
+
+@pytest.mark.django_db
+def test_snapshot_expires_while_listening(mocker, settings):
+    settings.STATE_SNAPSHOT_LISTENING_MAX_AGE = 600
+    mocker.patch("election.snapshot._ensure_listener")
+    mocker.patch("election.snapshot._listening", True)
+    snapshot = get_snapshot()
+
+    monotonic = mocker.patch("election.snapshot.time.monotonic")
+    monotonic.return_value = snapshot.loaded_at + 300
+    assert get_snapshot() is snapshot
+    monotonic.return_value = snapshot.loaded_at + 601
+    assert get_snapshot() is not snapshot
+
+
+def test_listener_reset_after_fork(mocker):
+    thread = mocker.patch("election.snapshot.threading.Thread")
+    mocker.patch("election.snapshot._listener_pid", -1)
+    mocker.patch("election.snapshot._listening", True)
+
+    state_snapshot._ensure_listener()
+    # we don't trust the parent's listener until ours subscribes
+    assert state_snapshot._listening is False
+    thread.return_value.start.assert_called_once()
+
+
+def test_listen(mocker):
+    class Stop(Exception):
+        pass
+
+    pubsub = mocker.patch("election.snapshot._pubsub").return_value
+    pubsub.get_message.side_effect = [None, {"data": "1"}, ConnectionError("gone")]
+    mocker.patch("election.snapshot.time.sleep", side_effect=Stop)
+    generation = state_snapshot._generation
+
+    with pytest.raises(Stop):
+        state_snapshot._listen()
+    # once on subscribing, once for the message
+    assert state_snapshot._generation == generation + 2
+    assert state_snapshot._listening is False
+    pubsub.reset.assert_called_once()
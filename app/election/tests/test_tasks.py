@@ -81,3 +81,21 @@ def test_trigger_netlify(requests_mock, freezer):
     assert new_webhook.last_triggered == datetime(2009, 1, 20, 12, tzinfo=pytz.utc)
     assert trigger_request.last_request.url == "http://test.local/test_the_call"
     assert trigger_request.last_request.body == None
+
+
+@pytest.mark.django_db
+def test_trigger_netlify_coalesced(requests_mock, freezer):
+    freezer.move_to("2009-01-20 10:30:00")
+    baker.make_recipe("election.markdown_information")
+    freezer.move_to("2009-01-20 12:00:00")
+    trigger_request = requests_mock.register_uri(
+        "POST", "http://test.local/test_the_call"
+    )
+    # triggered after the last update
+    webhook = baker.make_recipe(
+        "election.netlify_webhook",
+        trigger_url="http://test.local/test_the_call",
+        last_triggered="2009-01-20 11:00:00-0000",
+    )
+    tasks.trigger_netlify(webhook.uuid)
+    assert not trigger_request.called
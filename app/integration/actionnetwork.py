@@ -1,15 +1,20 @@
 import datetime
 import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import requests
 import sentry_sdk
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, OuterRef, Q
 
 from absentee.models import BallotRequest
+from common.analytics import statsd
 from common.apm import tracer
 from common.enums import ExternalToolType, SubscriberPlan
+from common.http import get_session as get_http_session
+from common.ratelimit import TokenBucket
 from multi_tenant.models import Client, SubscriberIntegrationProperty
 from register.models import Registration
 from reminder.models import ReminderRequest
@@ -18,10 +23,11 @@ from verifier.models import Lookup
 
 from .models import Link
 
-FORM_ENDPOINT = "https://actionnetwork.org/api/v2/forms/"
-ADD_ENDPOINT = "https://actionnetwork.org/api/v2/forms/{form_id}/submissions/"
-PEOPLE_ENDPOINT = "https://actionnetwork.org/api/v2/people/{person_id}/"
-PERSON_HELPER_ENDPOINT = "https://actionnetwork.org/api/v2/people/"
+# relative to settings.ACTIONNETWORK_API_URL; see api_url()
+FORM_ENDPOINT = "forms/"
+ADD_ENDPOINT = "forms/{form_id}/submissions/"
+PEOPLE_ENDPOINT = "people/{person_id}/"
+PERSON_HELPER_ENDPOINT = "people/"
 
 logger = logging.getLogger("integration")
 
@@ -35,6 +41,13 @@ ACTIONS = {
     "reminderrequest": "Reminder",
 }
 
+SYNC_MODELS = {
+    "lookup": Lookup,
+    "registration": Registration,
+    "ballotrequest": BallotRequest,
+    "reminderrequest": ReminderRequest,
+}
+
 CACHE_KEY = "actionnetwork-forms"
 
 
@@ -43,23 +56,11 @@ class ActionNetworkError(Exception):
 
 
 def get_session(api_key):
-    from requests.adapters import HTTPAdapter
-    from requests.packages.urllib3.util.retry import Retry
-
-    session = requests.Session()
-    session.headers["OSDI-API-Token"] = api_key
-    session.mount(
-        "https://",
-        HTTPAdapter(
-            max_retries=Retry(
-                total=1,
-                backoff_factor=1,
-                status_forcelist=[500, 502, 503, 504],
-                method_whitelist=["HEAD", "GET", "POST", "PUT"],
-            )
-        ),
-    )
-    return session
+    return get_http_session("actionnetwork", headers={"OSDI-API-Token": api_key})
+
+
+def api_url(endpoint: str, **kwargs) -> str:
+    return settings.ACTIONNETWORK_API_URL + endpoint.format(**kwargs)
 
 
 def get_form_title(action_desc, prefix):
@@ -129,7 +130,7 @@ def setup_action_forms(subscriber_id, api_key, slug):
     prefix = settings.ACTIONNETWORK_FORM_PREFIX
     forms = {}
     with tracer.trace("an.form", service="actionnetwork"):
-        nexturl = FORM_ENDPOINT
+        nexturl = api_url(FORM_ENDPOINT)
         while nexturl:
             logger.info(nexturl)
             response = session.get(nexturl)
@@ -142,7 +143,8 @@ def setup_action_forms(subscriber_id, api_key, slug):
                         if title != form["title"]:
                             logger.info(f"Fixing title for {va_action} form {an_id}")
                             response = session.put(
-                                FORM_ENDPOINT + f"/{an_id}", json={"title": title,},
+                                api_url(FORM_ENDPOINT) + f"/{an_id}",
+                                json={"title": title,},
                             )
 
             nexturl = response.json().get("_links", {}).get("next", {}).get("href")
@@ -156,7 +158,7 @@ def setup_action_forms(subscriber_id, api_key, slug):
                 if subscriber_id and slug:
                     form_id += "_" + slug
                 response = session.post(
-                    FORM_ENDPOINT,
+                    api_url(FORM_ENDPOINT),
                     json={
                         "identifiers": [form_id],
                         "title": get_form_title(tool, prefix),
@@ -173,13 +175,25 @@ def setup_action_forms(subscriber_id, api_key, slug):
     return forms
 
 
-def post_person(info, form_id, api_key, slug):
+def key_bucket(subscriber_id: Optional[str], dry_run: bool = False) -> TokenBucket:
+    """
+    The rate limit for a subscriber's ActionNetwork key (or ours), which
+    every request to that key takes a token from.
+    """
+    prefix = "actionnetwork-dry-run" if dry_run else "actionnetwork"
+    return TokenBucket(
+        f"{prefix}:{subscriber_id or 'default'}", settings.ACTIONNETWORK_SYNC_RATE
+    )
+
+
+def post_person(info, form_id, api_key, slug, bucket: TokenBucket):
     from common.apm import tracer
 
     session = get_session(api_key)
-    url = ADD_ENDPOINT.format(form_id=form_id)
+    url = api_url(ADD_ENDPOINT, form_id=form_id)
     try:
         with tracer.trace("an.form.submission", service="actionnetwork"):
+            bucket.acquire()
             response = session.post(url, json=info,)
             if response.status_code != 200:
                 extra = {"url": url, "info": info, "status_code": response.status_code}
@@ -202,8 +216,9 @@ def post_person(info, form_id, api_key, slug):
             if slug and not response.json().get("custom_fields", {}).get(
                 "first_subscriber"
             ):
+                bucket.acquire()
                 response = session.put(
-                    PEOPLE_ENDPOINT.format(person_id=person_id),
+                    api_url(PEOPLE_ENDPOINT, person_id=person_id),
                     json={"custom_fields": {"subscriber": slug,},},
                 )
 
@@ -223,35 +238,10 @@ def post_person(info, form_id, api_key, slug):
     return person_id
 
 
-@tracer.wrap()
-def sync_item(item):
-    if settings.ACTIONNETWORK_SYNC and item.action:
-        _sync_item(item, None)
-        if item.action.visible_to_subscriber:
-            _sync_item(item, item.subscriber_id)
-
-
-def _sync_item(item, subscriber_id):
-    api_key = get_api_key(subscriber_id)
-    if not api_key:
-        return
-
-    if item.subscriber.default_slug:
-        slug = item.subscriber.default_slug.slug
-    else:
-        slug = None  # this is not good
-
-    forms = setup_action_forms(subscriber_id, api_key, slug)
-    action = str(item.__class__.__name__).lower()
-    tool = ACTIONS[action]
-    form_id = forms.get(action)
-
-    extra = {"subscriber_id": subscriber_id, "item": item}
-    logger.info(
-        f"actionnetwork: Sync %(item)s, subscriber %(subscriber_id)s",
-        extra,
-        extra=extra,
-    )
+def person_info(
+    item, subscriber_id: Optional[str], slug: Optional[str], phone_opted_out: bool
+) -> Dict[str, Any]:
+    tool = ACTIONS[str(item.__class__.__name__).lower()]
     info = {
         "person": {
             "given_name": item.first_name,
@@ -273,12 +263,7 @@ def _sync_item(item, subscriber_id):
     }
     if item.phone:
         info["person"]["phone_numbers"] = [{"number": str(item.phone),}]
-        if (
-            (not subscriber_id or item.sms_opt_in_subscriber)
-            and not Number.objects.filter(
-                phone=item.phone, opt_out_time__isnull=False
-            ).exists()
-        ):
+        if (not subscriber_id or item.sms_opt_in_subscriber) and not phone_opted_out:
             info["person"]["phone_numbers"][0]["status"] = "subscribed"
     if item.embed_url:
         info["action_network:referrer_data"]["website"] = item.embed_url
@@ -290,9 +275,48 @@ def _sync_item(item, subscriber_id):
         ] = item.mobile_referrer
     if not subscriber_id:
         info["person"]["custom_fields"] = {"last_subscriber": slug}
+    return info
+
+
+@tracer.wrap()
+def sync_item(item):
+    if settings.ACTIONNETWORK_SYNC and item.action:
+        _sync_item(item, None)
+        if item.action.visible_to_subscriber:
+            _sync_item(item, item.subscriber_id)
+
+
+def _sync_item(item, subscriber_id):
+    api_key = get_api_key(subscriber_id)
+    if not api_key:
+        return
+
+    if item.subscriber.default_slug:
+        slug = item.subscriber.default_slug.slug
+    else:
+        slug = None  # this is not good
+
+    forms = setup_action_forms(subscriber_id, api_key, slug)
+    action = str(item.__class__.__name__).lower()
+    form_id = forms.get(action)
+
+    extra = {"subscriber_id": subscriber_id, "item": item}
+    logger.info(
+        f"actionnetwork: Sync %(item)s, subscriber %(subscriber_id)s",
+        extra,
+        extra=extra,
+    )
+    phone_opted_out = bool(item.phone) and (
+        Number.objects.filter(phone=item.phone, opt_out_time__isnull=False).exists()
+    )
+    info = person_info(item, subscriber_id, slug, phone_opted_out)
 
     external_id = post_person(
-        info, form_id, api_key, slug if not subscriber_id else None,
+        info,
+        form_id,
+        api_key,
+        slug if not subscriber_id else None,
+        key_bucket(subscriber_id),
     )
     if external_id:
         Link.objects.create(
@@ -303,65 +327,210 @@ def _sync_item(item, subscriber_id):
         )
 
 
-def sync_all_items(cls):
-    from .tasks import sync_action_to_actionnetwork
-
-    pks = set()
-
+def sync_targets() -> List[Optional[str]]:
+    """
+    The subscribers whose own ActionNetwork API keys we sync to, plus None
+    for ours.
+    """
+    targets: List[Optional[str]] = [None] if settings.ACTIONNETWORK_KEY else []
+    targets += [
+        str(subscriber_id)
+        for subscriber_id in SubscriberIntegrationProperty.objects.filter(
+            subscriber__is_first_party=False,
+            external_tool=ExternalToolType.ACTIONNETWORK,
+            name="api_key",
+        )
+        .order_by()
+        .values_list("subscriber_id", flat=True)
+        .distinct()
+    ]
+    return targets
+
+
+def unsynced_items(
+    cls, subscriber_id: Optional[str], after: Optional[Tuple] = None, limit: int = 100
+) -> List[Any]:
+    """
+    A page of items (oldest first) that haven't been synced to the given
+    subscriber's key (or ours), starting after the (created_at, pk) of the
+    last item of the previous page.
+    """
     cutoff = datetime.datetime.utcnow().replace(
         tzinfo=datetime.timezone.utc
     ) - datetime.timedelta(seconds=settings.ACTION_CHECK_UNFINISHED_DELAY)
-    for item in (
-        cls.objects.annotate(
-            no_sync=~Exists(
-                Link.objects.filter(
-                    subscriber_id=None,
-                    external_tool=ExternalToolType.ACTIONNETWORK,
-                    action=OuterRef("action"),
-                )
+    items = cls.objects.annotate(
+        synced=Exists(
+            Link.objects.filter(
+                subscriber_id=subscriber_id,
+                external_tool=ExternalToolType.ACTIONNETWORK,
+                action=OuterRef("action"),
             )
         )
-        .filter(no_sync=True, action__isnull=False, created_at__lt=cutoff)
-        .order_by("created_at")
-    ):
-        pks.add(str(item.action_id))
-
-    for item in (
-        cls.objects.filter(subscriber__is_first_party=False)
-        .annotate(
-            no_sync=~Exists(
-                Link.objects.filter(
-                    subscriber_id=OuterRef("subscriber"),
-                    external_tool=ExternalToolType.ACTIONNETWORK,
-                    action=OuterRef("action"),
-                )
-            ),
-            has_api_key=Exists(
-                SubscriberIntegrationProperty.objects.filter(
-                    subscriber_id=OuterRef("subscriber"),
-                    external_tool=ExternalToolType.ACTIONNETWORK,
-                    name="api_key",
-                )
-            ),
+    ).filter(synced=False, action__isnull=False, created_at__lt=cutoff)
+    if subscriber_id:
+        items = items.filter(
+            subscriber_id=subscriber_id, action__visible_to_subscriber=True
         )
-        .filter(
-            no_sync=True, has_api_key=True, action__isnull=False, created_at__lt=cutoff
+    if after:
+        created_at, pk = after
+        items = items.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
         )
-        .order_by("created_at")
-    ):
-        pks.add(str(item.action_id))
+    return list(
+        items.select_related("action", "subscriber__default_slug").order_by(
+            "created_at", "pk"
+        )[:limit]
+    )
 
-    logger.info(f"queueing {len(pks)} items to sync to actionnetwork")
-    for pk in pks:
-        sync_action_to_actionnetwork.delay(pk)
+
+def sync_batch(
+    executor: Executor,
+    items: List[Any],
+    subscriber_id: Optional[str],
+    api_key: str,
+    form_id: str,
+    bucket: TokenBucket,
+    dry_run: bool = False,
+) -> int:
+    opted_out = {
+        str(phone)
+        for phone in Number.objects.filter(
+            phone__in=[item.phone for item in items if item.phone],
+            opt_out_time__isnull=False,
+        ).values_list("phone", flat=True)
+    }
+
+    posts = []
+    for item in items:
+        if item.subscriber.default_slug:
+            slug = item.subscriber.default_slug.slug
+        else:
+            slug = None
+        info = person_info(
+            item, subscriber_id, slug, bool(item.phone) and str(item.phone) in opted_out
+        )
+        posts.append((info, slug if not subscriber_id else None))
+
+    person_ids = executor.map(
+        lambda post: post_person(post[0], form_id, api_key, post[1], bucket), posts,
+    )
+    links = [
+        Link(
+            action_id=item.action_id,
+            subscriber_id=subscriber_id,
+            external_tool=ExternalToolType.ACTIONNETWORK,
+            external_id=person_id,
+        )
+        for item, person_id in zip(items, person_ids)
+        if person_id
+    ]
+    if not dry_run:
+        Link.objects.bulk_create(links)
+
+    statsd.increment("turnout.integration.actionnetwork.synced", len(links))
+    statsd.increment(
+        "turnout.integration.actionnetwork.failed", len(items) - len(links)
+    )
+    return len(links)
+
+
+@tracer.wrap()
+def sync_key(
+    subscriber_id: Optional[str] = None,
+    actions: List[str] = None,
+    deadline: float = None,
+    limit: int = None,
+    dry_run: bool = False,
+    before_page: Callable[[], bool] = None,
+) -> Tuple[int, bool]:
+    """
+    Sync unsynced items (of the given actions, or all of them) to a
+    subscriber's key (or ours), ACTIONNETWORK_SYNC_CONCURRENCY at a time,
+    at no more than ACTIONNETWORK_SYNC_RATE requests per second for that
+    key.  Stops at the deadline (a time.monotonic() value) or after limit
+    items.  Returns the number of items synced, and whether there are
+    more left to sync.
+
+    before_page is called before each page of items; if it returns False,
+    we stop (and report nothing more to sync).
+
+    With dry_run, we don't look up (or create) forms or record links; this
+    is for benchmarking against a stand-in server.
+    """
+    api_key = get_api_key(subscriber_id)
+    if not api_key:
+        return 0, False
+
+    slug = None
+    if subscriber_id:
+        subscriber = Client.objects.select_related("default_slug").get(pk=subscriber_id)
+        if subscriber.default_slug:
+            slug = subscriber.default_slug.slug
+
+    if dry_run:
+        forms = {action: f"dry-run-{action}" for action in ACTIONS}
+    else:
+        forms = setup_action_forms(subscriber_id, api_key, slug)
+    bucket = key_bucket(subscriber_id, dry_run=dry_run)
+
+    synced = 0
+    with ThreadPoolExecutor(
+        max_workers=settings.ACTIONNETWORK_SYNC_CONCURRENCY
+    ) as executor:
+        for action in actions or SYNC_MODELS.keys():
+            after = None
+            while True:
+                if deadline and time.monotonic() >= deadline:
+                    return synced, True
+                if before_page and not before_page():
+                    return synced, False
+                batch_size = settings.ACTIONNETWORK_SYNC_BATCH_SIZE
+                if limit is not None:
+                    if synced >= limit:
+                        return synced, True
+                    batch_size = min(batch_size, limit - synced)
+
+                items = unsynced_items(
+                    SYNC_MODELS[action], subscriber_id, after, batch_size
+                )
+                if not items:
+                    break
+                after = (items[-1].created_at, items[-1].pk)
+                synced += sync_batch(
+                    executor,
+                    items,
+                    subscriber_id,
+                    api_key,
+                    forms[action],
+                    bucket,
+                    dry_run=dry_run,
+                )
+
+    logger.info(f"Synced {synced} items to actionnetwork for {subscriber_id or 'us'}")
+    return synced, False
+
+
+def sync_all_items(cls):
+    from .tasks import sync_actionnetwork_key
+
+    if not settings.ACTIONNETWORK_SYNC:
+        return
+    targets = sync_targets()
+    logger.info(f"Syncing {cls.__name__} to {len(targets)} actionnetwork keys")
+    for subscriber_id in targets:
+        sync_actionnetwork_key.delay(subscriber_id, [cls.__name__.lower()])
 
 
 @tracer.wrap()
 def sync():
-    sync_all_items(Lookup)
-    sync_all_items(BallotRequest)
-    sync_all_items(Registration)
-    sync_all_items(ReminderRequest)
+    from .tasks import sync_actionnetwork_key
+
+    if not settings.ACTIONNETWORK_SYNC:
+        return
+    targets = sync_targets()
+    logger.info(f"Syncing to {len(targets)} actionnetwork keys")
+    for subscriber_id in targets:
+        sync_actionnetwork_key.delay(subscriber_id)
 
 
 @tracer.wrap()
@@ -386,7 +555,7 @@ def sync_subscriber(subscriber: Client) -> None:
             },
         },
     }
-    url = ADD_ENDPOINT.format(form_id=form_id)
+    url = api_url(ADD_ENDPOINT, form_id=form_id)
     with tracer.trace("an.subscriber_form", service="actionnetwork"):
         response = session.post(url, json=info)
 
@@ -411,7 +580,7 @@ def get_form(session, form_description: str, form_name: str) -> str:
     if form_id:
         return form_id
 
-    nexturl = FORM_ENDPOINT
+    nexturl = api_url(FORM_ENDPOINT)
     while nexturl:
         with tracer.trace("an.form", service="actionnetwork"):
             response = session.get(nexturl,)
@@ -435,7 +604,7 @@ def create_form(session, form_description: str, form_name: str) -> str:
     logger.info(f"Creating form {form_name}")
     with tracer.trace("an.form_create", service="actionnetwork"):
         response = session.post(
-            FORM_ENDPOINT,
+            api_url(FORM_ENDPOINT),
             json={
                 "identifiers": [f"voteamerica:{form_name}"],
                 "title": form_description,
@@ -490,8 +659,9 @@ def unsubscribe_phone(phone):
     if person_id:
         session = get_session(settings.ACTIONNETWORK_KEY)
         with tracer.trace("an.person_update", service="actionnetwork"):
+            key_bucket(None).acquire()
             response = session.put(
-                PEOPLE_ENDPOINT.format(person_id=person_id),
+                api_url(PEOPLE_ENDPOINT, person_id=person_id),
                 json={
                     "phone_numbers": [{"number": str(phone), "status": "unsubscribed"}]
                 },
@@ -509,8 +679,9 @@ def resubscribe_phone(phone):
     if person_id:
         session = get_session(settings.ACTIONNETWORK_KEY)
         with tracer.trace("an.person_update", service="actionnetwork"):
+            key_bucket(None).acquire()
             response = session.put(
-                PEOPLE_ENDPOINT.format(person_id=person_id),
+                api_url(PEOPLE_ENDPOINT, person_id=person_id),
                 json={
                     "phone_numbers": [{"number": str(phone), "status": "subscribed"}]
                 },
@@ -535,4 +706,5 @@ def add_test_addrs():
             },
             "action_network:referrer_data": {"source": "250ok",},
         }
-        response = session.post(PERSON_HELPER_ENDPOINT, json=info,)
+        key_bucket(None).acquire()
+        response = session.post(api_url(PERSON_HELPER_ENDPOINT), json=info,)
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Just enough of the ActionNetwork API for a sync: form submissions and
+    person updates succeed after a configurable delay.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def respond(self, body):
+        time.sleep(self.latency)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        person_id = str(uuid.uuid4())
+        self.respond(
+            {
+                "_links": {
+                    "osdi:person": {"href": f"http://stand-in/people/{person_id}"}
+                },
+                "custom_fields": {},
+            }
+        )
+
+    def do_PUT(self):
+        self.respond({})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a dry run of the ActionNetwork batch sync (for our key, or a "
+        "subscriber's) against a local stand-in server.  Nothing is recorded."
+    )
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscriber", help="Subscriber id (default: ours)")
+        parser.add_argument("--action", action="append", dest="actions")
+        parser.add_argument("--limit", type=int, default=1000)
+        parser.add_argument(
+            "--latency", type=float, default=0.2, help="Stand-in response time (s)"
+        )
+        parser.add_argument("--rate", type=float, help="Requests/second per key")
+        parser.add_argument("--concurrency", type=int)
+
+    def handle(self, *args, **options):
+        from integration.actionnetwork import sync_key
+
+        StandInHandler.latency = options["latency"]
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        overrides = {
+            "ACTIONNETWORK_API_URL": f"http://127.0.0.1:{server.server_port}/",
+            "ACTIONNETWORK_KEY": "stand-in",
+        }
+        if options["rate"]:
+            overrides["ACTIONNETWORK_SYNC_RATE"] = options["rate"]
+        if options["concurrency"]:
+            overrides["ACTIONNETWORK_SYNC_CONCURRENCY"] = options["concurrency"]
+
+        try:
+            with override_settings(**overrides):
+                start = time.monotonic()
+                synced, _ = sync_key(
+                    options["subscriber"],
+                    options["actions"],
+                    limit=options["limit"],
+                    dry_run=True,
+                )
+                elapsed = time.monotonic() - start
+        finally:
+            server.shutdown()
+
+        self.stdout.write(
+            f"Synced {synced} items in {elapsed:.1f}s ({synced / elapsed:.1f}/s)"
+        )
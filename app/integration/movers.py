@@ -2,6 +2,7 @@ import datetime
 import logging
 import re
 import time
+from typing import Iterable, List
 
 import requests
 import sentry_sdk
@@ -15,12 +16,13 @@ from pdf_template import PDFTemplate, PDFTemplateSection
 from action.models import Action
 from common import enums
 from common.apm import tracer
-from common.pdf.pdftemplate import fill_pdf_template
+from common.pdf.lambdahelpers import get_pdf_template
+from common.pdf.pdftemplate import PDFFillJob, fill_pdf_template, fill_pdf_templates
 from common.rollouts import get_feature_bool, get_feature_int
 from election.models import State, StateInformation
 from event_tracking.models import Event
 from multi_tenant.models import Client
-from official.match import get_regions_for_address
+from official.match import get_regions_for_address, prefetch_geocodes
 from register.contactinfo import get_nvrf_submission_address
 from register.generateform import (
     BLANK_FORMS_COVER_SHEET_8PT_PATH,
@@ -186,11 +188,11 @@ def send_blank_register_forms_tx(offset=0, limit=None) -> None:
         f"send_blank_register_forms_tx offset={offset}, limit={limit}, count={q.count()}, "
         f"async={queue_async}, max_minutes={max_minutes}"
     )
-    for lead in q[offset:end]:
-        if queue_async:
+    if queue_async:
+        for lead in q[offset:end]:
             send_forms_task.apply_async(args=(lead.uuid,), expire=(max_minutes * 60))
-        else:
-            send_blank_register_forms_to_lead(lead)
+    else:
+        send_blank_register_forms_to_leads(q[offset:end])
 
 
 def send_blank_register_forms(offset=0, limit=None, state=None) -> None:
@@ -235,11 +237,11 @@ def send_blank_register_forms(offset=0, limit=None, state=None) -> None:
     logger.info(
         f"send_blank_register_forms states {states}, offset={offset}, limit={limit}, count={q.count()}, async={queue_async}, max_minutes={max_minutes}"
     )
-    for lead in q[0:limit]:
-        if queue_async:
+    if queue_async:
+        for lead in q[0:limit]:
             send_forms_task.apply_async(args=(lead.uuid,), expire=(max_minutes * 60))
-        else:
-            send_blank_register_forms_to_lead(lead)
+    else:
+        send_blank_register_forms_to_leads(q[0:limit])
 
 
 def get_register_form_data(lead: MoverLead):
@@ -304,6 +306,81 @@ def get_register_form_data(lead: MoverLead):
     return form_data
 
 
+def get_blank_register_forms_template(state: str) -> PDFTemplate:
+    if state in ["AL", "WI"]:
+        cover_path = BLANK_FORMS_COVER_SHEET_8PT_PATH
+    elif state in ["MI", "FL"]:
+        cover_path = BLANK_FORMS_COVER_SHEET_9PT_PATH
+    else:
+        cover_path = BLANK_FORMS_COVER_SHEET_PATH
+    return get_pdf_template(
+        [
+            PDFTemplateSection(path=cover_path, is_form=True, flatten_form=True),
+            PDFTemplateSection(
+                path=PRINT_AND_FORWARD_TEMPLATE_PATH, is_form=False, flatten_form=False,
+            ),
+            PDFTemplateSection(
+                path=PRINT_AND_FORWARD_TEMPLATE_PATH, is_form=False, flatten_form=False,
+            ),
+        ]
+    )
+
+
+def get_blank_register_forms_job(lead: MoverLead, subscriber: Client) -> PDFFillJob:
+    item = StorageItem(
+        app=enums.FileType.BLANK_REGISTRATION_FORMS,
+        email=lead.email,
+        subscriber=subscriber,
+    )
+    filename = (
+        slugify(f"{lead.new_state} {lead.last_name} blank-register-forms").lower()
+        + ".pdf"
+    )
+    return PDFFillJob(
+        template=get_blank_register_forms_template(lead.new_state),
+        data=get_register_form_data(lead),
+        item=item,
+        file_name=filename,
+    )
+
+
+@tracer.wrap()
+def generate_blank_register_forms(leads: List[MoverLead]) -> None:
+    # Fill the PDFs for a batch of leads at once; leads whose PDF fails are
+    # left without an item, and are retried by send_blank_register_forms_to_lead
+    subscriber = get_mover_subscriber()
+
+    pending = []
+    for lead in leads:
+        if lead.blank_register_forms_item:
+            continue
+        if not lead.new_region:
+            geocode_lead(lead)
+        pending.append((lead, get_blank_register_forms_job(lead, subscriber)))
+
+    errors = fill_pdf_templates([job for _, job in pending])
+    for (lead, job), error in zip(pending, errors):
+        if error is None:
+            lead.blank_register_forms_item = job.item
+            lead.save(update_fields=["blank_register_forms_item"])
+
+
+def send_blank_register_forms_to_leads(leads: Iterable[MoverLead]) -> None:
+    def send_batch(batch: List[MoverLead]) -> None:
+        generate_blank_register_forms(batch)
+        for lead in batch:
+            send_blank_register_forms_to_lead(lead)
+
+    batch: List[MoverLead] = []
+    for lead in leads:
+        batch.append(lead)
+        if len(batch) >= settings.PDF_BATCH_SIZE:
+            send_batch(batch)
+            batch = []
+    if batch:
+        send_batch(batch)
+
+
 @tracer.wrap()
 def send_blank_register_forms_to_lead(lead: MoverLead) -> None:
     # make sure we've geocoded
@@ -314,50 +391,16 @@ def send_blank_register_forms_to_lead(lead: MoverLead) -> None:
 
     if not lead.blank_register_forms_item:
         # generate PDF
-        form_data = get_register_form_data(lead)
-        item = StorageItem(
-            app=enums.FileType.BLANK_REGISTRATION_FORMS,
-            email=lead.email,
-            subscriber=subscriber,
-        )
-        filename = (
-            slugify(f"{lead.new_state} {lead.last_name} blank-register-forms").lower()
-            + ".pdf"
-        )
-        if lead.new_state in ["AL", "WI"]:
-            cover_path = BLANK_FORMS_COVER_SHEET_8PT_PATH
-        elif lead.new_state in ["MI", "FL"]:
-            cover_path = BLANK_FORMS_COVER_SHEET_9PT_PATH
-        else:
-            cover_path = BLANK_FORMS_COVER_SHEET_PATH
-        fill_pdf_template(
-            PDFTemplate(
-                [
-                    PDFTemplateSection(
-                        path=cover_path, is_form=True, flatten_form=True
-                    ),
-                    PDFTemplateSection(
-                        path=PRINT_AND_FORWARD_TEMPLATE_PATH,
-                        is_form=False,
-                        flatten_form=False,
-                    ),
-                    PDFTemplateSection(
-                        path=PRINT_AND_FORWARD_TEMPLATE_PATH,
-                        is_form=False,
-                        flatten_form=False,
-                    ),
-                ]
-            ),
-            form_data,
-            item,
-            filename,
-        )
-        lead.blank_register_forms_item = item
+        job = get_blank_register_forms_job(lead, subscriber)
+        fill_pdf_template(job.template, job.data, job.item, job.file_name)
+        lead.blank_register_forms_item = job.item
     else:
         logger.info(f"Already generated PDF for {lead}")
 
     if not lead.blank_register_forms_action:
-        lead.blank_register_forms_action = Action.objects.create()
+        lead.blank_register_forms_action = Action.objects.create(
+            source_type=enums.ActionSourceType.MOVER_LEAD
+        )
     else:
         logger.info(f"Already have blank forms action for {lead}")
 
@@ -597,7 +640,22 @@ def geocode_leads(
 
     queue_async = get_feature_bool("movers", "geocode_async")
     max_minutes = get_feature_int("movers", "geocode_max_minutes") or 55
-    for lead in q[0:limit]:
+    leads = list(q[0:limit])
+
+    # geocode every address in bulk up front, so that matching each lead
+    # (here or in its task) finds its addresses in the geocode cache
+    prefetch_geocodes(
+        [
+            (lead.new_address1, lead.new_city, lead.new_state, lead.new_zipcode)
+            for lead in leads
+        ]
+        + [
+            (lead.old_address1, lead.old_city, lead.old_state, lead.old_zipcode)
+            for lead in leads
+        ]
+    )
+
+    for lead in leads:
         if queue_async:
             geocode_mover.apply_async(args=(str(lead.uuid),), expire=(max_minutes * 60))
         else:
@@ -1,6 +1,13 @@
 import logging
+import math
+import time
+import uuid
+from typing import List
 
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
 
 from absentee.models import BallotRequest
 from action.models import Action
@@ -13,7 +20,7 @@ from register.models import Registration
 from reminder.models import ReminderRequest
 from verifier.models import Lookup
 
-from .actionnetwork import sync, sync_all_items, sync_item
+from .actionnetwork import sync, sync_all_items, sync_item, sync_key
 from .models import Link, MoverLead
 
 logger = logging.getLogger("integration")
@@ -37,6 +44,64 @@ def sync_actionnetwork():
     sync()
 
 
+# KEYS: lock; ARGV: token, seconds to extend it by (or 0 to release it)
+# only touches the lock if we still hold it
+LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+  return 0
+end
+if tonumber(ARGV[2]) > 0 then
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+else
+  redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+
+@shared_task(queue="actionnetwork")
+def sync_actionnetwork_key(subscriber_id: str = None, actions: List[str] = None):
+    # One sync per key at a time, so that we don't post the same item twice.
+    # The lock is held for a page at a time (the longest a page can take at
+    # our rate limit, plus some slack), and extended before each page.  Each
+    # item can take two requests: the form submission and a people PUT.
+    conn = get_redis_connection("default")
+    lock = cache.make_key(f"actionnetwork-sync-{subscriber_id or 'default'}")
+    token = uuid.uuid4().hex
+    ttl = (
+        math.ceil(
+            2
+            * settings.ACTIONNETWORK_SYNC_BATCH_SIZE
+            / settings.ACTIONNETWORK_SYNC_RATE
+        )
+        + 120
+    )
+    if not conn.set(lock, token, nx=True, ex=ttl):
+        logger.info(f"actionnetwork sync for {subscriber_id} is already running")
+        return
+    lock_script = conn.register_script(LOCK_SCRIPT)
+
+    def extend_lock() -> bool:
+        if lock_script(keys=[lock], args=[token, ttl]):
+            return True
+        logger.warning(f"Lost the actionnetwork sync lock for {subscriber_id}")
+        return False
+
+    try:
+        _, more = sync_key(
+            subscriber_id,
+            actions,
+            deadline=time.monotonic() + settings.ACTIONNETWORK_SYNC_MAX_SECONDS,
+            before_page=extend_lock,
+        )
+    finally:
+        lock_script(keys=[lock], args=[token, 0])
+
+    # pick up where we left off, giving other tasks a turn at the worker
+    if more:
+        sync_actionnetwork_key.delay(subscriber_id, actions)
+
+
 @shared_task
 def sync_actionnetwork_registrations():
     sync_all_items(Registration)
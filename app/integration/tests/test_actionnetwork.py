@@ -0,0 +1,118 @@
+import pytest
+from model_bakery import baker
+
+from common.enums import ExternalToolType
+from integration import actionnetwork
+from integration.actionnetwork import ACTIONS, sync_key
+from integration.models import Link
+from register.models import Registration
+
+
+def fake_post_person(info, form_id, api_key, slug, bucket):
+    email = info["person"]["email_addresses"][0]["address"]
+    if email.startswith("bad"):
+        return None
+    return f"person-{email}"
+
+
+@pytest.fixture
+def post_person(mocker, settings):
+    settings.ACTIONNETWORK_KEY = "our-key"
+    settings.ACTIONNETWORK_SYNC_BATCH_SIZE = 2
+    # items are otherwise too new to sync
+    settings.ACTION_CHECK_UNFINISHED_DELAY = -60
+    mocker.patch("integration.actionnetwork.TokenBucket")
+    mocker.patch(
+        "integration.actionnetwork.setup_action_forms",
+        return_value={action: f"form-{action}" for action in ACTIONS},
+    )
+    return mocker.patch(
+        "integration.actionnetwork.post_person", side_effect=fake_post_person
+    )
+
+
+@pytest.fixture
+def subscriber():
+    subscriber = baker.make_recipe("multi_tenant.client")
+    baker.make_recipe(
+        "multi_tenant.subscriberslug", subscriber=subscriber, slug="partner"
+    )
+    baker.make(
+        "multi_tenant.SubscriberIntegrationProperty",
+        subscriber=subscriber,
+        external_tool=ExternalToolType.ACTIONNETWORK,
+        name="api_key",
+        value="partner-key",
+    )
+    for email in ["a@example.com", "b@example.com", "bad@example.com"]:
+        baker.make_recipe(
+            "register.registration", subscriber=subscriber, email=email, phone=None
+        )
+    return subscriber
+
+
+@pytest.mark.django_db
+def test_sync_key(post_person, subscriber):
+    assert sync_key(None, ["registration"]) == (2, False)
+    assert post_person.call_count == 3
+    assert post_person.call_args[0][1] == "form-registration"
+    assert post_person.call_args[0][2] == "our-key"
+    assert post_person.call_args[0][3] == "partner"
+    assert set(
+        Link.objects.filter(subscriber=None).values_list("external_id", flat=True)
+    ) == {"person-a@example.com", "person-b@example.com"}
+
+    # only the failure is retried
+    assert sync_key(None, ["registration"]) == (0, False)
+    assert post_person.call_count == 4
+
+    # and then to the partner's own key
+    assert sync_key(str(subscriber.pk), ["registration"]) == (2, False)
+    assert post_person.call_args[0][2] == "partner-key"
+    assert post_person.call_args[0][3] is None
+    assert Link.objects.filter(subscriber=subscriber).count() == 2
+
+
+@pytest.mark.django_db
+def test_sync_key_limit_dry_run(post_person, subscriber):
+    assert sync_key(None, ["registration"], limit=1, dry_run=True) == (1, True)
+    assert post_person.call_args[0][1] == "dry-run-registration"
+    assert not Link.objects.exists()
+
+
+@pytest.mark.django_db
+def test_sync_key_lost_lock(post_person, subscriber):
+    pages = []
+
+    def before_page():
+        # we lose the lock after the first page (of 2 items)
+        pages.append(True)
+        return len(pages) == 1
+
+    assert sync_key(None, ["registration"], before_page=before_page) == (2, False)
+    assert len(pages) == 2
+    assert post_person.call_count == 2
+
+
+@pytest.mark.django_db
+def test_sync_item_rate_limited(post_person, subscriber):
+    item = Registration.objects.filter(subscriber=subscriber).first()
+    actionnetwork._sync_item(item, None)
+    # realtime syncs share the batch sync's limit for the key
+    bucket = actionnetwork.TokenBucket
+    assert bucket.call_args[0][0] == "actionnetwork:default"
+    assert post_person.call_args[0][4] == bucket.return_value
+
+
+def test_post_person_rate_limited(mocker):
+    session = mocker.patch("integration.actionnetwork.get_session").return_value
+    session.post.return_value.status_code = 200
+    session.post.return_value.json.return_value = {
+        "_links": {"osdi:person": {"href": "https://example.com/people/abc"}}
+    }
+    bucket = mocker.Mock()
+
+    assert actionnetwork.post_person({}, "form", "key", "partner", bucket) == "abc"
+    # one token for the submission, and one for setting the subscriber
+    assert bucket.acquire.call_count == 2
+    assert session.put.called
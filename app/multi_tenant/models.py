@@ -3,10 +3,12 @@ from django.conf import settings
 from django.db import models
 from django.template.loader import render_to_string
 from django.utils.functional import cached_property
+from django.utils.timezone import now
 
 from common import enums
 from common.fields import TurnoutEnumField
 from common.utils.models import TimestampModel, UUIDModel
+from reporting.counters import pending_counts
 from reporting.models import StatsRefresh
 
 DISCLAIMER_TEMPLATE = "multi_tenant/disclaimer.txt"
@@ -111,6 +113,13 @@ class Client(UUIDModel, TimestampModel):
         for stat in self.subscriberstats_set.all():
             stats[stat.tool.value] = stat.count
 
+        # add the counts that haven't been flushed yet, if we can get them
+        pending = pending_counts(str(self.pk))
+        if pending is not None:
+            stats["last_updated"] = now()
+            for tool, count in pending.items():
+                stats[tool] += count
+
         return stats
 
     @cached_property
@@ -0,0 +1,168 @@
+# Precomputed contact info for each region (official.RegionContactInfo).
+#
+# Choosing the address, email, phone and fax to give out for a region
+# means looking at all of its addresses (and its LeoContactOverride), so
+# we do that in bulk, in the database, and look the result up by region:
+#  - after each USVF sync, for every region;
+#  - when an address or LeoContactOverride is saved, for its region;
+#  - on demand, for a region we don't have a row for yet.
+import logging
+from typing import Dict, Iterable, Optional
+
+from django.db import connection
+
+from common.analytics import statsd
+
+from .models import RegionContactInfo
+
+logger = logging.getLogger("official")
+
+# Lower scores are better.  For absentee ballot (and registration) questions:
+#
+#   1: an office that processes absentee requests (registrations) and is a
+#      physical address
+#   2: an office that processes absentee requests (registrations)
+#   3: all other offices
+#
+# We prioritize physical addresses over mailing addresses because the
+# physical offices can always receive mail, and some kinds of mail (USPS
+# express) can only be delivered to the physical addresses (the mailing
+# addresses are typically PO boxes).
+SCORE_SQL = (
+    "CASE WHEN a.{process} AND a.is_physical THEN 1 WHEN a.{process} THEN 2 ELSE 3 END,"
+    " a.external_id"
+)
+ABSENTEE_ORDER = SCORE_SQL.format(process="process_absentee_requests")
+REGISTER_ORDER = SCORE_SQL.format(process="process_domestic_registrations")
+
+BUILD_SQL = f"""
+INSERT INTO official_regioncontactinfo (
+    region_id, created_at, modified_at,
+    absentee_address_id, absentee_email, absentee_phone, absentee_fax,
+    register_address_id, register_email, register_phone, register_fax,
+    override_email, override_phone, override_fax, submission_method_override
+)
+SELECT
+    r.external_id, NOW(), NOW(),
+    c.absentee_address_id, c.absentee_email, c.absentee_phone, c.absentee_fax,
+    c.register_address_id, c.register_email, c.register_phone, c.register_fax,
+    o.email, o.phone, o.fax, o.submission_method
+FROM official_region r
+LEFT JOIN (
+    SELECT
+        f.region_id,
+        (ARRAY_AGG(a.external_id ORDER BY {ABSENTEE_ORDER}))[1]
+            AS absentee_address_id,
+        (ARRAY_AGG(a.email ORDER BY {ABSENTEE_ORDER})
+            FILTER (WHERE a.email <> ''))[1] AS absentee_email,
+        (ARRAY_AGG(a.phone ORDER BY {ABSENTEE_ORDER})
+            FILTER (WHERE a.phone <> ''))[1] AS absentee_phone,
+        (ARRAY_AGG(a.fax ORDER BY {ABSENTEE_ORDER})
+            FILTER (WHERE a.fax <> ''))[1] AS absentee_fax,
+        (ARRAY_AGG(a.external_id ORDER BY {REGISTER_ORDER}))[1]
+            AS register_address_id,
+        (ARRAY_AGG(a.email ORDER BY {REGISTER_ORDER})
+            FILTER (WHERE a.email <> ''))[1] AS register_email,
+        (ARRAY_AGG(a.phone ORDER BY {REGISTER_ORDER})
+            FILTER (WHERE a.phone <> ''))[1] AS register_phone,
+        (ARRAY_AGG(a.fax ORDER BY {REGISTER_ORDER})
+            FILTER (WHERE a.fax <> ''))[1] AS register_fax
+    FROM official_address a
+    JOIN official_office f ON f.external_id = a.office_id
+    {{region_filter}}
+    GROUP BY f.region_id
+) c ON c.region_id = r.external_id
+LEFT JOIN absentee_leocontactoverride o ON o.region_id = r.external_id
+{{where}}
+ON CONFLICT (region_id) DO UPDATE SET
+    modified_at = excluded.modified_at,
+    absentee_address_id = excluded.absentee_address_id,
+    absentee_email = excluded.absentee_email,
+    absentee_phone = excluded.absentee_phone,
+    absentee_fax = excluded.absentee_fax,
+    register_address_id = excluded.register_address_id,
+    register_email = excluded.register_email,
+    register_phone = excluded.register_phone,
+    register_fax = excluded.register_fax,
+    override_email = excluded.override_email,
+    override_phone = excluded.override_phone,
+    override_fax = excluded.override_fax,
+    submission_method_override = excluded.submission_method_override
+WHERE (
+    official_regioncontactinfo.absentee_address_id,
+    official_regioncontactinfo.absentee_email,
+    official_regioncontactinfo.absentee_phone,
+    official_regioncontactinfo.absentee_fax,
+    official_regioncontactinfo.register_address_id,
+    official_regioncontactinfo.register_email,
+    official_regioncontactinfo.register_phone,
+    official_regioncontactinfo.register_fax,
+    official_regioncontactinfo.override_email,
+    official_regioncontactinfo.override_phone,
+    official_regioncontactinfo.override_fax,
+    official_regioncontactinfo.submission_method_override
+) IS DISTINCT FROM (
+    excluded.absentee_address_id,
+    excluded.absentee_email,
+    excluded.absentee_phone,
+    excluded.absentee_fax,
+    excluded.register_address_id,
+    excluded.register_email,
+    excluded.register_phone,
+    excluded.register_fax,
+    excluded.override_email,
+    excluded.override_phone,
+    excluded.override_fax,
+    excluded.submission_method_override
+)
+"""
+
+
+def rebuild_contact_info(region_ids: Iterable[int] = None) -> int:
+    """
+    Recompute the contact info for the given regions (or all of them).
+    Returns the number of rows that changed.
+    """
+    params = None
+    if region_ids is None:
+        sql = BUILD_SQL.format(region_filter="", where="")
+    else:
+        params = {"region_ids": list(region_ids)}
+        sql = BUILD_SQL.format(
+            region_filter="WHERE f.region_id = ANY(%(region_ids)s)",
+            where="WHERE r.external_id = ANY(%(region_ids)s)",
+        )
+    with statsd.timed("turnout.official.contactinfo.rebuild"):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            changed = cursor.rowcount
+    if region_ids is None:
+        logger.info(f"Rebuilt contact info for all regions; {changed} changed")
+    return changed
+
+
+def contact_info_query():
+    return RegionContactInfo.objects.select_related(
+        "absentee_address__state", "register_address__state"
+    )
+
+
+def get_region_contact_infos(
+    region_ids: Iterable[int],
+) -> Dict[int, RegionContactInfo]:
+    """
+    The contact info for many regions at once, by region id.  Regions that
+    don't exist are left out.
+    """
+    region_ids = set(region_ids)
+    infos = contact_info_query().in_bulk(list(region_ids))
+    missing = list(region_ids - infos.keys())
+    if missing:
+        statsd.increment("turnout.official.contactinfo.miss", len(missing))
+        rebuild_contact_info(missing)
+        infos.update(contact_info_query().in_bulk(missing))
+    return infos
+
+
+def get_region_contact_info(region_id: int) -> Optional[RegionContactInfo]:
+    return get_region_contact_infos([region_id]).get(region_id)
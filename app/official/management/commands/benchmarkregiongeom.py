@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+
+from official.region_geom import LEGACY_LAYERS, layer_queryset, load_layer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare region boundary lookups from the in-process index with the "
+        "same lookups in PostGIS, at random points within each layer"
+    )
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "layers", nargs="*", help="Layers (default: ma_town, wi_mcd)"
+        )
+        parser.add_argument("--points", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        for name in options["layers"] or list(LEGACY_LAYERS):
+            start = time.perf_counter()
+            layer = load_layer(name)
+            load_time = time.perf_counter() - start
+            if not len(layer):
+                self.stdout.write(f"{name}: no features")
+                continue
+
+            bounds = [g.bounds for g in layer.geoms]
+            minx = min(b[0] for b in bounds)
+            miny = min(b[1] for b in bounds)
+            maxx = max(b[2] for b in bounds)
+            maxy = max(b[3] for b in bounds)
+            points = [
+                (rng.uniform(minx, maxx), rng.uniform(miny, maxy))
+                for _ in range(options["points"])
+            ]
+
+            start = time.perf_counter()
+            indexed = [layer.lookup(x, y) for x, y in points]
+            index_time = time.perf_counter() - start
+
+            qs, field = layer_queryset(name)
+            start = time.perf_counter()
+            queried = [
+                qs.filter(geom__intersects=Point(x, y, srid=4326))
+                .values_list(field, flat=True)
+                .first()
+                for x, y in points
+            ]
+            db_time = time.perf_counter() - start
+
+            n = len(points)
+            mismatches = sum(1 for a, b in zip(indexed, queried) if a != b)
+            self.stdout.write(
+                f"{name}: {len(layer)} features loaded in {load_time:.2f}s; "
+                f"{sum(1 for r in indexed if r)}/{n} points matched; "
+                f"index {index_time / n * 1e6:.1f}us/lookup, "
+                f"postgis {db_time / n * 1e6:.1f}us/lookup "
+                f"({db_time / index_time:.0f}x); {mismatches} mismatches"
+            )
@@ -0,0 +1,66 @@
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from official.models import Region, RegionGeom
+from official.region_geom import invalidate_region_geom
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace a state's region boundaries (used to match addresses to "
+        "regions) with the features in a shapefile, GeoJSON file, etc."
+    )
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument("state", type=str)
+        parser.add_argument("path", type=str)
+        parser.add_argument(
+            "--name-field",
+            required=True,
+            help="Feature field holding the region's name, as USVF spells it",
+        )
+        parser.add_argument("--layer", type=int, default=0)
+
+    def handle(self, *args, **options):
+        state = options["state"].upper()
+        layer = DataSource(options["path"])[options["layer"]]
+        if options["name_field"] not in layer.fields:
+            raise CommandError(
+                f"No field {options['name_field']}; fields are {layer.fields}"
+            )
+
+        geoms = []
+        for feature in layer:
+            geom = feature.geom
+            if geom.srs:
+                geom.transform(4326)
+            geom = geom.geos
+            if isinstance(geom, Polygon):
+                geom = MultiPolygon(geom)
+            if not isinstance(geom, MultiPolygon):
+                raise CommandError(f"Feature {feature.fid} is a {geom.geom_type}")
+            geoms.append(
+                RegionGeom(
+                    state_id=state, name=feature.get(options["name_field"]), geom=geom,
+                )
+            )
+
+        with transaction.atomic():
+            RegionGeom.objects.filter(state_id=state).delete()
+            RegionGeom.objects.bulk_create(geoms, batch_size=500)
+            transaction.on_commit(invalidate_region_geom)
+        self.stdout.write(f"Imported {len(geoms)} {state} region boundaries")
+
+        # the matcher only uses features named like one of the state's regions
+        regions = {
+            name.lower()
+            for name in Region.visible.filter(state_id=state).values_list(
+                "name", flat=True
+            )
+            if name
+        }
+        for name in sorted({g.name for g in geoms if g.name.lower() not in regions}):
+            self.stderr.write(f"No {state} region named {name}")
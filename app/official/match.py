@@ -1,8 +1,7 @@
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlencode
 
-import requests
 import sentry_sdk
 from django.conf import settings
 from django.contrib.gis.db.models.functions import Distance
@@ -14,17 +13,24 @@ from common.apm import tracer
 from common.geocode import (
     al_jefferson_county_bessemer_division,
     geocode,
+    geocode_batch,
     ma_location_to_mcd,
     wi_location_to_mcd,
 )
+from common.http import get_session
 
+from . import region_geom
 from .models import Address, Region
+from .region_index import get_state_regions
 
 logger = logging.getLogger("official")
 
 
 TARGETSMART_DISTRICT_API = "https://api.targetsmart.com/service/district"
 
+# what we ask geocod.io for, in addition to the location
+GEOCODE_FIELDS = "stateleg"
+
 
 class TargetSmartAPIError(Exception):
     pass
@@ -94,32 +100,22 @@ def match_region(
     location: Point = None,
     districts: Dict[str, Any] = None,
 ) -> Optional[List[Region]]:
-    queryset = Region.visible.filter(state__code=state).order_by("name")
-
+    contains = None
     if state in region_name_contains_county + county_method:
         # match any county in the address match list
-        from django.db.models import Q
-
-        q = Q(name__icontains=county)
+        contains = [county.lower()]
         if county.startswith("La") or county.startswith("De"):
-            county2 = county[0:2] + " " + county[2:]
-            q = q | Q(name__icontains=county2)
+            contains.append((county[0:2] + " " + county[2:]).lower())
         elif county.startswith("Le "):
-            county2 = county[0:2] + county[3:]
-            q = q | Q(name__icontains=county2)
+            contains.append((county[0:2] + county[3:]).lower())
         elif county.startswith("St. "):
-            county2 = "Saint " + county[4:]
-            q = q | Q(name__icontains=county2)
+            contains.append(("Saint " + county[4:]).lower())
         elif county == "Shannon County":
-            q = q | Q(name__icontains="oglala lakota county")
+            contains.append("oglala lakota county")
         elif county.endswith(" city"):
-            county2 = "City of " + county[:-5]
-            q = q | Q(name__icontains=county2)
-
-        queryset = queryset.filter(q)
+            contains.append(("City of " + county[:-5]).lower())
 
-    ls = list(queryset)
-    regions_by_name = {r.name.lower(): r for r in ls}
+    regions_by_name = get_state_regions(state).filtered(contains)
 
     city = city.lower()
     county = county.lower()
@@ -200,6 +196,13 @@ def match_region(
         if key and key in regions_by_name:
             return [regions_by_name[key]]
 
+    # check against region boundaries imported for this state (see
+    # importregiongeom)
+    if location:
+        name = region_geom.lookup(state, location)
+        if name and name.lower() in regions_by_name:
+            return [regions_by_name[name.lower()]]
+
     # check against state GIS data?
     if state == "MA":
         assert location
@@ -308,7 +311,7 @@ def match_region(
 def geocode_to_regions(street, city, state, zipcode):
 
     addrs = geocode(
-        street=street, city=city, state=state, zipcode=zipcode, fields="stateleg",
+        street=street, city=city, state=state, zipcode=zipcode, fields=GEOCODE_FIELDS,
     )
     if not addrs:
         logger.warning(
@@ -362,7 +365,9 @@ def ts_to_region(
         }
     url = f"{TARGETSMART_DISTRICT_API}?{urlencode({**args})}"
     with tracer.trace("ts.district", service="targetsmartapi"):
-        r = requests.get(url, headers={"x-api-key": settings.TARGETSMART_KEY})
+        r = get_session(
+            "targetsmart", headers={"x-api-key": settings.TARGETSMART_KEY}
+        ).get(url)
     if r.status_code != 200:
         extra = {"url": url, "status_code": r.status_code}
         logger.error(
@@ -402,13 +407,9 @@ def ts_to_region(
         )
         return None
 
-    queryset = Region.visible.filter(state__code=state_code).order_by("name")
-
-    if state_code in region_name_contains_county + county_method:
-        queryset = queryset.filter(name__icontains=county)
-
-    ls = list(queryset)
-    regions_by_name = {r.name.lower(): r for r in ls}
+    regions_by_name = get_state_regions(state_code).filtered(
+        [county] if state_code in region_name_contains_county + county_method else None
+    )
 
     if state_code == "WI":
         # land o' lakes
@@ -480,7 +481,10 @@ def get_region_for_address(street, city, state, zipcode, county):
         cache_key = f"county_to_region_{county}"
         region_id = cache.get(cache_key)
         if region_id:
-            region = Region.objects.filter(external_id=region_id).first()
+            region = (
+                get_state_regions(state).by_id.get(region_id)
+                or Region.objects.filter(external_id=region_id).first()
+            )
             if region:
                 return region
             logger.warning(
@@ -504,6 +508,28 @@ def get_region_for_address(street, city, state, zipcode, county):
     return None
 
 
+def prefetch_geocodes(addresses: Iterable[Tuple[str, str, str, str]]) -> None:
+    """
+    Geocode many (street, city, state, zipcode) addresses in bulk, ahead of
+    matching them with get_regions_for_address(), which then finds them in
+    the geocode cache.
+    """
+    if not settings.GEOCODE_CACHE_ENABLED:
+        return
+    geocode_batch(
+        [
+            {
+                "street": street,
+                "city": city,
+                "state": state.upper() if state else state,
+                "zipcode": zipcode,
+                "fields": GEOCODE_FIELDS,
+            }
+            for street, city, state, zipcode in addresses
+        ]
+    )
+
+
 # Returns (regions, was_geocode_error).
 #
 # regions maybe None, which indicates we weren't able to narrow down the regions
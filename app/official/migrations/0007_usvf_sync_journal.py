@@ -0,0 +1,48 @@
+# Generated by Django 2.2.17 on 2021-01-26 15:41
+
+import common.enums
+import common.fields
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('official', '0006_region_hidden'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='sync_hash',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='office',
+            name='sync_hash',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='region',
+            name='sync_hash',
+            field=models.TextField(null=True),
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sync_id', models.UUIDField(db_index=True)),
+                ('model', models.TextField()),
+                ('external_id', models.IntegerField()),
+                ('action', common.fields.TurnoutEnumField(enum=common.enums.SyncChangeAction)),
+                ('changes', django.contrib.postgres.fields.jsonb.JSONField(null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
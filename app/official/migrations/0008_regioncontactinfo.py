@@ -0,0 +1,40 @@
+# Generated by Django 2.2.17 on 2021-01-28 11:12
+
+import common.enums
+import common.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('official', '0007_usvf_sync_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionContactInfo',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('region', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contact_info', serialize=False, to='official.Region')),
+                ('absentee_email', models.EmailField(max_length=254, null=True)),
+                ('absentee_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None)),
+                ('absentee_fax', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None)),
+                ('register_email', models.EmailField(max_length=254, null=True)),
+                ('register_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None)),
+                ('register_fax', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None)),
+                ('override_email', models.EmailField(max_length=254, null=True)),
+                ('override_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None)),
+                ('override_fax', phonenumber_field.modelfields.PhoneNumberField(max_length=128, null=True, region=None)),
+                ('submission_method_override', common.fields.TurnoutEnumField(enum=common.enums.SubmissionType, null=True)),
+                ('absentee_address', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='official.Address')),
+                ('register_address', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='official.Address')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.17 on 2021-01-29 16:05
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('election', '0014_state_allow_absentee_print_and_forward'),
+        ('official', '0008_regioncontactinfo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionGeom',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.TextField()),
+                ('geom', django.contrib.gis.db.models.fields.MultiPolygonField(geography=True, srid=4326)),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='election.State')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
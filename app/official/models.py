@@ -1,14 +1,21 @@
 from django.contrib.gis.db.models import MultiPolygonField, PointField
+from django.contrib.postgres.fields import JSONField
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from phonenumber_field.modelfields import PhoneNumberField
 
-from common.utils.models import TimestampModel
+from common import enums
+from common.fields import TurnoutEnumField
+from common.utils.models import TimestampModel, UUIDModel
 from common.validators import zip_validator
 
 
 class USVFModel(TimestampModel):
     external_id = models.IntegerField(primary_key=True)
     external_updated = models.DateTimeField(null=True)
+    # hash of the upstream fields as of the last sync (see official.usvf)
+    sync_hash = models.TextField(null=True)
 
     class Meta:
         abstract = True
@@ -93,6 +100,51 @@ class Address(USVFModel):
         )
 
 
+class RegionContactInfo(TimestampModel):
+    """
+    The contact info we give out for a region, precomputed from its
+    addresses and LeoContactOverride (see official.contactinfo).
+    """
+
+    region = models.OneToOneField(
+        Region, on_delete=models.CASCADE, primary_key=True, related_name="contact_info"
+    )
+
+    # the best address (and the best email, phone and fax of any address)
+    # for absentee requests, and for voter registrations
+    absentee_address = models.ForeignKey(
+        Address, null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    absentee_email = models.EmailField(null=True)
+    absentee_phone = PhoneNumberField(null=True)
+    absentee_fax = PhoneNumberField(null=True)
+    register_address = models.ForeignKey(
+        Address, null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    register_email = models.EmailField(null=True)
+    register_phone = PhoneNumberField(null=True)
+    register_fax = PhoneNumberField(null=True)
+
+    # copied from the region's LeoContactOverride, if any
+    override_email = models.EmailField(null=True)
+    override_phone = PhoneNumberField(null=True)
+    override_fax = PhoneNumberField(null=True)
+    submission_method_override = TurnoutEnumField(enums.SubmissionType, null=True)
+
+
+class SyncChange(UUIDModel, TimestampModel):
+    # one row per record a USVF sync inserted, updated or deleted
+    sync_id = models.UUIDField(db_index=True)
+    model = models.TextField()
+    external_id = models.IntegerField()
+    action = TurnoutEnumField(enums.SyncChangeAction)
+    # for updates, {field: [old, new]}
+    changes = JSONField(null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
 class RegionGeomMA(models.Model):
     # note: these are only the fields we care about
     gid = models.IntegerField(primary_key=True)
@@ -113,3 +165,27 @@ class RegionGeomWI(models.Model):
     class Meta:
         db_table = "official_region_geom_wi"
         managed = False
+
+
+class RegionGeom(UUIDModel, TimestampModel):
+    # boundaries of regions in states where the city and county don't tell
+    # us the region; see official.region_geom and importregiongeom
+    state = models.ForeignKey("election.State", on_delete=models.CASCADE)
+    # the region's name, as USVF spells it
+    name = models.TextField()
+    geom = MultiPolygonField(geography=True)
+
+
+@receiver(post_save, sender=Address)
+def process_address(sender, instance, **kwargs):
+    # (the USVF sync writes addresses in bulk, and rebuilds all regions'
+    # contact info itself)
+    from .contactinfo import rebuild_contact_info
+
+    region_id = (
+        Office.objects.filter(pk=instance.office_id)
+        .values_list("region_id", flat=True)
+        .first()
+    )
+    if region_id:
+        rebuild_contact_info([region_id])
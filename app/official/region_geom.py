@@ -0,0 +1,171 @@
+# In-process spatial index of the GIS layers we use to place an address in
+# a region that can't be told from its city or county alone (MA and WI
+# towns, and any state imported into official.RegionGeom).
+#
+# Each layer is loaded once per process (lazily, on first use, or up front
+# with warm()) into prepared shapely geometries in an STRtree, so a lookup
+# is an envelope search plus a point-in-polygon test or two, instead of a
+# geom__intersects query against PostGIS.  Like the region index, a version
+# stamp is kept in the shared cache; importing new GIS data bumps it and
+# each process drops its layers when it notices.
+#
+# Note the tables are geography columns, but we test containment in the
+# plane (on lon/lat).  The difference only matters within a few meters of a
+# long, straight boundary.
+import logging
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import sentry_sdk
+from django.conf import settings
+from django.core.cache import cache
+from django.db import utils
+from shapely import wkb
+from shapely.geometry import Point
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+from common.analytics import statsd
+
+from .models import RegionGeom, RegionGeomMA, RegionGeomWI
+
+logger = logging.getLogger("official")
+
+VERSION_CACHE_KEY = "official_region_geom_version"
+
+# layers in the tables created by common's importgisdata: (model, name field)
+LEGACY_LAYERS = {
+    "ma_town": (RegionGeomMA, "town"),
+    "wi_mcd": (RegionGeomWI, "mcd_name"),
+}
+
+
+class GISDataError(Exception):
+    pass
+
+
+def layer_queryset(layer: str):
+    """
+    The rows for a layer, and the field holding each one's name.  Legacy
+    layers have their own tables; the others are official.RegionGeom rows
+    for the state with that code.
+    """
+    if layer in LEGACY_LAYERS:
+        model, field = LEGACY_LAYERS[layer]
+        return model.objects.order_by("gid"), field
+    return RegionGeom.objects.filter(state_id=layer).order_by("name"), "name"
+
+
+class GeomLayer:
+    def __init__(self, name: str, features: Iterable[Tuple[str, object]]):
+        """
+        features are (name, shapely geometry) pairs; if several contain a
+        point, the first one wins.
+        """
+        self.name = name
+        self.geoms: List[object] = []
+        # STRtree.query returns the geometries themselves, so we find each
+        # one's entry by identity (self.geoms keeps them alive)
+        self.entries: Dict[int, Tuple[int, str, object]] = {}
+        for order, (feature_name, geom) in enumerate(features):
+            self.geoms.append(geom)
+            self.entries[id(geom)] = (order, feature_name, prep(geom))
+        self.tree = STRtree(self.geoms) if self.geoms else None
+
+    def __len__(self) -> int:
+        return len(self.geoms)
+
+    def lookup(self, x: float, y: float) -> Optional[str]:
+        if self.tree is None:
+            return None
+        point = Point(x, y)
+        best = None
+        for geom in self.tree.query(point):
+            entry = self.entries[id(geom)]
+            if (best is None or entry[0] < best[0]) and entry[2].intersects(point):
+                best = entry
+        return best[1] if best else None
+
+
+def load_layer(layer: str) -> GeomLayer:
+    qs, field = layer_queryset(layer)
+    try:
+        rows = list(qs.values_list(field, "geom"))
+    except utils.ProgrammingError:
+        # table doesn't exist (importgisdata hasn't been run)
+        logger.warning(f"Table {qs.model._meta.db_table} does not exist")
+        sentry_sdk.capture_exception(
+            GISDataError(f"Table {qs.model._meta.db_table} does not exist")
+        )
+        rows = []
+    return GeomLayer(layer, ((name, wkb.loads(bytes(geom.wkb))) for name, geom in rows))
+
+
+class RegionGeomIndex:
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+        self.layers: Dict[str, GeomLayer] = {}
+
+    def check_version(self) -> None:
+        now = time.monotonic()
+        if now - self.checked_at < settings.OFFICIAL_REGION_INDEX_CHECK_SECONDS:
+            return
+        self.checked_at = now
+
+        version = cache.get(VERSION_CACHE_KEY)
+        if version != self.version:
+            if self.layers:
+                logger.info(f"Region geom version changed to {version}; reloading")
+            self.version = version
+            self.layers = {}
+
+    def layer(self, layer: str) -> GeomLayer:
+        self.check_version()
+        g = self.layers.get(layer)
+        if g is None:
+            with statsd.timed(f"turnout.official.region_geom.load.{layer}"):
+                g = load_layer(layer)
+            self.layers[layer] = g
+            logger.info(f"Loaded region geom layer {layer} ({len(g)} features)")
+        return g
+
+    def warm(self, layers: Iterable[str] = None) -> None:
+        if layers is None:
+            layers = list(LEGACY_LAYERS) + list(
+                RegionGeom.objects.values_list("state_id", flat=True).distinct()
+            )
+        for layer in layers:
+            self.layer(layer)
+
+
+_index = RegionGeomIndex()
+
+
+def lookup(layer: str, location) -> Optional[str]:
+    """
+    The name of the first feature in the layer that contains the location
+    (a GEOS point), if any.
+    """
+    return _index.layer(layer).lookup(location.x, location.y)
+
+
+def warm(layers: Iterable[str] = None) -> None:
+    """
+    Load layers (by default, all of them) now, rather than on first use.
+    """
+    _index.warm(layers)
+
+
+def invalidate_region_geom() -> None:
+    """
+    Tell every process to discard its layers.  Call this after importing
+    GIS data.
+    """
+    version = uuid.uuid4().hex
+    cache.set(VERSION_CACHE_KEY, version, None)
+    logger.info(f"Invalidated region geom layers, new version {version}")
+    _index.version = version
+    _index.checked_at = time.monotonic()
+    _index.layers = {}
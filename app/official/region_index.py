@@ -0,0 +1,141 @@
+# In-process index of (visible) regions, by state, used by the address
+# matcher so that matching a geocoded address does not need to query
+# the database.
+#
+# Each process builds the index for a state lazily, on first use.  A
+# version stamp is kept in the shared cache; official.usvf.sync() bumps
+# it when the region data changes, and each process drops its local
+# copy when it notices the new version.
+import logging
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, Mapping, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from common.analytics import statsd
+
+from .models import Region
+
+logger = logging.getLogger("official")
+
+VERSION_CACHE_KEY = "official_region_index_version"
+
+
+class StateRegions:
+    def __init__(self, state: str, regions: Iterable[Region]):
+        self.state = state
+        # like the matcher's old regions_by_name: ordered by name, last wins
+        self.by_name: Dict[str, Region] = {}
+        self.by_id: Dict[int, Region] = {}
+        for r in regions:
+            self.by_id[r.external_id] = r
+            if r.name:
+                self.by_name[r.name.lower()] = r
+
+    def get(self, key: str, contains: Iterable[str] = None) -> Optional[Region]:
+        """
+        Look up a region by (lowercase) name.  If contains is provided,
+        the name must also contain at least one of those (lowercase)
+        strings; this mirrors the name__icontains filter the matcher used
+        to apply to the queryset for county-based states.
+        """
+        region = self.by_name.get(key)
+        if region is None:
+            return None
+        if contains is not None and not any(c in key for c in contains):
+            return None
+        return region
+
+    def filtered(self, contains: Iterable[str] = None) -> "RegionsByName":
+        return RegionsByName(self, list(contains) if contains is not None else None)
+
+
+class RegionsByName(Mapping):
+    """
+    A read-only, optionally filtered view of a StateRegions, keyed by
+    lowercase region name.
+    """
+
+    def __init__(self, regions: StateRegions, contains: Optional[list]):
+        self.regions = regions
+        self.contains = contains
+
+    def __getitem__(self, key: str) -> Region:
+        region = self.regions.get(key, self.contains)
+        if region is None:
+            raise KeyError(key)
+        return region
+
+    def __contains__(self, key) -> bool:
+        return self.regions.get(key, self.contains) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (k for k in self.regions.by_name if k in self)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class RegionIndex:
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+        self.states: Dict[str, StateRegions] = {}
+
+    def check_version(self) -> None:
+        now = time.monotonic()
+        if now - self.checked_at < settings.OFFICIAL_REGION_INDEX_CHECK_SECONDS:
+            return
+        self.checked_at = now
+
+        version = cache.get(VERSION_CACHE_KEY)
+        if version != self.version:
+            if self.states:
+                logger.info(f"Region index version changed to {version}; reloading")
+            self.version = version
+            self.states = {}
+
+    def state(self, state: str) -> StateRegions:
+        self.check_version()
+        s = self.states.get(state)
+        if s is None:
+            with statsd.timed("turnout.official.region_index.build"):
+                s = StateRegions(
+                    state, Region.visible.filter(state__code=state).order_by("name")
+                )
+            self.states[state] = s
+            statsd.increment("turnout.official.region_index.miss")
+        else:
+            statsd.increment("turnout.official.region_index.hit", sample_rate=0.2)
+        return s
+
+    def warm(self) -> None:
+        states: Dict[str, list] = {}
+        for r in Region.visible.order_by("name"):
+            if r.state_id:
+                states.setdefault(r.state_id, []).append(r)
+        self.states = {code: StateRegions(code, ls) for code, ls in states.items()}
+
+
+_index = RegionIndex()
+
+
+def get_state_regions(state: str) -> StateRegions:
+    return _index.state(state)
+
+
+def invalidate_region_index() -> None:
+    """
+    Tell every process to discard its index.  Call this after the region
+    data changes (i.e., after a USVF sync).
+    """
+    version = uuid.uuid4().hex
+    cache.set(VERSION_CACHE_KEY, version, None)
+    logger.info(f"Invalidated region index, new version {version}")
+
+    # rebuild our own copy eagerly
+    _index.version = version
+    _index.checked_at = time.monotonic()
+    _index.warm()
@@ -0,0 +1,92 @@
+import pytest
+from model_bakery import baker
+
+from absentee.contactinfo import get_absentee_contact_infos
+from absentee.models import LeoContactOverride
+from common import enums
+from official.contactinfo import get_region_contact_infos, rebuild_contact_info
+from official.models import Address, RegionContactInfo
+
+
+@pytest.mark.django_db
+def test_rebuild():
+    office = baker.make_recipe("official.office")
+    absentee = baker.make_recipe(
+        "official.address",
+        office=office,
+        process_absentee_requests=True,
+        is_physical=True,
+        email="",
+        fax=None,
+    )
+    register = baker.make_recipe(
+        "official.address",
+        office=office,
+        process_domestic_registrations=True,
+        email="register@example.com",
+    )
+    # saving an address rebuilt its region already
+    assert rebuild_contact_info() == 0
+
+    # written in bulk, like the USVF sync does
+    Address.objects.filter(pk=absentee.pk).update(phone="+16175559999")
+    assert RegionContactInfo.objects.get(pk=office.region_id).absentee_phone != (
+        "+16175559999"
+    )
+
+    assert rebuild_contact_info() == 1
+    info = RegionContactInfo.objects.get(pk=office.region_id)
+    assert info.absentee_address == absentee
+    assert info.absentee_email == "register@example.com"
+    assert info.absentee_phone == "+16175559999"
+    assert info.absentee_fax == register.fax
+    assert info.register_address == register
+    assert info.register_phone == register.phone
+
+
+@pytest.mark.django_db
+def test_bulk_accessor(django_assert_max_num_queries):
+    regions = baker.make_recipe("official.region", _quantity=3)
+    addresses = [
+        baker.make_recipe(
+            "official.address",
+            office=baker.make_recipe("official.office", region=region),
+            process_absentee_requests=True,
+        )
+        for region in regions[:2]
+    ]
+    LeoContactOverride(
+        region=regions[1], submission_method=enums.SubmissionType.LEO_FAX
+    ).save()
+
+    # built on demand
+    infos = get_region_contact_infos([r.pk for r in regions] + [12345])
+    assert set(infos) == {r.pk for r in regions}
+
+    with django_assert_max_num_queries(1):
+        contact_infos = get_absentee_contact_infos([r.pk for r in regions])
+        assert contact_infos[regions[0].pk].full_address == addresses[0].full_address
+    assert contact_infos[regions[0].pk].submission_method_override is None
+    assert (
+        contact_infos[regions[1].pk].submission_method_override
+        == enums.SubmissionType.LEO_FAX
+    )
+    assert contact_infos[regions[2].pk].address is None
+
+
+@pytest.mark.django_db
+def test_override_deleted():
+    address = baker.make_recipe("official.absentee_ballot_address")
+    region = address.office.region
+    override = LeoContactOverride(region=region, email="override@example.com")
+    override.save()
+    assert RegionContactInfo.objects.get(pk=region.pk).override_email == (
+        "override@example.com"
+    )
+
+    override.delete()
+    assert RegionContactInfo.objects.get(pk=region.pk).override_email is None
+
+    # and the region can still be deleted
+    region.delete()
+    assert not RegionContactInfo.objects.filter(pk=region.pk).exists()
@@ -0,0 +1,65 @@
+import pytest
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from model_bakery import baker
+from shapely.geometry import box
+
+from official import region_geom, region_index
+from official.match import match_region
+from official.models import RegionGeom
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(mocker, settings):
+    settings.OFFICIAL_REGION_INDEX_CHECK_SECONDS = 0
+    mocker.patch("official.region_index.cache.get", return_value=None)
+    mocker.patch("official.region_index.cache.set")
+    mocker.patch.object(region_index, "_index", region_index.RegionIndex())
+    mocker.patch("official.region_geom.cache.get", return_value=None)
+    mocker.patch("official.region_geom.cache.set")
+    mocker.patch.object(region_geom, "_index", region_geom.RegionGeomIndex())
+
+
+def square(x, y):
+    return MultiPolygon(Polygon.from_bbox((x, y, x + 1, y + 1)), srid=4326)
+
+
+def test_layer_lookup():
+    layer = region_geom.GeomLayer(
+        "test", [("a", box(0, 0, 2, 2)), ("b", box(1, 1, 3, 3)), ("c", box(5, 5, 6, 6))]
+    )
+    assert layer.lookup(0.5, 0.5) == "a"
+    # overlapping features: the first one wins
+    assert layer.lookup(1.5, 1.5) == "a"
+    assert layer.lookup(2.5, 2.5) == "b"
+    assert layer.lookup(5.5, 5.5) == "c"
+    # in none of them
+    assert layer.lookup(4, 4) is None
+
+    assert region_geom.GeomLayer("empty", []).lookup(0, 0) is None
+
+
+@pytest.mark.django_db
+def test_match_imported_boundaries():
+    state = baker.make_recipe("election.state", code="VT")
+    alpha = baker.make_recipe("official.region", name="Town of Alpha", state=state)
+    beta = baker.make_recipe("official.region", name="Town of Beta", state=state)
+    RegionGeom.objects.create(state=state, name="Town of Alpha", geom=square(0, 0))
+    RegionGeom.objects.create(state=state, name="TOWN OF BETA", geom=square(1, 0))
+
+    assert region_geom.lookup("VT", Point(1.5, 0.5)) == "TOWN OF BETA"
+    assert match_region("Nowhere", "Any County", "VT", Point(0.5, 0.5)) == [alpha]
+    assert match_region("Nowhere", "Any County", "VT", Point(1.5, 0.5)) == [beta]
+    assert match_region("Nowhere", "Any County", "VT", Point(5, 5)) is None
+
+
+@pytest.mark.django_db
+def test_invalidate():
+    state = baker.make_recipe("election.state", code="VT")
+    assert region_geom.lookup("VT", Point(0.5, 0.5)) is None
+
+    RegionGeom.objects.create(state=state, name="Town of Alpha", geom=square(0, 0))
+    # still using the layer we loaded
+    assert region_geom.lookup("VT", Point(0.5, 0.5)) is None
+
+    region_geom.invalidate_region_geom()
+    assert region_geom.lookup("VT", Point(0.5, 0.5)) == "Town of Alpha"
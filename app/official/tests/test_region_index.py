@@ -0,0 +1,64 @@
+import pytest
+from model_bakery import baker
+
+from official import region_index
+from official.match import match_region
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(mocker, settings):
+    settings.OFFICIAL_REGION_INDEX_CHECK_SECONDS = 0
+    mocker.patch("official.region_index.cache.get", return_value=None)
+    mocker.patch("official.region_index.cache.set")
+    mocker.patch.object(region_index, "_index", region_index.RegionIndex())
+
+
+@pytest.mark.django_db
+def test_match_county():
+    state = baker.make_recipe("election.state", code="FL")
+    region = baker.make_recipe("official.region", name="De Soto County", state=state)
+    baker.make_recipe("official.region", name="Arcadia", state=state)
+
+    assert match_region("Arcadia", "DeSoto County", "FL") == [region]
+
+
+@pytest.mark.django_db
+def test_county_filter():
+    state = baker.make_recipe("election.state", code="TX")
+    baker.make_recipe("official.region", name="City of Austin", state=state)
+    county = baker.make_recipe("official.region", name="Travis County", state=state)
+
+    # county-method states only match names that include the county
+    assert match_region("Austin", "Travis County", "TX") == [county]
+
+
+@pytest.mark.django_db
+def test_hidden_regions_excluded():
+    state = baker.make_recipe("election.new_state")
+    baker.make_recipe(
+        "official.region", name="City of Richmond", state=state, hidden=True
+    )
+
+    assert match_region("Richmond", "Richmond County", state.code) is None
+
+
+@pytest.mark.django_db
+def test_index_does_not_query(django_assert_num_queries):
+    state = baker.make_recipe("election.new_state")
+    region = baker.make_recipe("official.region", name="City of Richmond", state=state)
+
+    with django_assert_num_queries(1):
+        assert match_region("Richmond", "Richmond County", state.code) == [region]
+    with django_assert_num_queries(0):
+        assert match_region("Richmond", "Richmond County", state.code) == [region]
+
+
+@pytest.mark.django_db
+def test_invalidate():
+    state = baker.make_recipe("election.new_state")
+    assert match_region("Richmond", "Richmond County", state.code) is None
+
+    region = baker.make_recipe("official.region", name="City of Richmond", state=state)
+    region_index.invalidate_region_index()
+
+    assert match_region("Richmond", "Richmond County", state.code) == [region]
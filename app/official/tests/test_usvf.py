@@ -0,0 +1,112 @@
+import pytest
+
+from common import enums
+from official.models import Address, Office, Region, SyncChange
+from official.usvf import API_ENDPOINT, PASS_LIMITS, sync
+
+
+def usvf_region(id_, name, state="MA"):
+    return {
+        "id": id_,
+        "region_name": name,
+        "municipality_name": name,
+        "municipality_type": "Town",
+        "county_name": None,
+        "state_abbr": state,
+    }
+
+
+def usvf_office(id_, region_id, address_ids, hours="9-5"):
+    return {
+        "id": id_,
+        "region": f"/eod/v3/regions/{region_id}",
+        "hours": hours,
+        "notes": None,
+        "addresses": [
+            {
+                "id": address_id,
+                "address_to": "Town Clerk",
+                "street1": "1 Main St",
+                "street2": None,
+                "city": "Springfield",
+                "state": "MA",
+                "zip": "01101",
+                "website": None,
+                "main_email": "clerk@example.com",
+                "main_phone_number": None,
+                "main_fax_number": None,
+                "is_physical": True,
+                "is_regular_mail": True,
+                "functions": ["DOM_VR", "DOM_REQ"],
+            }
+            for address_id in address_ids
+        ],
+    }
+
+
+@pytest.fixture
+def usvf(requests_mock, mocker, settings):
+    settings.USVF_GEOCODE = False
+    mocker.patch("official.usvf.invalidate_region_index")
+
+    def respond(regions, offices):
+        for limit in PASS_LIMITS:
+            # each pass only sees some of the offices
+            requests_mock.register_uri(
+                "GET",
+                f"{API_ENDPOINT}/regions?limit={limit}",
+                json={"objects": regions, "meta": {"next": None}},
+            )
+            requests_mock.register_uri(
+                "GET",
+                f"{API_ENDPOINT}/offices?limit={limit}",
+                json={"objects": offices[limit % 2 :: 2], "meta": {"next": None}},
+            )
+
+    return respond
+
+
+@pytest.mark.django_db
+def test_sync(usvf):
+    usvf(
+        [usvf_region(1, "Springfield"), usvf_region(2, "San Juan", state="PR")],
+        [usvf_office(10, 1, [100]), usvf_office(11, 1, [101]), usvf_office(12, 2, [])],
+    )
+
+    changes = sync()
+    assert changes == {
+        "region": {"insert": 1, "update": 0, "delete": 0},
+        "office": {"insert": 2, "update": 0, "delete": 0},
+        "address": {"insert": 2, "update": 0, "delete": 0},
+    }
+    assert list(Region.objects.values_list("external_id", flat=True)) == [1]
+    assert list(Office.objects.values_list("external_id", flat=True)) == [10, 11]
+    address = Address.objects.get(external_id=100)
+    assert address.process_absentee_requests
+    assert not address.process_absentee_ballots
+    assert SyncChange.objects.filter(action=enums.SyncChangeAction.INSERT).count() == 5
+
+
+@pytest.mark.django_db
+def test_sync_changes_only(usvf):
+    usvf([usvf_region(1, "Springfield")], [usvf_office(10, 1, [100, 101])])
+    sync()
+    unchanged = Address.objects.get(external_id=100).modified_at
+
+    usvf([usvf_region(1, "Springfield")], [usvf_office(10, 1, [100], hours="8-4")])
+    changes = sync()
+    assert changes == {
+        "region": {"insert": 0, "update": 0, "delete": 0},
+        "office": {"insert": 0, "update": 1, "delete": 0},
+        "address": {"insert": 0, "update": 0, "delete": 1},
+    }
+    assert Office.objects.get(external_id=10).hours == "8-4"
+    assert Address.objects.get(external_id=100).modified_at == unchanged
+    assert not Address.objects.filter(external_id=101).exists()
+
+    update = SyncChange.objects.get(action=enums.SyncChangeAction.UPDATE)
+    assert update.model == "office"
+    assert update.external_id == 10
+    assert update.changes == {"hours": ["9-5", "8-4"]}
+    delete = SyncChange.objects.get(action=enums.SyncChangeAction.DELETE)
+    assert (delete.model, delete.external_id) == ("address", 101)
@@ -1,47 +1,86 @@
 # This code pulls down a copy of the USVF region office and contact
 # data to our database, and does some validation on that data to
 # ensure VBM contact data is complete for states that need it.
+#
+# Most of the data doesn't change from one (nightly) sync to the next, so
+# we only write what did, and journal those changes as SyncChanges.
+import datetime
+import hashlib
+import json
 import logging
-from enum import Enum as PythonEnum
-from typing import Any, Dict, List, Sequence, Tuple
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
 import phonenumbers
 import requests
 from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.utils import timezone
 
 from absentee.models import LeoContactOverride
 from common import enums
 from common.analytics import statsd
 from common.apm import tracer
-from common.geocode import geocode
+from common.geocode import geocode_batch
+from common.http import get_session
 from election.models import State
 
-from .models import Address, Office, Region
+from .contactinfo import rebuild_contact_info
+from .models import Address, Office, Region, SyncChange, USVFModel
+from .region_index import invalidate_region_index
 
 API_ENDPOINT = "https://api.usvotefoundation.org/eod/v3"
 
+# page sizes for each pass over the (unreliably paginated) API
+PASS_LIMITS = [100, 73, 67]
+
+# the upstream fields of each model, whose hash tells us if a record changed
+REGION_FIELDS = ["name", "municipality", "municipality_type", "county", "state_id"]
+OFFICE_FIELDS = ["region_id", "hours", "notes"]
+ADDRESS_FIELDS = [
+    "office_id",
+    "address",
+    "address2",
+    "address3",
+    "city",
+    "state_id",
+    "zipcode",
+    "website",
+    "email",
+    "phone",
+    "fax",
+    "is_physical",
+    "is_regular_mail",
+    "process_domestic_registrations",
+    "process_absentee_requests",
+    "process_absentee_ballots",
+    "process_overseas_requests",
+    "process_overseas_ballots",
+]
+# the fields an address is geocoded from
+LOCATION_FIELDS = ["address2", "city", "state_id", "zipcode"]
+
 logger = logging.getLogger("official")
 
 
 def authenticated_session() -> requests.Session:
-    from requests.adapters import HTTPAdapter
-    from requests.packages.urllib3.util.retry import Retry
-
-    session = requests.Session()
-    session.headers["Authorization"] = f"OAuth {settings.USVOTEFOUNDATION_KEY}"
-    session.mount(
-        "https://",
-        HTTPAdapter(
-            max_retries=Retry(
-                total=5,
-                backoff_factor=1,
-                status_forcelist=[500, 502, 503, 504],
-                method_whitelist=["HEAD", "GET"],
-            )
-        ),
+    return get_session(
+        "usvf", headers={"Authorization": f"OAuth {settings.USVOTEFOUNDATION_KEY}"}
     )
-    return session
 
 
 def acquire_data(session: requests.Session, url: str) -> Dict[(str, Any)]:
@@ -61,225 +100,321 @@ def acquire_data(session: requests.Session, url: str) -> Dict[(str, Any)]:
     return response.json()
 
 
-@tracer.wrap()
-def scrape_regions(session: requests.Session) -> List[Region]:
-    session = authenticated_session()
-    regions: List[Region] = []
-    supported_states = State.states.values_list("code", flat=True)
-
-    # The USVF API is buggy and does not paginate reliably.  Make
-    # multiple passes with different page sizes to ensure we capture
-    # all records.  In practice, the [100,73] is sufficient but
-    # additional passes act as an insurance policy.
-    saw_id = set()
-    for limit in [100, 73, 67]:
-        next_url = f"{API_ENDPOINT}/regions?limit={limit}"
-        while next_url:
-            with statsd.timed("turnout.official.usvfcall.regions", sample_rate=0.2):
-                result = acquire_data(session, next_url)
-
-            for usvf_region in result["objects"]:
-                if usvf_region.get("state_abbr") not in supported_states:
-                    continue
-
-                id_ = usvf_region.get("id")
-                if id_ in saw_id:
-                    continue
-                saw_id.add(id_)
-                regions.append(
-                    Region(
-                        external_id=usvf_region["id"],
-                        name=usvf_region.get("region_name"),
-                        municipality=usvf_region.get("municipality_name"),
-                        municipality_type=usvf_region.get("municipality_type"),
-                        county=usvf_region.get("county_name"),
-                        state_id=usvf_region.get("state_abbr"),
-                    )
-                )
+def fetch_pass(session: requests.Session, resource: str, limit: int) -> List[dict]:
+    objects: List[dict] = []
+    next_url = f"{API_ENDPOINT}/{resource}?limit={limit}"
+    while next_url:
+        with statsd.timed(f"turnout.official.usvfcall.{resource}", sample_rate=0.2):
+            result = acquire_data(session, next_url)
+        objects.extend(result["objects"])
+        next_url = result["meta"].get("next")
+    return objects
+
 
-            next_url = result["meta"].get("next")
+@tracer.wrap()
+def fetch(session: requests.Session, resources: Sequence[str]) -> Dict[str, List[dict]]:
+    """
+    Fetch every record of each resource.
+
+    The USVF API is buggy and does not paginate reliably.  Make multiple
+    passes with different page sizes to ensure we capture all records.  In
+    practice, the [100,73] is sufficient but additional passes act as an
+    insurance policy.  The passes (for every resource) are fetched
+    concurrently; where they overlap, the earliest pass wins.
+    """
+    jobs = [(resource, limit) for resource in resources for limit in PASS_LIMITS]
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        passes = list(executor.map(lambda job: fetch_pass(session, *job), jobs))
+
+    records: Dict[str, Dict[int, dict]] = {resource: {} for resource in resources}
+    for (resource, limit), objects in zip(jobs, passes):
+        for obj in objects:
+            records[resource].setdefault(obj["id"], obj)
         logger.info(
-            "Found %(number)s Regions after this pass", {"number": len(regions)}
+            "Found %(number)s %(resource)s after the %(limit)s pass",
+            {"number": len(records[resource]), "resource": resource, "limit": limit},
+        )
+    return {resource: list(objs.values()) for resource, objs in records.items()}
+
+
+def parse_regions(objects: Iterable[dict]) -> Dict[int, Region]:
+    supported_states = set(State.states.values_list("code", flat=True))
+    regions: Dict[int, Region] = {}
+    for usvf_region in objects:
+        if usvf_region.get("state_abbr") not in supported_states:
+            continue
+        regions[usvf_region["id"]] = Region(
+            external_id=usvf_region["id"],
+            name=usvf_region.get("region_name"),
+            municipality=usvf_region.get("municipality_name"),
+            municipality_type=usvf_region.get("municipality_type"),
+            county=usvf_region.get("county_name"),
+            state_id=usvf_region.get("state_abbr"),
         )
-
-    statsd.gauge("turnout.official.scraper.regions", len(regions))
-    logger.info("Found %(number)s Regions", {"number": len(regions)})
-    Region.objects.bulk_create(regions, ignore_conflicts=True)
-    Region.objects.exclude(external_id__in=[r.external_id for r in regions]).delete()
-
     return regions
 
 
-class Action(PythonEnum):
-    INSERT = "Insert"
-    UPDATE = "Update"
+def parse_offices(
+    objects: Iterable[dict], region_ids: Collection[int]
+) -> Tuple[Dict[int, Office], Dict[int, Address]]:
+    offices: Dict[int, Office] = {}
+    addresses: Dict[int, Address] = {}
+    for office in objects:
+        # Check that the region is valid (we don't support US territories)
+        region_id = int(office["region"].rsplit("/", 1)[1])
+        if region_id not in region_ids:
+            continue
+
+        offices[office["id"]] = Office(
+            external_id=office["id"],
+            region_id=region_id,
+            hours=office.get("hours"),
+            notes=office.get("notes"),
+        )
+        for address in office.get("addresses", []):
+            addresses[address["id"]] = Address(
+                external_id=address["id"],
+                office_id=office["id"],
+                address=address.get("address_to"),
+                address2=address.get("street1"),
+                address3=address.get("street2"),
+                city=address.get("city"),
+                state_id=address.get("state"),
+                zipcode=address.get("zip"),
+                website=address.get("website"),
+                email=address.get("main_email"),
+                phone=address.get("main_phone_number"),
+                fax=address.get("main_fax_number"),
+                is_physical=address.get("is_physical"),
+                is_regular_mail=address.get("is_regular_mail"),
+                process_domestic_registrations="DOM_VR" in address["functions"],
+                process_absentee_requests="DOM_REQ" in address["functions"],
+                process_absentee_ballots="DOM_RET" in address["functions"],
+                process_overseas_requests="OVS_REQ" in address["functions"],
+                process_overseas_ballots="OVS_RET" in address["functions"],
+            )
+    return offices, addresses
 
 
-@tracer.wrap()
-def scrape_offices(session: requests.Session, regions: Sequence[Region]) -> None:
-    existing_region_ids = [region.external_id for region in regions]
-
-    existing_offices = Office.objects.values_list("external_id", flat=True)
-    offices_dict: Dict[(int, Tuple[Action, Office])] = {}
-
-    existing_addresses = {a.external_id: a for a in Address.objects.all()}
-    addresses_dict: Dict[(int, Tuple[Action, Address])] = {}
-
-    # The USVF API pagination is buggy; make multiple passes with
-    # different page sizes.
-    for limit in [100, 73, 67]:
-        next_url = f"{API_ENDPOINT}/offices?limit={limit}"
-        while next_url:
-            with statsd.timed("turnout.official.usvfcall.offices", sample_rate=0.2):
-                result = acquire_data(session, next_url)
-
-            for office in result["objects"]:
-                # Check that the region is valid (we don't support US territories)
-                region_id = int(office["region"].rsplit("/", 1)[1])
-                if region_id not in existing_region_ids:
-                    continue
-
-                office_id = office["id"]
-                if office_id in offices_dict:
-                    continue
-
-                # Process each office in the response
-                if office_id in existing_offices:
-                    office_action = Action.UPDATE
-                else:
-                    office_action = Action.INSERT
-                offices_dict[office_id] = (
-                    office_action,
-                    Office(
-                        external_id=office_id,
-                        region_id=int(office["region"].split("/")[-1]),
-                        hours=office.get("hours"),
-                        notes=office.get("notes"),
-                    ),
-                )
+def record_hash(record: USVFModel, fields: Sequence[str]) -> str:
+    values = [getattr(record, f) for f in fields]
+    return hashlib.sha256(json.dumps(values, default=str).encode()).hexdigest()
 
-                for address in office.get("addresses", []):
-                    # Process each address in the office
-                    existing = existing_addresses.get(address["id"], None)
-                    if existing:
-                        address_action = Action.UPDATE
-                        location = existing.location
-                    else:
-                        address_action = Action.INSERT
-                        location = None
-                    if not location and settings.USVF_GEOCODE:
-                        addrs = geocode(
-                            street=address.get("street1"),
-                            city=address.get("city"),
-                            state=address.get("state"),
-                            zipcode=address.get("zip"),
-                        )
-                        if addrs:
-                            location = Point(
-                                addrs[0]["location"]["lng"], addrs[0]["location"]["lat"]
-                            )
-                    addresses_dict[address["id"]] = (
-                        address_action,
-                        Address(
-                            external_id=address["id"],
-                            office_id=office["id"],
-                            address=address.get("address_to"),
-                            address2=address.get("street1"),
-                            address3=address.get("street2"),
-                            city=address.get("city"),
-                            state_id=address.get("state"),
-                            zipcode=address.get("zip"),
-                            website=address.get("website"),
-                            email=address.get("main_email"),
-                            phone=address.get("main_phone_number"),
-                            fax=address.get("main_fax_number"),
-                            location=location,
-                            is_physical=address.get("is_physical"),
-                            is_regular_mail=address.get("is_regular_mail"),
-                            process_domestic_registrations="DOM_VR"
-                            in address["functions"],
-                            process_absentee_requests="DOM_REQ" in address["functions"],
-                            process_absentee_ballots="DOM_RET" in address["functions"],
-                            process_overseas_requests="OVS_REQ" in address["functions"],
-                            process_overseas_ballots="OVS_RET" in address["functions"],
-                        ),
-                    )
 
-            next_url = result["meta"].get("next")
-        logger.info(
-            "Found %(number)s offices after this pass", {"number": len(offices_dict)}
-        )
+def journal_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    return str(value)
 
-    statsd.gauge("turnout.official.scraper.offices", len(offices_dict))
-    logger.info("Found %(number)s Offices", {"number": len(offices_dict)})
-    statsd.gauge("turnout.official.scraper.addresses", len(addresses_dict))
-    logger.info("Found %(number)s Addresses", {"number": len(addresses_dict)})
 
-    # Remove any records in our database but not in the result
-    Office.objects.exclude(external_id__in=offices_dict.keys()).delete()
-    Address.objects.exclude(external_id__in=addresses_dict.keys()).delete()
+def locate_addresses(pairs: List[Tuple[Address, Optional[Address]]]) -> None:
+    # keep the location we have unless the address moved (or we don't
+    # have one yet)
+    to_geocode = []
+    for address, stored in pairs:
+        address.location = stored.location if stored else None
+        if not (
+            stored
+            and stored.location
+            and all(getattr(stored, f) == getattr(address, f) for f in LOCATION_FIELDS)
+        ):
+            to_geocode.append(address)
+    if not settings.USVF_GEOCODE or not to_geocode:
+        return
 
-    # Create any records that are not already in our database
-    Office.objects.bulk_create(
-        [x[1] for x in offices_dict.values() if x[0] == Action.INSERT]
-    )
-    Address.objects.bulk_create(
-        [x[1] for x in addresses_dict.values() if x[0] == Action.INSERT]
+    located = geocode_batch(
+        [
+            {
+                "street": address.address2,
+                "city": address.city,
+                "state": address.state_id,
+                "zipcode": address.zipcode,
+            }
+            for address in to_geocode
+        ]
     )
+    for address, (addrs, error) in zip(to_geocode, located):
+        if addrs:
+            address.location = Point(
+                addrs[0]["location"]["lng"], addrs[0]["location"]["lat"]
+            )
+        else:
+            logger.info(f"Unable to geocode address {address.external_id}: {error}")
 
-    # Update any records that are already in our database
-    def slow_bulk_update(cls, pk, records, keys):
-        # this is slower than django's bulk_update(), but it (1)
-        # respects modified_at and (2) works on aurora
-        for r in records:
-            obj = cls.objects.get(pk=r.pk)
-            changed = False
-            for k in keys:
-                if getattr(obj, k) != getattr(r, k):
-                    setattr(obj, k, getattr(r, k))
-                    changed = True
-            if changed:
-                logger.info(f"Updated {obj}")
-                obj.save()
-
-    slow_bulk_update(
-        Office,
-        "external_id",
-        [x[1] for x in offices_dict.values() if x[0] == Action.UPDATE],
-        ["hours", "notes"],
-    )
-    slow_bulk_update(
-        Address,
-        "external_id",
-        [x[1] for x in addresses_dict.values() if x[0] == Action.UPDATE],
-        [
-            "address",
-            "address2",
-            "address3",
-            "city",
-            "state",
-            "zipcode",
-            "website",
-            "email",
-            "phone",
-            "fax",
-            "is_physical",
-            "is_regular_mail",
-            "location",
-            "process_domestic_registrations",
-            "process_absentee_requests",
-            "process_absentee_ballots",
-            "process_overseas_requests",
-            "process_overseas_ballots",
-        ],
+
+def chunks(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+@tracer.wrap()
+def sync_records(
+    cls: Type[USVFModel],
+    records: Dict[int, USVFModel],
+    fields: Sequence[str],
+    sync_id: uuid.UUID,
+    extra_fields: Sequence[str] = (),
+    prepare: Optional[
+        Callable[[List[Tuple[USVFModel, Optional[USVFModel]]]], None]
+    ] = None,
+    recheck: Collection[int] = (),
+) -> Dict[str, int]:
+    """
+    Bring cls's table in line with records (by external_id), writing only
+    what changed, and journal each change as a SyncChange.
+
+    Each stored record keeps a hash of its upstream fields, so unchanged
+    records are skipped without loading them; those in recheck are
+    compared anyway.  prepare() fills in extra_fields, which aren't from
+    upstream, for a batch of (record, stored) pairs (stored is None for new
+    records).  Changes are
+    written in batches of USVF_SYNC_BATCH_SIZE, each in its own
+    transaction, so we never hold many row locks at once.
+    """
+    model = cls._meta.model_name
+    batch_size = settings.USVF_SYNC_BATCH_SIZE
+    stored_hashes = dict(cls.objects.values_list("external_id", "sync_hash"))
+
+    inserts: List[USVFModel] = []
+    candidates: List[USVFModel] = []
+    for external_id, record in records.items():
+        record.sync_hash = record_hash(record, fields)
+        if external_id not in stored_hashes:
+            inserts.append(record)
+        elif record.sync_hash != stored_hashes[external_id] or external_id in recheck:
+            candidates.append(record)
+    deletes = [i for i in stored_hashes if i not in records]
+
+    journal: List[SyncChange] = []
+    for chunk in chunks(deletes, batch_size):
+        with transaction.atomic():
+            cls.objects.filter(external_id__in=chunk).delete()
+    journal += [
+        SyncChange(
+            sync_id=sync_id,
+            model=model,
+            external_id=i,
+            action=enums.SyncChangeAction.DELETE,
+        )
+        for i in deletes
+    ]
+
+    for chunk in chunks(inserts, batch_size):
+        if prepare:
+            prepare([(record, None) for record in chunk])
+        cls.objects.bulk_create(chunk)
+    journal += [
+        SyncChange(
+            sync_id=sync_id,
+            model=model,
+            external_id=record.external_id,
+            action=enums.SyncChangeAction.INSERT,
+        )
+        for record in inserts
+    ]
+
+    updated = 0
+    update_fields = list(fields) + list(extra_fields)
+    now = timezone.now()
+    for chunk in chunks(candidates, batch_size):
+        stored = cls.objects.in_bulk([r.external_id for r in chunk])
+        pairs = [(r, stored[r.external_id]) for r in chunk if r.external_id in stored]
+        if prepare:
+            prepare(pairs)
+        changed = []
+        for record, before in pairs:
+            diff = {
+                f: [
+                    journal_value(getattr(before, f)),
+                    journal_value(getattr(record, f)),
+                ]
+                for f in update_fields
+                if getattr(before, f) != getattr(record, f)
+            }
+            if diff:
+                record.modified_at = now
+                journal.append(
+                    SyncChange(
+                        sync_id=sync_id,
+                        model=model,
+                        external_id=record.external_id,
+                        action=enums.SyncChangeAction.UPDATE,
+                        changes=diff,
+                    )
+                )
+                updated += 1
+            elif record.sync_hash != before.sync_hash:
+                # just catching up on the hash
+                record.modified_at = before.modified_at
+            else:
+                continue
+            changed.append(record)
+        with transaction.atomic():
+            cls.objects.bulk_update(
+                changed, update_fields + ["sync_hash", "modified_at"]
+            )
+
+    SyncChange.objects.bulk_create(journal, batch_size=batch_size)
+
+    counts = {"insert": len(inserts), "update": updated, "delete": len(deletes)}
+    for action, count in counts.items():
+        statsd.gauge(f"turnout.official.scraper.{model}.{action}", count)
+    logger.info(
+        "Synced %(number)s %(model)s records: %(counts)s",
+        {"number": len(records), "model": model, "counts": counts},
     )
+    return counts
+
+
+@tracer.wrap()
+def sync() -> Dict[str, Dict[str, int]]:
+    session = authenticated_session()
+    sync_id = uuid.uuid4()
+    data = fetch(session, ["regions", "offices"])
+
+    regions = parse_regions(data["regions"])
+    offices, addresses = parse_offices(data["offices"], regions.keys())
+    for name, records in (
+        ("regions", regions),
+        ("offices", offices),
+        ("addresses", addresses),
+    ):
+        statsd.gauge(f"turnout.official.scraper.{name}", len(records))
+        logger.info(f"Found {len(records)} {name}")
+
+    # addresses we couldn't locate last time get another chance
+    unlocated: Collection[int] = ()
+    if settings.USVF_GEOCODE:
+        unlocated = set(
+            Address.objects.filter(location__isnull=True).values_list(
+                "external_id", flat=True
+            )
+        )
+
+    changes = {
+        "region": sync_records(Region, regions, REGION_FIELDS, sync_id),
+        "office": sync_records(Office, offices, OFFICE_FIELDS, sync_id),
+        "address": sync_records(
+            Address,
+            addresses,
+            ADDRESS_FIELDS,
+            sync_id,
+            extra_fields=["location"],
+            prepare=locate_addresses,
+            recheck=unlocated,
+        ),
+    }
 
+    SyncChange.objects.filter(
+        created_at__lt=timezone.now()
+        - datetime.timedelta(days=settings.USVF_SYNC_JOURNAL_DAYS)
+    ).delete()
 
-def sync() -> None:
-    session = requests.Session()
-    session.headers["Authorization"] = f"OAuth {settings.USVOTEFOUNDATION_KEY}"
-    regions = scrape_regions(session)
-    scrape_offices(session, regions)
+    if any(any(counts.values()) for counts in changes.values()):
+        rebuild_contact_info()
+    if any(changes["region"].values()):
+        invalidate_region_index()
+    return changes
 
 
 def check_state_contacts(state_id: str, mode: enums.SubmissionType) -> str:
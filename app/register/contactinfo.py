@@ -1,8 +1,8 @@
 from dataclasses import dataclass
 from typing import Optional
 
-from election.models import StateInformation
-from official.models import Address
+from election.snapshot import get_snapshot
+from official.contactinfo import get_region_contact_info
 
 from .models import Registration
 
@@ -15,28 +15,6 @@ class RegisterContactInfo:
     fax: Optional[str] = None
 
 
-def register_address_score(addr: Address) -> int:
-    """
-    Returns a "score" for selecting the optimal address to tell the user to
-    contact for questions about their registration.
-
-    1: This is an office that accepts registrations and is a physical address
-    2: This is an office that accepts registrations
-    3: All other offices
-
-    We prioritize physical addresses over mailing addresses because the physical
-    offices can always receive mail, and some kinds of mail (USPS express) can
-    only be delivered to the physical addresses (the mailing addresses are
-    typically PO boxes).
-    """
-    if addr.process_domestic_registrations and addr.is_physical:
-        return 1
-    elif addr.process_domestic_registrations:
-        return 2
-    else:
-        return 3
-
-
 def get_nvrf_submission_address(
     region_id: Optional[int], state_id: str
 ) -> RegisterContactInfo:
@@ -44,42 +22,19 @@ def get_nvrf_submission_address(
 
     if not region_id:
         # fallback to statewide address
-        try:
-            contact_info.address = (
-                StateInformation.objects.only("field_type", "text")
-                .get(
-                    state=state_id,
-                    field_type__slug="registration_nvrf_submission_address",
-                )
-                .text
-            )
-        except StateInformation.DoesNotExist:
-            contact_info.address = ""
-
-        return contact_info
-
-    office_addresses = sorted(
-        Address.objects.filter(office__region__external_id=region_id),
-        key=register_address_score,
-    )
-
-    # Find contact info
-    contact_info.address = next((addr.full_address for addr in office_addresses), None)
-
-    if contact_info.email is None:
-        contact_info.email = next(
-            (addr.email for addr in office_addresses if addr.email), None
+        contact_info.address = (
+            get_snapshot().text(state_id, "registration_nvrf_submission_address") or ""
         )
 
-    if contact_info.phone is None:
-        contact_info.phone = next(
-            (addr.phone for addr in office_addresses if addr.phone), None
-        )
+        return contact_info
 
-    if contact_info.fax is None:
-        contact_info.fax = next(
-            (addr.fax for addr in office_addresses if addr.fax), None
-        )
+    info = get_region_contact_info(region_id)
+    if info:
+        if info.register_address:
+            contact_info.address = info.register_address.full_address
+        contact_info.email = info.register_email
+        contact_info.phone = info.register_phone
+        contact_info.fax = info.register_fax
 
     return contact_info
 
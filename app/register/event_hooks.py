@@ -3,7 +3,7 @@ from uuid import UUID
 from django.conf import settings
 
 from common import enums
-from election.models import StateInformation
+from election.snapshot import get_snapshot
 from event_tracking.models import Event
 
 from .models import Registration
@@ -25,9 +25,7 @@ def finish_external(action_id: UUID, event_id: UUID):
     registration = Registration.objects.get(action_id=action_id)
 
     # no upsell in vbm_universal states
-    if StateInformation.objects.filter(
-        state=registration.state, field_type__slug="vbm_universal", text="True",
-    ).exists():
+    if get_snapshot().text(registration.state_id, "vbm_universal") == "True":
         return
 
     external_tool_upsell.apply_async(
@@ -1,9 +1,8 @@
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from django.conf import settings
-from django.core.cache import cache
 from django.template.loader import render_to_string
 from rest_framework.mixins import CreateModelMixin
 from rest_framework.permissions import AllowAny
@@ -16,7 +15,7 @@ from apikey.auth import ApiKeyAuthentication, ApiKeyRequired
 from apikey.crypto import make_action_jwt, verify_action_jwt
 from common.enums import EventType, RegistrationFlowType
 from election.choices import STATES
-from election.models import StateInformation
+from election.snapshot import get_snapshot
 
 from .custom_ovr_links import get_custom_ovr_link
 from .models import Registration
@@ -24,7 +23,6 @@ from .serializers import ExternalRegistrationSerializer
 
 MARKDOWN_TEMPLATE = "register/external/external_registration.md"
 JWT_EXPIRATION = timedelta(minutes=settings.REGISTER_JWT_EXPIRATION_MINUTES)
-STATE_CACHE_TIMEOUT = 5 * 60
 
 
 @dataclass
@@ -40,19 +38,20 @@ class StateRegistrationData:
 
 INELIGIBLE_STATES = {"ND", "NH", "WY"}
 
-# TODO: cache this
+STATE_INFO_SLUGS = (
+    "external_tool_ovr",
+    "registration_directions",
+    "id_requirements_ovr",
+    "registration_ovr_directions",
+)
+
+# state code -> (the snapshot it was rendered from, data)
+_state_data: Dict[str, Tuple[Any, StateRegistrationData]] = {}
+
+
 def get_state_data(state_code: str) -> StateRegistrationData:
-    state_infos = {}
-    for info in StateInformation.objects.select_related("field_type").filter(
-        field_type__slug__in=(
-            "external_tool_ovr",
-            "registration_directions",
-            "id_requirements_ovr",
-            "registration_ovr_directions",
-        ),
-        state_id=state_code,
-    ):
-        state_infos[info.field_type.slug] = info.text
+    snapshot = get_snapshot()
+    state_infos = {slug: snapshot.text(state_code, slug) for slug in STATE_INFO_SLUGS}
 
     if state_infos["external_tool_ovr"]:
         flow_type = RegistrationFlowType.OVR_OR_PRINT
@@ -81,14 +80,15 @@ def get_state_data(state_code: str) -> StateRegistrationData:
 
 
 def get_state_data_cached(state_code: str) -> StateRegistrationData:
-    cache_key = f"register__external_views__get_state_data__{state_code}"
-    cached_value = cache.get(cache_key)
-    if cached_value:
-        return cached_value
+    # rendered once per state per snapshot, so an edit shows up as soon as
+    # the snapshot is reloaded
+    snapshot = get_snapshot()
+    cached = _state_data.get(state_code)
+    if cached and cached[0] is snapshot:
+        return cached[1]
 
     data = get_state_data(state_code)
-    cache.set(cache_key, data, STATE_CACHE_TIMEOUT)
-
+    _state_data[state_code] = (snapshot, data)
     return data
 
 
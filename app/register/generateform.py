@@ -9,7 +9,7 @@ from common import enums
 from common.apm import tracer
 from common.models import DelayedTask
 from common.pdf.pdftemplate import fill_pdf_template
-from election.models import StateInformation
+from election.snapshot import get_snapshot
 from storage.models import StorageItem
 
 from .contactinfo import get_registration_contact_info
@@ -101,20 +101,18 @@ def extract_formdata(registration, state_id_number, is_18_or_over):
         form_data[f"mailto_line_upper_{num+1}"] = line.upper()
 
     # get mailing deadline from StateInformation
-    try:
-        state_mail_deadline = (
-            StateInformation.objects.only("field_type", "text")
-            .get(
-                state=registration.state, field_type__slug="registration_deadline_mail",
-            )
-            .text.lower()
-        )
+    snapshot = get_snapshot()
+    state_mail_deadline = snapshot.text(
+        registration.state_id, "registration_deadline_mail"
+    )
+    if state_mail_deadline is None:
+        state_deadline = "Mail your form as soon as possible."
+    else:
+        state_mail_deadline = state_mail_deadline.lower()
         if state_mail_deadline.split()[0] in ["postmarked", "received"]:
             state_deadline = f"Your form must be {state_mail_deadline}."
         else:
             state_deadline = f"Your form must arrive by {state_mail_deadline}."
-    except StateInformation.DoesNotExist:
-        state_deadline = "Mail your form as soon as possible."
     form_data["state_deadlines"] = state_deadline
 
     form_data["2020_state_deadline"] = "mailed as soon as possible."
@@ -123,15 +121,9 @@ def extract_formdata(registration, state_id_number, is_18_or_over):
     ] = f"Your form should be mailed as soon as possible."
 
     # Warnings
-    try:
-        warnings_registration = (
-            StateInformation.objects.only("field_type", "text")
-            .get(state=registration.state, field_type__slug="warnings_registration",)
-            .text
-        )
-    except StateInformation.DoesNotExist:
-        warnings_registration = ""
-    form_data["warnings_registration"] = warnings_registration
+    form_data["warnings_registration"] = (
+        snapshot.text(registration.state_id, "warnings_registration") or ""
+    )
 
     return form_data
 
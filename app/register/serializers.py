@@ -207,7 +207,9 @@ class ExternalRegistrationSerializer(
         return data
 
     def create(self, validated_data):
-        validated_data["action"] = Action.objects.create()
+        validated_data["action"] = Action.objects.create(
+            source_type=enums.ActionSourceType.REGISTRATION
+        )
         validated_data["subscriber"] = self.request_subscriber(validated_data)
         validated_data["gender"] = self.guess_gender_from_title(validated_data)
         validated_data["status"] = enums.TurnoutActionStatus.INCOMPLETE
@@ -0,0 +1,173 @@
+# Real-time subscriber stats.
+#
+# Each new registration, lookup, ballot request and polling place lookup
+# increments a counter in redis (a hash field per partner and tool), once
+# its transaction commits.  flush_counters() periodically moves those
+# counts into reporting_subscriberstats, and Client.stats adds whatever
+# hasn't been flushed yet, so the stats are always current.
+#
+# Counters can drift (a redis outage, rows created with bulk_create, a
+# crash between reading and writing a flush), so reconcile_counters()
+# recounts everything from the tool tables once a day.
+import logging
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.utils.timezone import now
+from django_redis import get_redis_connection
+
+from common import enums
+from common.analytics import statsd
+
+from .models import StatsRefresh
+
+logger = logging.getLogger("reporting")
+
+TOOL_TABLES = {
+    enums.ToolName.REGISTER: "register_registration",
+    enums.ToolName.VERIFY: "verifier_lookup",
+    enums.ToolName.ABSENTEE: "absentee_ballotrequest",
+    enums.ToolName.LOCATE: "polling_place_pollingplacelookup",
+}
+
+TOOL_MODELS = {
+    "register.Registration": enums.ToolName.REGISTER,
+    "verifier.Lookup": enums.ToolName.VERIFY,
+    "absentee.BallotRequest": enums.ToolName.ABSENTEE,
+    "polling_place.PollingPlaceLookup": enums.ToolName.LOCATE,
+}
+
+UPSERT_SQL = """
+INSERT INTO reporting_subscriberstats (uuid, partner_id, tool, count)
+VALUES (uuid_generate_v4(), %(partner_id)s, %(tool)s, %(count)s)
+ON CONFLICT (partner_id, tool)
+DO UPDATE SET count = reporting_subscriberstats.count + excluded.count
+"""
+
+RECONCILE_SQL = """
+INSERT INTO reporting_subscriberstats (uuid, partner_id, tool, count)
+(
+    {}
+)
+ON CONFLICT (partner_id, tool)
+DO UPDATE SET count = excluded.count
+WHERE reporting_subscriberstats.count != excluded.count
+"""
+
+RECONCILE_TOOL_SQL = """
+    SELECT uuid_generate_v4() AS uuid, partner_id, '{tool}' AS tool, COUNT(*)
+    FROM {table}
+    WHERE partner_id IS NOT NULL
+    GROUP BY partner_id
+"""
+
+
+def counters_key() -> str:
+    return cache.make_key("subscriber_stats:pending")
+
+
+def incr(subscriber_id: str, tool: enums.ToolName, count: int = 1) -> None:
+    try:
+        get_redis_connection("default").hincrby(
+            counters_key(), f"{subscriber_id}:{tool.value}", count
+        )
+    except Exception as e:
+        # reconcile_counters() will catch it up
+        logger.warning(f"Failed to count {tool.value} for {subscriber_id}: {e}")
+        statsd.increment("turnout.reporting.counters.incr_failed")
+
+
+def pending_counts(subscriber_id: str) -> Optional[Dict[str, int]]:
+    """
+    Counts for a subscriber that haven't been flushed yet, by tool, or
+    None if redis is unavailable.
+    """
+    tools = [tool.value for tool in TOOL_TABLES]
+    try:
+        values = get_redis_connection("default").hmget(
+            counters_key(), [f"{subscriber_id}:{tool}" for tool in tools]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to get pending stats for {subscriber_id}: {e}")
+        return None
+    return {tool: int(value or 0) for tool, value in zip(tools, values)}
+
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or not instance.subscriber_id:
+        return
+    tool = TOOL_MODELS[sender._meta.label]
+    subscriber_id = str(instance.subscriber_id)
+    transaction.on_commit(lambda: incr(subscriber_id, tool))
+
+
+for model in TOOL_MODELS:
+    post_save.connect(
+        count_created, sender=model, dispatch_uid=f"subscriber_stats_{model}"
+    )
+
+
+def flush_counters() -> int:
+    """
+    Move the pending counts from redis into reporting_subscriberstats.
+    Returns the number of counters flushed.
+    """
+    conn = get_redis_connection("default")
+    # take the counts and reset them in one step, so increments that land
+    # while we're writing are kept for the next flush
+    pipe = conn.pipeline(transaction=True)
+    pipe.hgetall(counters_key())
+    pipe.delete(counters_key())
+    counts, _ = pipe.execute()
+
+    rows = []
+    for field, count in counts.items():
+        subscriber_id, tool = field.decode().split(":")
+        if int(count):
+            rows.append(
+                {"partner_id": subscriber_id, "tool": tool, "count": int(count)}
+            )
+
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.executemany(UPSERT_SQL, rows)
+            StatsRefresh.objects.update(last_run=now())
+    except Exception:
+        # put them back for the next flush
+        pipe = conn.pipeline(transaction=True)
+        for row in rows:
+            pipe.hincrby(
+                counters_key(), f"{row['partner_id']}:{row['tool']}", row["count"]
+            )
+        pipe.execute()
+        raise
+
+    statsd.increment("turnout.reporting.counters.flushed", len(rows))
+    return len(rows)
+
+
+def reconcile_counters() -> int:
+    """
+    Recount the stats from scratch, fixing any that have drifted.  Returns
+    the number of stats that were wrong.
+
+    Items created while this runs may be counted twice (or not at all)
+    until the next reconciliation.
+    """
+    flush_counters()
+    sql = RECONCILE_SQL.format(
+        "\n    UNION ALL\n".join(
+            RECONCILE_TOOL_SQL.format(tool=tool.value, table=table)
+            for tool, table in TOOL_TABLES.items()
+        )
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        fixed = cursor.rowcount
+    if fixed:
+        logger.info(f"Reconciled {fixed} subscriber stats")
+    statsd.gauge("turnout.reporting.counters.reconciled", fixed)
+    return fixed
@@ -6,4 +6,4 @@ from .models import Report
 class ReportCreationForm(forms.ModelForm):
     class Meta:
         model = Report
-        fields = ["type"]
+        fields = ["type", "format", "compress", "incremental"]
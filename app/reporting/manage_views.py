@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.messages.views import SuccessMessageMixin
+from django.db.models import Min
 from django.urls import reverse
 from django.views.generic import CreateView
 
@@ -8,7 +10,7 @@ from multi_tenant.mixins_manage_views import (
 )
 
 from .forms import ReportCreationForm
-from .models import Report
+from .models import Report, ReportViewRefresh
 from .tasks import process_report
 
 
@@ -23,6 +25,15 @@ class ReportCreateView(
     form_class = ReportCreationForm
     success_message = "Report is being generated and will be emailed to you."
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # exports come from periodically refreshed views; show how stale
+        context["data_as_of"] = ReportViewRefresh.objects.aggregate(
+            Min("refreshed_at")
+        )["refreshed_at__min"]
+        context["refresh_interval"] = settings.REPORT_VIEW_REFRESH_INTERVAL
+        return context
+
     def get_success_url(self):
         return reverse("manage:home", args=[self.kwargs["subscriber"]])
 
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.17 on 2020-12-22 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0011_refresh_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='compress',
+            field=models.BooleanField(blank=True, default=False, null=True, verbose_name='Compress (gzip)'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='row_count',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
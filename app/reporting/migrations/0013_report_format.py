@@ -0,0 +1,20 @@
+# Generated by Django 2.2.17 on 2020-12-28 19:05
+
+import common.enums
+import common.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0012_report_compress_row_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='format',
+            field=common.fields.TurnoutEnumField(default=common.enums.ReportFormat.CSV, enum=common.enums.ReportFormat, null=True),
+        ),
+    ]
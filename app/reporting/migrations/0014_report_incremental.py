@@ -0,0 +1,28 @@
+# Generated by Django 2.2.17 on 2021-01-04 21:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0013_report_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='incremental',
+            field=models.BooleanField(blank=True, default=False, null=True, verbose_name='Only include changes since the last export'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.17 on 2021-01-07 20:05
+
+from django.db import migrations, models
+
+from reporting.migrations import (
+    SUBSCRIBER_MATVIEW_CREATE_SQL,
+    SUBSCRIBER_MATVIEW_DROP_SQL,
+    SUBSCRIBER_REPORT_VIEWS,
+    VIEW_CREATE_SQL,
+)
+
+INSERT_REFRESH_SQL = "".join(
+    f"INSERT INTO reporting_reportviewrefresh (view, refreshed_at) VALUES ('{view}', now());\n"
+    for view in SUBSCRIBER_REPORT_VIEWS
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0014_report_incremental'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportViewRefresh',
+            fields=[
+                ('view', models.TextField(primary_key=True, serialize=False)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunSQL(
+            [SUBSCRIBER_MATVIEW_CREATE_SQL, INSERT_REFRESH_SQL],
+            reverse_sql=[SUBSCRIBER_MATVIEW_DROP_SQL, VIEW_CREATE_SQL],
+        ),
+    ]
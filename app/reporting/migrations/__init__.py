@@ -239,3 +239,39 @@ DROP VIEW IF EXISTS reporting_registerreport;
 DROP VIEW IF EXISTS reporting_verifyreport;
 DROP VIEW IF EXISTS reporting_locatorreport;
 """
+
+# The subscriber report views are materialized (see
+# reporting.tasks.refresh_report_views).  They depend on the views above, so
+# a migration that changes those must drop them first:
+#
+#   RunSQL(SUBSCRIBER_MATVIEW_DROP_SQL), RunSQL(VIEW_CREATE_SQL),
+#   RunSQL(SUBSCRIBER_MATVIEW_CREATE_SQL)
+#
+# (VIEW_CREATE_SQL recreates plain subscriber views, which
+# SUBSCRIBER_MATVIEW_CREATE_SQL replaces.)
+
+SUBSCRIBER_REPORT_VIEWS = {
+    "reporting_subscriber_ballotrequestreport": "reporting_ballotrequestreport",
+    "reporting_subscriber_registerreport": "reporting_registerreport",
+    "reporting_subscriber_verifyreport": "reporting_verifyreport",
+    "reporting_subscriber_locatorreport": "reporting_locatorreport",
+}
+
+SUBSCRIBER_MATVIEW_CREATE_SQL = "".join(
+    f"""
+DROP VIEW IF EXISTS {view};
+CREATE MATERIALIZED VIEW {view} AS
+SELECT
+  *
+FROM
+  {source}
+WHERE visible_to_subscriber;
+CREATE UNIQUE INDEX {view}_uuid ON {view} (uuid);
+CREATE INDEX {view}_subscriber_updated ON {view} (subscriber_id, updated_at);
+"""
+    for view, source in SUBSCRIBER_REPORT_VIEWS.items()
+)
+
+SUBSCRIBER_MATVIEW_DROP_SQL = "".join(
+    f"DROP MATERIALIZED VIEW IF EXISTS {view};\n" for view in SUBSCRIBER_REPORT_VIEWS
+)
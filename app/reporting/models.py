@@ -12,9 +12,29 @@ class Report(SubscriberModel, UUIDModel, TimestampModel):
         enums.ReportStatus, null=True, default=enums.ReportStatus.PENDING
     )
     type = TurnoutEnumField(enums.ReportType, null=True)
+    format = TurnoutEnumField(
+        enums.ReportFormat, null=True, default=enums.ReportFormat.CSV
+    )
     result_item = models.ForeignKey(
         "storage.StorageItem", null=True, on_delete=models.SET_NULL, blank=True
     )
+    compress = models.BooleanField(
+        "Compress (gzip)", default=False, null=True, blank=True
+    )
+    # rows written so far; updated periodically while the report runs
+    row_count = models.BigIntegerField(null=True, blank=True)
+
+    # Incremental reports only include rows updated since the previous
+    # report's watermark (since), unless it is time for a full snapshot,
+    # in which case since is null.
+    incremental = models.BooleanField(
+        "Only include changes since the last export",
+        default=False,
+        null=True,
+        blank=True,
+    )
+    since = models.DateTimeField(null=True, blank=True)
+    watermark = models.DateTimeField(null=True, blank=True)
 
 
 class SubscriberStats(SubscriberModel, UUIDModel):
@@ -27,3 +47,10 @@ class SubscriberStats(SubscriberModel, UUIDModel):
 
 class StatsRefresh(models.Model):
     last_run = models.DateTimeField(primary_key=True)
+
+
+class ReportViewRefresh(models.Model):
+    # a materialized subscriber report view, and the time its contents are
+    # current as of
+    view = models.TextField(primary_key=True)
+    refreshed_at = models.DateTimeField()
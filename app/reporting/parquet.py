@@ -0,0 +1,78 @@
+# Parquet output for reports.  Column types come from the postgres
+# types of the report view's columns, so timestamps, booleans and dates
+# stay typed instead of being flattened to text as in the CSV.  UUIDs are
+# written as their canonical strings: the pyarrow we use has no UUID type.
+import json
+from typing import Any, List, Sequence, Tuple
+
+import pyarrow as pa  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+
+# postgres type OIDs (see pg_type)
+BOOL_OID = 16
+INT8_OID = 20
+INT2_OID = 21
+INT4_OID = 23
+FLOAT4_OID = 700
+FLOAT8_OID = 701
+DATE_OID = 1082
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+JSON_OID = 114
+JSONB_OID = 3802
+
+ARROW_TYPES = {
+    BOOL_OID: pa.bool_(),
+    INT8_OID: pa.int64(),
+    INT2_OID: pa.int16(),
+    INT4_OID: pa.int32(),
+    FLOAT4_OID: pa.float32(),
+    FLOAT8_OID: pa.float64(),
+    DATE_OID: pa.date32(),
+    TIMESTAMP_OID: pa.timestamp("us"),
+    TIMESTAMPTZ_OID: pa.timestamp("us", tz="UTC"),
+}
+
+COMPRESSION = "zstd"
+
+
+def arrow_field(name: str, label: str, type_code: int) -> pa.Field:
+    arrow_type = ARROW_TYPES.get(type_code, pa.string())
+    return pa.field(name, arrow_type, nullable=True, metadata={"label": label})
+
+
+def convert_column(values: Sequence[Any], type_code: int) -> List[Any]:
+    if type_code in (JSON_OID, JSONB_OID):
+        return [v if v is None or isinstance(v, str) else json.dumps(v) for v in values]
+    if type_code not in ARROW_TYPES:
+        # UUIDs, enums, phone numbers, etc.
+        return [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return list(values)
+
+
+class ParquetReportWriter:
+    def __init__(
+        self, f, fields: List[Tuple[str, str]], description, compress: bool = True
+    ):
+        self.type_codes = [col[1] for col in description]
+        self.schema = pa.schema(
+            [
+                arrow_field(field[0], field[1], type_code)
+                for field, type_code in zip(fields, self.type_codes)
+            ]
+        )
+        self.writer = pq.ParquetWriter(
+            f, self.schema, compression=COMPRESSION if compress else "NONE"
+        )
+
+    def write_rows(self, rows: List[tuple]) -> None:
+        # convert column-at-a-time, rather than building a dict per row
+        columns = list(zip(*rows))
+        arrays = [
+            pa.array(convert_column(values, type_code), type=field.type)
+            for values, type_code, field in zip(columns, self.type_codes, self.schema)
+        ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
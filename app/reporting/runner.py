@@ -1,16 +1,27 @@
 import csv
+import datetime
+import gzip
+import logging
+import os
+from contextlib import contextmanager
 from io import StringIO
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
-from django.core.files.base import ContentFile
+from django.conf import settings
 from django.db import connection
 from django.template.defaultfilters import slugify
 from django.utils.timezone import now
 
 from common import enums
+from common.analytics import statsd
 from storage.models import StorageItem
 
-from .models import Report
+from .models import Report, ReportViewRefresh
+
+logger = logging.getLogger("reporting")
+
+# flush encoded CSV to the output file at about this many bytes
+WRITE_BUFFER_SIZE = 256 * 1024
 
 ABSENTEE_FIELDS: List[Tuple[str, str]] = [
     ("uuid", "ID"),
@@ -167,59 +178,257 @@ def generate_name(report: Report):
         filename = slugify(
             f'{now().strftime("%Y%m%d%H%M")}_fullprogram_{report.type.label}_export'
         )
+    if report.since:
+        filename += "_changes"
+    if report.format == enums.ReportFormat.PARQUET:
+        return f"{filename}.parquet"
+    if report.compress:
+        return f"{filename}.csv.gz"
     return f"{filename}.csv"
 
 
-def report_runner(report: Report):
+def report_source(report: Report) -> Tuple[str, List[Tuple[str, str]]]:
     if report.type == enums.ReportType.ABSENTEE:
-        table = "reporting_subscriber_ballotrequestreport"
-        fields = ABSENTEE_FIELDS
+        return "reporting_subscriber_ballotrequestreport", ABSENTEE_FIELDS
     elif report.type == enums.ReportType.REGISTER:
-        table = "reporting_subscriber_registerreport"
-        fields = REGISTER_FIELDS
+        return "reporting_subscriber_registerreport", REGISTER_FIELDS
     elif report.type == enums.ReportType.VERIFY:
-        table = "reporting_subscriber_verifyreport"
-        fields = VERIFIER_FIELDS
+        return "reporting_subscriber_verifyreport", VERIFIER_FIELDS
     elif report.type == enums.ReportType.LOCATOR:
-        table = "reporting_subscriber_locatorreport"
-        fields = LOCATOR_FIELDS
-    else:
-        raise Exception("Invalid Report Type")
+        return "reporting_subscriber_locatorreport", LOCATOR_FIELDS
+    raise Exception("Invalid Report Type")
+
 
+@contextmanager
+def report_cursor(report: Report, table: str, fields: List[Tuple[str, str]]):
+    """
+    Open a server-side cursor over the report rows (as tuples, in the same
+    order as fields).  Rows should be fetched with iter_batches() so that
+    only REPORT_CURSOR_ITERSIZE rows are held in memory at once.
+    """
+    columns = ", ".join(field[0] for field in fields)
+    where = []
+    args: List[Any] = []
     if report.subscriber:
-        sql = f"SELECT * FROM {table} WHERE subscriber_id = %s"
-        args = [report.subscriber.uuid]
-    else:
-        sql = f"SELECT * FROM {table}"
-        args = []
+        where.append("subscriber_id = %s")
+        args.append(report.subscriber.uuid)
+    if report.since:
+        where.append("updated_at > %s AND updated_at <= %s")
+        args += [report.since, report.watermark]
 
-    new_file = StringIO()
-    reportwriter = csv.writer(new_file)
-    reportwriter.writerow([field[1] for field in fields])
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
 
-    with connection.cursor() as cursor:
+    # Not in a transaction: outside one, django opens the cursor WITH HOLD,
+    # so it outlives the implicit transaction that declares it, and the
+    # progress updates we make as we go are committed (and seen by whoever
+    # is polling the report) right away.
+    with connection.chunked_cursor() as cursor:
         cursor.execute(sql, args)
-        columns = [col[0] for col in cursor.description]
+        yield cursor
+
+
+def iter_batches(cursor, first: List[tuple] = None):
+    if first:
+        yield first
+    while True:
+        rows = cursor.fetchmany(settings.REPORT_CURSOR_ITERSIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def set_report_window(report: Report, table: str) -> None:
+    """
+    Set the watermark (and, for incremental reports, the start of the
+    window) for a report.
+
+    The watermark is the time the (materialized) report view was last
+    refreshed as of, and never later than a minute ago; like the subscriber
+    stats, that minute allows for clock differences between the app and
+    the DB.  An incremental report starts at the watermark of the previous
+    completed report of the same type for the same subscriber.  If there
+    is no previous report, or the last full snapshot is older than
+    REPORT_INCREMENTAL_SNAPSHOT_DAYS, a full snapshot is produced instead.
+    """
+    report.watermark = now() - datetime.timedelta(minutes=1)
+    refresh = ReportViewRefresh.objects.filter(view=table).first()
+    if refresh and refresh.refreshed_at < report.watermark:
+        report.watermark = refresh.refreshed_at
+    report.since = None
+    if not report.incremental:
+        return
+
+    previous = (
+        Report.objects.filter(
+            subscriber=report.subscriber,
+            type=report.type,
+            status=enums.ReportStatus.COMPLETE,
+            watermark__isnull=False,
+        )
+        .exclude(pk=report.pk)
+        .order_by("-watermark")
+    )
+    last = previous.first()
+    last_snapshot = previous.filter(since__isnull=True).first()
+    if not last or not last_snapshot:
+        return
+    if last_snapshot.watermark < report.watermark - datetime.timedelta(
+        days=settings.REPORT_INCREMENTAL_SNAPSHOT_DAYS
+    ):
+        logger.info(
+            f"Last snapshot for {report.subscriber} {report.type} is from {last_snapshot.watermark}; running full report"
+        )
+        return
+    report.since = last.watermark
+
+
+def open_report_file(item: StorageItem, filename: str):
+    """
+    Open a new file in the StorageItem's storage for streaming writes.  On
+    S3 this is a multipart upload that sends a part each time the write
+    buffer fills.  Returns (name, file).
+    """
+    storage = item.file.storage
+    name = storage.get_available_name(item.file.field.generate_filename(item, filename))
+    try:
+        os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+    except NotImplementedError:
+        # not a local filesystem
+        pass
+    return name, storage.open(name, "wb")
+
+
+def delete_report_file(item: StorageItem, name: str) -> None:
+    try:
+        item.file.storage.delete(name)
+    except Exception as e:
+        logger.warning(f"Unable to delete partial report file {name}: {e}")
+
+
+class ReportProgress:
+    def __init__(self, report: Report):
+        self.report = report
+        self.count = 0
+        self.next_update = settings.REPORT_PROGRESS_INTERVAL
 
-        for row in cursor:
-            row_dict = dict(zip(columns, row))
+    def add(self, num: int) -> None:
+        self.count += num
+        if self.count >= self.next_update:
+            Report.objects.filter(pk=self.report.pk).update(row_count=self.count)
+            self.next_update = self.count + settings.REPORT_PROGRESS_INTERVAL
 
-            new_row = []
-            for field in fields:
-                new_row.append(row_dict[field[0]])
+    def finish(self) -> None:
+        self.report.row_count = self.count
 
-            reportwriter.writerow(new_row)
 
-    encoded_file_content = new_file.getvalue().encode("utf-8")
+class PositionWriter:
+    """
+    Wrap a write-only file and track the number of bytes written.  The
+    storage's own tell() is not reliable once a multipart upload has sent
+    some parts, and the parquet writer needs it.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.f.write(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        # the caller closes the underlying file
+        self.closed = True
+
+
+def write_csv(cursor, fields: List[Tuple[str, str]], f, progress: ReportProgress):
+    # rows are encoded into a small text buffer and flushed to the
+    # (binary) output regularly, so memory use stays flat
+    buf = StringIO()
+    reportwriter = csv.writer(buf)
+    reportwriter.writerow([field[1] for field in fields])
+
+    for rows in iter_batches(cursor):
+        for row in rows:
+            reportwriter.writerow(row)
+            if buf.tell() >= WRITE_BUFFER_SIZE:
+                f.write(buf.getvalue().encode("utf-8"))
+                buf.seek(0)
+                buf.truncate()
+        progress.add(len(rows))
+
+    f.write(buf.getvalue().encode("utf-8"))
+
+
+def write_parquet(
+    cursor,
+    fields: List[Tuple[str, str]],
+    f,
+    progress: ReportProgress,
+    compress: bool = True,
+):
+    from .parquet import ParquetReportWriter
+
+    # the cursor's column types aren't known until the first fetch
+    first = cursor.fetchmany(settings.REPORT_CURSOR_ITERSIZE)
+    writer = ParquetReportWriter(
+        PositionWriter(f), fields, cursor.description, compress=compress
+    )
+    for rows in iter_batches(cursor, first):
+        writer.write_rows(rows)
+        progress.add(len(rows))
+    writer.close()
+
+
+@statsd.timed("turnout.reporting.report_runner")
+def report_runner(report: Report):
+    table, fields = report_source(report)
+    set_report_window(report, table)
 
     item = StorageItem(
         app=enums.FileType.REPORT,
         email=report.author.email,
         subscriber=report.subscriber,
     )
-    item.file.save(
-        generate_name(report), ContentFile(encoded_file_content), True,
-    )
+    progress = ReportProgress(report)
+
+    name, f = open_report_file(item, generate_name(report))
+    try:
+        try:
+            with report_cursor(report, table, fields) as cursor:
+                if report.format == enums.ReportFormat.PARQUET:
+                    write_parquet(
+                        cursor, fields, f, progress, compress=bool(report.compress)
+                    )
+                elif report.compress:
+                    with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                        write_csv(cursor, fields, gz, progress)
+                else:
+                    write_csv(cursor, fields, f, progress)
+        finally:
+            f.close()
+    except Exception:
+        # don't leave a partial file behind
+        delete_report_file(item, name)
+        raise
+
+    item.file.name = name
+    item.save()
+
+    progress.finish()
+    logger.info(f"Wrote {progress.count} rows to report {report.pk}")
     report.result_item = item
     report.status = enums.ReportStatus.COMPLETE
-    report.save(update_fields=["result_item", "status"])
+    report.save(
+        update_fields=["result_item", "status", "row_count", "since", "watermark"]
+    )
@@ -1,13 +1,16 @@
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 
 from celery import shared_task
 from django.db import connection, transaction
+from django.utils.timezone import now
 
 from common.analytics import statsd
 from mailer.retry import EMAIL_RETRY_PROPS
 
-from .models import Report, StatsRefresh
+from .counters import flush_counters, reconcile_counters
+from .migrations import SUBSCRIBER_REPORT_VIEWS
+from .models import Report, ReportViewRefresh
 from .notification import trigger_notification
 from .runner import report_runner
 
@@ -29,70 +32,40 @@ def send_report_notification(report_pk: str):
     trigger_notification(report)
 
 
-@shared_task
-@statsd.timed("turnout.reporting.calc_all_subscriber_stats")
-def calc_all_subscriber_stats():
+def refresh_report_view(view: str) -> bool:
     with transaction.atomic():
         with connection.cursor() as cursor:
-            # We fetch stats starting from the last update time, and going until (now - 1 minute).
-            # The 1 minute offset is to account for differences between the DB clock and
-            # the app server clock -- if the app server is ahead of the DB, we don't
-            # want to think that we have data up to, e.g. 4PM if the DB thinks it's 3:59PM.
-            current_update_time = datetime.now(tz=timezone.utc) - timedelta(minutes=1)
-            refresh_obj = StatsRefresh.objects.all()[0]
-
-            SQL_QUERY = """
-                INSERT INTO reporting_subscriberstats (uuid, partner_id, tool, count)
-                (
-                    SELECT
-                    uuid_generate_v4() AS uuid,
-                    partner_id,
-                    'register' AS tool,
-                    COUNT(*)
-                    FROM register_registration
-                    WHERE created_at > %(start_time)s AND created_at <= %(end_time)s
-                    GROUP BY partner_id
-
-                    UNION ALL
-
-                    SELECT
-                    uuid_generate_v4() AS uuid,
-                    partner_id,
-                    'verify' AS tool,
-                    COUNT(*)
-                    FROM verifier_lookup
-                    WHERE created_at > %(start_time)s AND created_at <= %(end_time)s
-                    GROUP BY partner_id
-
-                    UNION ALL
-
-                    SELECT
-                    uuid_generate_v4() AS uuid,
-                    partner_id,
-                    'absentee' AS tool,
-                    COUNT(*)
-                    FROM absentee_ballotrequest
-                    WHERE created_at > %(start_time)s AND created_at <= %(end_time)s
-                    GROUP BY partner_id
-
-                    UNION ALL
-
-                    SELECT
-                    uuid_generate_v4() AS uuid,
-                    partner_id,
-                    'locate' AS tool,
-                    COUNT(*)
-                    FROM polling_place_pollingplacelookup
-                    WHERE created_at > %(start_time)s AND created_at <= %(end_time)s
-                    GROUP BY partner_id
-                )
-                ON CONFLICT (partner_id, tool)
-                DO UPDATE SET count = reporting_subscriberstats.count + excluded.count
-            """
-
-            cursor.execute(
-                SQL_QUERY,
-                {"start_time": refresh_obj.last_run, "end_time": current_update_time},
+            # skip the view if another worker is already refreshing it
+            cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", [view])
+            if not cursor.fetchone()[0]:
+                logger.info(f"{view} is already being refreshed")
+                return False
+
+            # Rows committed before now are in the refreshed view.  As with the
+            # subscriber stats, back off a minute for app/DB clock differences.
+            refreshed_at = now() - timedelta(minutes=1)
+            with statsd.timed(f"turnout.reporting.refresh_report_view.{view}"):
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+            ReportViewRefresh.objects.update_or_create(
+                view=view, defaults={"refreshed_at": refreshed_at}
             )
+    return True
+
+
+@shared_task
+@statsd.timed("turnout.reporting.refresh_report_views")
+def refresh_report_views():
+    for view in SUBSCRIBER_REPORT_VIEWS:
+        refresh_report_view(view)
+
 
-            StatsRefresh.objects.update(last_run=current_update_time)
+@shared_task
+@statsd.timed("turnout.reporting.flush_subscriber_stats")
+def flush_subscriber_stats():
+    flush_counters()
+
+
+@shared_task
+@statsd.timed("turnout.reporting.reconcile_subscriber_stats")
+def reconcile_subscriber_stats():
+    reconcile_counters()
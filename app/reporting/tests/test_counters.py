@@ -0,0 +1,69 @@
+import pytest
+from model_bakery import baker
+
+from common import enums
+from reporting.counters import flush_counters, reconcile_counters
+from reporting.models import SubscriberStats
+
+
+@pytest.fixture
+def subscriber():
+    return baker.make_recipe("multi_tenant.client")
+
+
+@pytest.mark.django_db
+def test_flush_counters(subscriber, mocker):
+    SubscriberStats.objects.create(
+        subscriber=subscriber, tool=enums.ToolName.REGISTER, count=2
+    )
+    conn = mocker.patch("reporting.counters.get_redis_connection").return_value
+    conn.pipeline.return_value.execute.return_value = [
+        {
+            f"{subscriber.pk}:register".encode(): b"3",
+            f"{subscriber.pk}:verify".encode(): b"1",
+        },
+        1,
+    ]
+
+    assert flush_counters() == 2
+
+    stats = {
+        s.tool: s.count for s in SubscriberStats.objects.filter(subscriber=subscriber)
+    }
+    assert stats == {enums.ToolName.REGISTER: 5, enums.ToolName.VERIFY: 1}
+
+
+@pytest.mark.django_db
+def test_reconcile_counters(subscriber, mocker):
+    mocker.patch("reporting.counters.flush_counters")
+    for _ in range(3):
+        baker.make_recipe("register.registration", subscriber=subscriber)
+    SubscriberStats.objects.create(
+        subscriber=subscriber, tool=enums.ToolName.REGISTER, count=7
+    )
+
+    assert reconcile_counters() == 1
+    assert (
+        SubscriberStats.objects.get(
+            subscriber=subscriber, tool=enums.ToolName.REGISTER
+        ).count
+        == 3
+    )
+    # nothing has drifted now
+    assert reconcile_counters() == 0
+
+
+@pytest.mark.django_db
+def test_stats_include_pending(subscriber, mocker):
+    SubscriberStats.objects.create(
+        subscriber=subscriber, tool=enums.ToolName.REGISTER, count=2
+    )
+    mocker.patch(
+        "multi_tenant.models.pending_counts",
+        return_value={"register": 1, "verify": 4, "absentee": 0, "locate": 0},
+    )
+
+    stats = subscriber.stats
+    assert stats["register"] == 3
+    assert stats["verify"] == 4
+    assert stats["locate"] == 0
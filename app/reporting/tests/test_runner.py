@@ -0,0 +1,202 @@
+import csv
+import datetime
+import gzip
+import io
+
+import pytest
+from model_bakery import baker
+
+from common import enums
+from reporting import runner
+from reporting.models import Report, ReportViewRefresh
+from reporting.runner import REGISTER_FIELDS, report_runner
+from reporting.tasks import refresh_report_views
+from storage.models import StorageItem
+
+
+def read_rows(data: bytes):
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+@pytest.fixture
+def registrations():
+    registrations = [
+        baker.make_recipe("register.registration", first_name=f"Voter{i}")
+        for i in range(3)
+    ]
+    refresh_report_views()
+    return registrations
+
+
+@pytest.mark.django_db
+def test_report_runner(registrations, settings):
+    settings.REPORT_PROGRESS_INTERVAL = 2
+    report = baker.make(
+        Report,
+        type=enums.ReportType.REGISTER,
+        author=baker.make_recipe("accounts.user"),
+    )
+
+    report_runner(report)
+
+    report.refresh_from_db()
+    assert report.status == enums.ReportStatus.COMPLETE
+    assert report.row_count == 3
+    assert report.result_item.file.name.endswith(".csv")
+
+    rows = read_rows(report.result_item.file.read())
+    assert rows[0] == [field[1] for field in REGISTER_FIELDS]
+    first_name = [field[0] for field in REGISTER_FIELDS].index("first_name")
+    assert sorted(row[first_name] for row in rows[1:]) == [
+        "Voter0",
+        "Voter1",
+        "Voter2",
+    ]
+
+
+@pytest.mark.django_db
+def test_report_runner_compressed(registrations):
+    report = baker.make(
+        Report,
+        type=enums.ReportType.REGISTER,
+        author=baker.make_recipe("accounts.user"),
+        compress=True,
+    )
+
+    report_runner(report)
+
+    report.refresh_from_db()
+    assert report.result_item.file.name.endswith(".csv.gz")
+    rows = read_rows(gzip.decompress(report.result_item.file.read()))
+    assert len(rows) == 4
+
+
+@pytest.mark.django_db
+def test_report_runner_parquet(registrations):
+    import pyarrow.parquet as pq
+
+    report = baker.make(
+        Report,
+        type=enums.ReportType.REGISTER,
+        format=enums.ReportFormat.PARQUET,
+        author=baker.make_recipe("accounts.user"),
+        compress=True,
+    )
+
+    report_runner(report)
+
+    report.refresh_from_db()
+    assert report.result_item.file.name.endswith(".parquet")
+    data = io.BytesIO(report.result_item.file.read())
+    metadata = pq.ParquetFile(data).metadata
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+    table = pq.read_table(data)
+    assert table.num_rows == 3
+    assert table.column_names == [field[0] for field in REGISTER_FIELDS]
+    assert str(table.schema.field("created_at").type) == "timestamp[us, tz=UTC]"
+    assert str(table.schema.field("sms_opt_in").type) == "bool"
+    assert table.column("uuid").to_pylist()[0] in [str(r.uuid) for r in registrations]
+
+
+@pytest.mark.django_db
+def test_report_runner_incremental(freezer):
+    freezer.move_to("2020-12-01 12:00:00")
+    registrations = [
+        baker.make_recipe("register.registration", first_name=f"Voter{i}")
+        for i in range(3)
+    ]
+    author = baker.make_recipe("accounts.user")
+
+    # no previous report, so this is a full snapshot
+    freezer.move_to("2020-12-01 12:10:00")
+    refresh_report_views()
+    first = baker.make(
+        Report, type=enums.ReportType.REGISTER, author=author, incremental=True
+    )
+    report_runner(first)
+    first.refresh_from_db()
+    assert first.since is None
+    assert first.row_count == 3
+
+    freezer.move_to("2020-12-01 12:20:00")
+    registrations[0].first_name = "Changed"
+    registrations[0].save()
+
+    freezer.move_to("2020-12-01 12:30:00")
+    refresh_report_views()
+    second = baker.make(
+        Report, type=enums.ReportType.REGISTER, author=author, incremental=True
+    )
+    report_runner(second)
+    second.refresh_from_db()
+    assert second.since == first.watermark
+    assert second.row_count == 1
+    assert "_changes" in second.result_item.file.name
+
+    rows = read_rows(second.result_item.file.read())
+    first_name = [field[0] for field in REGISTER_FIELDS].index("first_name")
+    assert rows[1][first_name] == "Changed"
+
+
+@pytest.mark.django_db
+def test_report_runner_incremental_snapshot(freezer, registrations, settings):
+    settings.REPORT_INCREMENTAL_SNAPSHOT_DAYS = 7
+    author = baker.make_recipe("accounts.user")
+
+    report_runner(
+        baker.make(
+            Report, type=enums.ReportType.REGISTER, author=author, incremental=True
+        )
+    )
+
+    freezer.move_to(datetime.datetime.now() + datetime.timedelta(days=8))
+    report = baker.make(
+        Report, type=enums.ReportType.REGISTER, author=author, incremental=True
+    )
+    report_runner(report)
+    report.refresh_from_db()
+    assert report.since is None
+    assert report.row_count == 3
+
+
+@pytest.mark.django_db
+def test_report_runner_refresh_watermark(freezer):
+    freezer.move_to("2020-12-01 12:00:00")
+    baker.make_recipe("register.registration", first_name="Voter0")
+    refresh_report_views()
+    refreshed_at = datetime.datetime(2020, 12, 1, 11, 59, tzinfo=datetime.timezone.utc)
+    refresh = ReportViewRefresh.objects.get(view="reporting_subscriber_registerreport")
+    assert refresh.refreshed_at == refreshed_at
+
+    # not in the materialized view until the next refresh
+    freezer.move_to("2020-12-01 12:05:00")
+    baker.make_recipe("register.registration", first_name="Voter1")
+
+    freezer.move_to("2020-12-01 12:10:00")
+    report = baker.make(
+        Report,
+        type=enums.ReportType.REGISTER,
+        author=baker.make_recipe("accounts.user"),
+    )
+    report_runner(report)
+    report.refresh_from_db()
+    assert report.watermark == refreshed_at
+    assert report.row_count == 1
+
+
+@pytest.mark.django_db
+def test_report_runner_failed(registrations, mocker):
+    report = baker.make(
+        Report,
+        type=enums.ReportType.REGISTER,
+        author=baker.make_recipe("accounts.user"),
+    )
+    open_report_file = mocker.spy(runner, "open_report_file")
+    mocker.patch("reporting.runner.write_csv", side_effect=Exception("oops"))
+
+    with pytest.raises(Exception):
+        report_runner(report)
+
+    # the partial file was cleaned up
+    name, _ = open_report_file.spy_return
+    assert not StorageItem._meta.get_field("file").storage.exists(name)
@@ -15,4 +15,14 @@ class SMSMessageAdmin(admin.ModelAdmin):
 
 @admin.register(models.Blast)
 class BlastAdmin(admin.ModelAdmin):
-    list_display = ("uuid", "description", "campaign", "blast_type")
+    list_display = (
+        "uuid",
+        "description",
+        "campaign",
+        "blast_type",
+        "recipient_count",
+        "queued_count",
+        "sent_count",
+        "skipped_count",
+        "failed_count",
+    )
@@ -1,26 +1,42 @@
+import datetime
 import logging
-import math
-import uuid
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlencode
 
-import requests
 from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
+from common.analytics import statsd
 from common.apm import tracer
-from common.aws import s3_client
+from common.enums import BlastRecipientStatus, BlastType, MessageDirectionType
 from common.geocode import geocode
 from common.i90 import shorten_url
-from common.rollouts import get_feature_bool
 
-from .models import Blast, Number, SMSMessage
+from .maps import get_destinations, get_map, prefetch_destinations
+from .models import (
+    DISPATCHABLE_RECIPIENT_STATUSES,
+    Blast,
+    BlastRecipient,
+    Number,
+    SMSMessage,
+)
+from .sender import send_messages
 
-DNC_API_ENDPOINT = "https://locator-api.voteamerica.com/lookup"
-CIVIC_API_ENDPOINT = "https://www.googleapis.com/civicinfo/v2/voterinfo"
+logger = logging.getLogger("smsbot")
 
-HIRES = True  # 512x512 or 256x256?
+BLAST_QUEUES = {
+    BlastType.SMS: "blast-sms",
+    BlastType.MMS_MAP: "blast-mms",
+}
 
-logger = logging.getLogger("smsbot")
+BLAST_COUNTERS = {
+    BlastRecipientStatus.SENT: "sent_count",
+    BlastRecipientStatus.SKIPPED: "skipped_count",
+    BlastRecipientStatus.FAILED: "failed_count",
+}
 
 
 @tracer.wrap()
@@ -32,6 +48,204 @@ def send_blast_sms(blast: Blast, number: Number, force_dup: bool = False) -> Non
     number.send_sms(blast.content, blast=blast)
 
 
+@tracer.wrap()
+def dispatch_recipients(blast: Blast, lo: int, hi: int, statuses: List[str]) -> int:
+    """
+    Enqueue send tasks, of SMS_SEND_BATCH_SIZE recipients each, for the
+    recipients of a blast with an id in [lo, hi) and one of the given
+    statuses, BLAST_DISPATCH_BATCH_SIZE at a time.  Returns the number of
+    recipients dispatched.
+    """
+    from .tasks import trigger_blast_batch
+
+    queue = BLAST_QUEUES[blast.blast_type]
+    dispatched = 0
+    last = lo - 1
+    while True:
+        ids = list(
+            BlastRecipient.objects.filter(
+                blast=blast, id__gt=last, id__lt=hi, status__in=statuses
+            )
+            .order_by("id")
+            .values_list("id", flat=True)[: settings.BLAST_DISPATCH_BATCH_SIZE]
+        )
+        if not ids:
+            break
+
+        # Enqueue before marking the rows queued: if we die in between, the
+        # rows are still pending and a resumed blast dispatches them again,
+        # and the claim in send_blast_batch keeps them from being sent
+        # twice.
+        for i in range(0, len(ids), settings.SMS_SEND_BATCH_SIZE):
+            trigger_blast_batch.apply_async(
+                args=(ids[i : i + settings.SMS_SEND_BATCH_SIZE],), queue=queue
+            )
+        queued = BlastRecipient.objects.filter(
+            id__in=ids, status=BlastRecipientStatus.PENDING
+        ).update(status=BlastRecipientStatus.QUEUED, modified_at=timezone.now())
+        Blast.objects.filter(pk=blast.pk).update(
+            queued_count=F("queued_count") + queued
+        )
+
+        dispatched += len(ids)
+        last = ids[-1]
+        statsd.increment("turnout.smsbot.blast.dispatched", len(ids))
+
+    logger.info(f"Dispatched {dispatched} recipients [{lo}, {hi}) for {blast}")
+    return dispatched
+
+
+def finish_recipients(blast: Blast, statuses: Dict[int, BlastRecipientStatus]) -> None:
+    now = timezone.now()
+    counts: Dict[str, int] = {}
+    for status in BLAST_COUNTERS:
+        ids = [pk for pk, s in statuses.items() if s == status]
+        if not ids:
+            continue
+        BlastRecipient.objects.filter(pk__in=ids).update(status=status, modified_at=now)
+        counts[BLAST_COUNTERS[status]] = len(ids)
+        statsd.increment(f"turnout.smsbot.blast.recipient_{status.value}", len(ids))
+    if counts:
+        Blast.objects.filter(pk=blast.pk).update(
+            **{counter: F(counter) + n for counter, n in counts.items()}
+        )
+
+
+def claim_recipients(recipient_ids: List[int]) -> List[BlastRecipient]:
+    """
+    Claim the given recipients (those not already claimed) for sending;
+    whoever claims a recipient is the only one to send it.  A claim more
+    than BLAST_SENDING_TIMEOUT seconds old is assumed to be abandoned (its
+    worker died mid-send) and may be taken over.  The returned recipients
+    keep the status they were claimed from.
+    """
+    stale = timezone.now() - datetime.timedelta(seconds=settings.BLAST_SENDING_TIMEOUT)
+    with transaction.atomic():
+        recipients = list(
+            BlastRecipient.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("blast")
+            .filter(id__in=recipient_ids)
+            .filter(
+                Q(status__in=DISPATCHABLE_RECIPIENT_STATUSES)
+                | Q(status=BlastRecipientStatus.SENDING, modified_at__lt=stale)
+            )
+            .order_by("id")
+        )
+        BlastRecipient.objects.filter(id__in=[r.id for r in recipients]).update(
+            status=BlastRecipientStatus.SENDING, modified_at=timezone.now()
+        )
+    return recipients
+
+
+def _build_map_mms(recipient: BlastRecipient, number: Number):
+    # runs on a worker thread; don't leave that thread's db connections
+    # (e.g., from the geocode cache) open behind us
+    try:
+        return build_map_mms(
+            number,
+            recipient.map_type,
+            recipient.address_full,
+            recipient.blast.content,
+            blast=recipient.blast,
+        )
+    finally:
+        connections.close_all()
+
+
+@tracer.wrap()
+def send_blast_batch(recipient_ids: List[int]) -> None:
+    """
+    Send a blast to a batch of its recipients, via smsbot.sender.
+    """
+    recipients = claim_recipients(recipient_ids)
+    if len(recipients) < len(recipient_ids):
+        logger.info(
+            f"{len(recipient_ids) - len(recipients)} blast recipients were already sent"
+        )
+    if not recipients:
+        return
+    blast = recipients[0].blast
+
+    # anything we don't get to is marked failed (and is not retried)
+    statuses = {r.id: BlastRecipientStatus.FAILED for r in recipients}
+    try:
+        # a stalled send may have gotten as far as recording its message;
+        # count those as sent rather than risk texting anyone twice
+        stalled = [r for r in recipients if r.status == BlastRecipientStatus.SENDING]
+        if stalled:
+            texted = {
+                str(phone)
+                for phone in SMSMessage.objects.filter(
+                    blast=blast, phone_id__in=[r.phone for r in stalled]
+                ).values_list("phone_id", flat=True)
+            }
+            for r in stalled:
+                if str(r.phone) in texted:
+                    statuses[r.id] = BlastRecipientStatus.SENT
+            recipients = [
+                r for r in recipients if statuses[r.id] != BlastRecipientStatus.SENT
+            ]
+
+        phones = {str(r.phone) for r in recipients}
+        Number.objects.bulk_create(
+            [Number(phone=phone) for phone in phones], ignore_conflicts=True
+        )
+        numbers = {str(n.phone): n for n in Number.objects.filter(phone__in=phones)}
+
+        to_send = []
+        for r in recipients:
+            if numbers[str(r.phone)].opt_out_time:
+                statuses[r.id] = BlastRecipientStatus.SKIPPED
+            else:
+                to_send.append(r)
+
+        messages = []
+        message_recipients = []
+        if blast.blast_type == BlastType.SMS:
+            for r in to_send:
+                messages.append(
+                    SMSMessage(
+                        phone=numbers[str(r.phone)],
+                        direction=MessageDirectionType.OUT,
+                        message=blast.content,
+                        blast=blast,
+                        kwargs={},
+                    )
+                )
+                message_recipients.append(r)
+        elif blast.blast_type == BlastType.MMS_MAP and to_send:
+            with ThreadPoolExecutor(
+                max_workers=min(settings.SMS_SEND_CONCURRENCY, len(to_send))
+            ) as executor:
+                futures = [
+                    executor.submit(_build_map_mms, r, numbers[str(r.phone)])
+                    for r in to_send
+                ]
+                for r, future in zip(to_send, futures):
+                    error, text, media_url = future.result()
+                    if error:
+                        continue
+                    messages.append(
+                        SMSMessage(
+                            phone=numbers[str(r.phone)],
+                            direction=MessageDirectionType.OUT,
+                            message=text,
+                            blast=blast,
+                            kwargs={"media_url": media_url},
+                        )
+                    )
+                    message_recipients.append(r)
+        else:
+            logger.error(f"unrecognized blast_type {blast.blast_type} for {blast}")
+
+        results = send_messages(messages, BLAST_QUEUES[blast.blast_type])
+        for r, error in zip(message_recipients, results):
+            if not error:
+                statuses[r.id] = BlastRecipientStatus.SENT
+    finally:
+        finish_recipients(blast, statuses)
+
+
 @tracer.wrap()
 def send_blast_mms_map(
     blast: Blast,
@@ -61,6 +275,29 @@ def send_map_mms(
     content: str = None,
     blast: Blast = None,
 ) -> Optional[str]:
+    error, text, media_url = build_map_mms(
+        number, map_type, address_full, content, blast=blast
+    )
+    if error:
+        return error
+
+    # send
+    number.send_sms(text, media_url=media_url, blast=blast)
+    logger.info(f"Sent {map_type} map for {address_full} (blast {blast}) to {number}")
+    return None
+
+
+@tracer.wrap()
+def build_map_mms(
+    number: Number,
+    map_type: str,  # 'pp' or 'ev'
+    address_full: str,
+    content: str = None,
+    blast: Blast = None,
+) -> Tuple[Optional[str], Optional[str], Optional[List[str]]]:
+    """
+    Build a map MMS: returns (error, text, media urls).
+    """
     formdata: Dict[str, str] = {}
 
     # geocode home
@@ -68,146 +305,39 @@ def send_map_mms(
     home_address = address_full
     if not home:
         logger.info(f"{number}: Failed to geocode {address_full}")
-        return f"Failed to geocode {address_full}"
+        return f"Failed to geocode {address_full}", None, None
     formdata["home_address_short"] = address_full.split(",")[0].upper()
 
-    home_loc = f"{home[0]['location']['lng']},{home[0]['location']['lat']}"
-
-    # geocode destination
-    if get_feature_bool("locate_use_dnc_data", home[0]["address_components"]["state"]):
-        # pollproxy
-        with tracer.trace("pollproxy.lookup", service="pollproxy"):
-            response = requests.get(DNC_API_ENDPOINT, {"address": home_address})
-        if response.status_code != 200:
-            logger.warning(
-                f"Got {response.status_code} from dnc query on {home_address}"
-            )
-            return f"Failure querying data source"
+    # destination
+    if map_type not in ("pp", "ev"):
+        return f"Unrecognized address type {map_type}", None, None
+    destinations = get_destinations(
+        home_address, home[0]["address_components"]["state"]
+    )
+    if destinations is None:
+        return f"Failure querying data source", None, None
+    dest = destinations[map_type]
+    if not dest:
         if map_type == "pp":
-            dest = response.json().get("data", {}).get("election_day_locations", [])
-            if not dest:
-                logger.info(
-                    f"{number}: No election day location for {address_full}: {response.json()}"
-                )
-                return f"No election day location for {address_full}"
-            dest = dest[0]
-        elif map_type == "ev":
-            dest = response.json().get("data", {}).get("early_vote_locations", [])
-            if not dest:
-                logger.info(f"{number}: No early_vote location for {address_full}")
-                return f"No early vote location for {address_full}"
-            dest = dest[0]
-        else:
-            return f"Unrecognized address type {map_type}"
+            logger.info(f"{number}: No election day location for {address_full}")
+            return f"No election day location for {address_full}", None, None
+        logger.info(f"{number}: No early_vote location for {address_full}")
+        return f"No early vote location for {address_full}", None, None
+    if dest["lon"] is None or dest["lat"] is None:
+        logger.warning(f"Lon/lat missing from {dest['address']} ({dest['source']})")
+        return f"Lon/lat missing from {dest['address']} ({dest['source']})", None, None
 
-        dest_name = dest["location_name"]
-        dest_address = (
-            f"{dest['address_line_1']}, {dest['city']}, {dest['state']} {dest['zip']}"
-        )
-        dest_hours = dest["dates_hours"]
-        if "lon" not in dest or "lat" not in dest:
-            logger.warning(f"Lon/lat missing from {dest_address} (pollproxy): {dest}")
-            return f"Lon/lat missing from {dest_address} (pollproxy)"
-        dest_lon = dest["lon"]
-        dest_lat = dest["lat"]
-    else:
-        # civic
-        with tracer.trace("civicapi.voterlookup", service="google"):
-            response = requests.get(
-                CIVIC_API_ENDPOINT,
-                {
-                    "address": home_address,
-                    "electionId": 7000,
-                    "key": settings.CIVIC_KEY,
-                },
-            )
-        if response.status_code != 200:
-            logger.warning(
-                f"Got {response.status_code} from civic query on {home_address}"
-            )
-            return f"Failure querying data source"
-        if map_type == "pp":
-            dest = response.json().get("pollingLocations", [])
-            if not dest:
-                logger.info(
-                    f"{number}: No election day location for {address_full}: {dest}"
-                )
-                return f"No election day location for {address_full}"
-            dest = dest[0]
-        elif map_type == "ev":
-            dest = response.json().get("earlyVoteSites", [])
-            if not dest:
-                logger.info(f"{number}: No early_vote location for {address_full}")
-                return f"No early vote location for {address_full}"
-            dest = dest[0]
-        else:
-            return f"Unrecognized address type {map_type}"
-
-        dest_name = dest["address"]["locationName"]
-        dest_address = f"{dest['address']['line1']}, {dest['address']['city']}, {dest['address']['state']} {dest['address']['zip']}"
-        dest_hours = dest["pollingHours"]
-        if "longitude" not in dest or "latitude" not in dest:
-            logger.warning(f"Lon/lat missing from {dest_address} (pollproxy): {dest}")
-            return f"Lon/lat missing from {dest_address} (civic)"
-        dest_lon = dest["longitude"]
-        dest_lat = dest["latitude"]
-
-    formdata["dest_name"] = dest_name.upper()
-    formdata["dest_address"] = dest_address.upper()
-    formdata["dest_hours"] = dest_hours
-
-    # Pick a reasonable zoom level for the map, since mapbox pushes
-    # the markers to the very edge of the map.
-    #
-    # mapbox zoom levels are 1-20, and go by power of 2: +1 zoom means
-    # 1/4 of the map area.
-    dx = abs(float(dest_lon) - float(home[0]["location"]["lng"]))
-    dy = abs(float(dest_lat) - float(home[0]["location"]["lat"]))
-    if dx > dy:
-        d = dx
-    else:
-        d = dy
-    logd = math.log2(1.0 / d)
-    zoom = logd + 7.5
+    formdata["dest_name"] = dest["name"].upper()
+    formdata["dest_address"] = dest["address"].upper()
+    formdata["dest_hours"] = dest["hours"]
 
-    if HIRES:
-        size = "512x512"
-    else:
-        size = "256x256"
-        zoom -= 1.0
-
-    centerx = (float(dest_lon) + float(home[0]["location"]["lng"])) / 2
-    centery = (float(dest_lat) + float(home[0]["location"]["lat"])) / 2
-    map_loc = f"{centerx},{centery},{zoom}"
-
-    # fetch map
-    map_url = f"https://api.mapbox.com/styles/v1/mapbox/streets-v11/static/pin-s-home+00f({home_loc}),pin-s-p+f00({dest_lon},{dest_lat})/{map_loc}/{size}?access_token={settings.MAPBOX_KEY}"
-    response = requests.get(map_url)
-    if response.status_code != 200:
-        logger.warning(
-            f"{number}: Failed to fetch map, got status code {response.status_code}"
-        )
-        return "Failed to fetch map"
-    map_image = response.content
-    map_image_type = response.headers["content-type"]
-
-    # store map in s3
-    filename = str(uuid.uuid4()) + "." + map_image_type.split("/")[-1]
-    upload = s3_client.put_object(
-        Bucket=settings.MMS_ATTACHMENT_BUCKET,
-        Key=filename,
-        ContentType=map_image_type,
-        ACL="public-read",
-        Body=map_image,
-    )
-    if upload.get("ResponseMetadata", {}).get("HTTPStatusCode") != 200:
-        logger.warning(
-            f"{number}: Unable to push {filename} to {settings.MMS_ATTACHMENT_BUCKET}"
-        )
-        return "Unable to upload map"
-    stored_map_url = (
-        f"https://{settings.MMS_ATTACHMENT_BUCKET}.s3.amazonaws.com/{filename}"
+    # map
+    error, stored_map_url = get_map(
+        home[0]["location"]["lng"], home[0]["location"]["lat"], dest["lon"], dest["lat"]
     )
+    if error:
+        logger.warning(f"{number}: {error}")
+        return error, None, None
 
     # locator link
     locator_url = f"https://www.voteamerica.com/where-to-vote/?{urlencode({'address':home_address})}"
@@ -215,9 +345,29 @@ def send_map_mms(
         locator_url += f"&utm_medium=mms&utm_source=turnout&utm_campaign={blast.campaign}&source=va_mms_turnout_{blast.campaign}"
     formdata["locator_url"] = shorten_url(locator_url)
 
-    # send
-    number.send_sms(
-        content.format(**formdata), media_url=[stored_map_url], blast=blast,
+    return None, content.format(**formdata), [stored_map_url]
+
+
+@tracer.wrap()
+def prefetch_blast_destinations(
+    blast: Blast, statuses: List[str], lo: int = None, hi: int = None
+) -> None:
+    """
+    Warm the destination cache for the distinct addresses of a map blast's
+    recipients (in the given statuses, with an id in [lo, hi) if given).
+    """
+    recipients = blast.recipients.filter(
+        status__in=statuses, address_full__isnull=False
+    )
+    if lo is not None:
+        recipients = recipients.filter(id__gte=lo, id__lt=hi)
+    addresses = (
+        recipients.order_by("address_full")
+        .values_list("address_full", flat=True)
+        .distinct()
+        .iterator()
+    )
+    found = prefetch_destinations(addresses)
+    logger.info(
+        f"Prefetched destinations for {found} addresses [{lo}, {hi}) for {blast}"
     )
-    logger.info(f"Sent {map_type} map for {address_full} (blast {blast}) to {number}")
-    return None
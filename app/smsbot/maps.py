@@ -0,0 +1,280 @@
+# Destinations (polling places and early vote sites) and rendered maps for
+# map MMS messages, with shared caching.
+#
+# Thousands of recipients of a map blast often share a destination, and
+# many share a map, so:
+#  - destination lookups (pollproxy or the Google Civic API) are cached in
+#    redis, keyed by the normalized home address;
+#  - maps are stored in the MMS bucket under a name derived from the
+#    (rounded) home, destination, zoom and size, so the same map is only
+#    fetched from mapbox and uploaded once; the stored URL is also cached
+#    in redis, so usually we don't even need to check the bucket.
+import hashlib
+import itertools
+import logging
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from botocore.exceptions import ClientError  # type: ignore
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from common.analytics import statsd
+from common.apm import tracer
+from common.aws import s3_client
+from common.geocode import geocode_batch
+from common.http import get_session
+from common.rollouts import get_feature_bool
+
+logger = logging.getLogger("smsbot")
+
+DNC_API_ENDPOINT = "https://locator-api.voteamerica.com/lookup"
+CIVIC_API_ENDPOINT = "https://www.googleapis.com/civicinfo/v2/voterinfo"
+
+HIRES = True  # 512x512 or 256x256?
+
+# 5 decimal places is ~1m, which does not visibly move a pin
+COORD_PRECISION = 5
+ZOOM_PRECISION = 2
+
+PREFETCH_CHUNK_SIZE = 1000
+
+# a destination is a dict of name, address, hours, lon, lat and source;
+# lon/lat may be None.  Each address maps to {"pp": dest, "ev": dest}.
+Destination = Dict[str, Any]
+
+
+def normalize_address(address: str) -> str:
+    address = re.sub(r"\s*,\s*", ", ", address.strip().lower())
+    return re.sub(r"\s+", " ", address)
+
+
+def destination_cache_key(address: str, source: str) -> str:
+    h = hashlib.sha256(f"{source}:{normalize_address(address)}".encode()).hexdigest()
+    return f"mms_destinations:{h}"
+
+
+def parse_dnc_destination(dest: Dict[str, Any]) -> Destination:
+    return {
+        "name": dest["location_name"],
+        "address": f"{dest['address_line_1']}, {dest['city']}, {dest['state']} {dest['zip']}",
+        "hours": dest["dates_hours"],
+        "lon": dest.get("lon"),
+        "lat": dest.get("lat"),
+        "source": "pollproxy",
+    }
+
+
+def parse_civic_destination(dest: Dict[str, Any]) -> Destination:
+    return {
+        "name": dest["address"]["locationName"],
+        "address": f"{dest['address']['line1']}, {dest['address']['city']}, {dest['address']['state']} {dest['address']['zip']}",
+        "hours": dest["pollingHours"],
+        "lon": dest.get("longitude"),
+        "lat": dest.get("latitude"),
+        "source": "civic",
+    }
+
+
+def query_destinations(
+    address: str, source: str
+) -> Optional[Dict[str, Optional[Destination]]]:
+    if source == "pollproxy":
+        with tracer.trace("pollproxy.lookup", service="pollproxy"):
+            response = get_session("pollproxy").get(
+                DNC_API_ENDPOINT, params={"address": address}
+            )
+        if response.status_code != 200:
+            logger.warning(f"Got {response.status_code} from dnc query on {address}")
+            return None
+        data = response.json().get("data", {})
+        pp = data.get("election_day_locations", [])
+        ev = data.get("early_vote_locations", [])
+        parse = parse_dnc_destination
+    else:
+        with tracer.trace("civicapi.voterlookup", service="google"):
+            response = get_session("civic").get(
+                CIVIC_API_ENDPOINT,
+                params={
+                    "address": address,
+                    "electionId": 7000,
+                    "key": settings.CIVIC_KEY,
+                },
+            )
+        if response.status_code != 200:
+            logger.warning(f"Got {response.status_code} from civic query on {address}")
+            return None
+        data = response.json()
+        pp = data.get("pollingLocations", [])
+        ev = data.get("earlyVoteSites", [])
+        parse = parse_civic_destination
+
+    return {
+        "pp": parse(pp[0]) if pp else None,
+        "ev": parse(ev[0]) if ev else None,
+    }
+
+
+@tracer.wrap()
+def get_destinations(
+    address: str, state: str
+) -> Optional[Dict[str, Optional[Destination]]]:
+    """
+    Get the polling place ("pp") and early vote ("ev") destinations for a
+    (home) address; either may be None if there isn't one.  Returns None if
+    the lookup failed (failures are not cached).
+    """
+    source = "pollproxy" if get_feature_bool("locate_use_dnc_data", state) else "civic"
+    key = destination_cache_key(address, source)
+    destinations = cache.get(key)
+    if destinations is not None:
+        statsd.increment("turnout.smsbot.maps.destination_cache.hit")
+        return destinations
+
+    statsd.increment("turnout.smsbot.maps.destination_cache.miss")
+    destinations = query_destinations(address, source)
+    if destinations is not None:
+        cache.set(key, destinations, settings.MMS_DESTINATION_CACHE_SECONDS)
+    return destinations
+
+
+def map_params(
+    home_lon: float, home_lat: float, dest_lon: float, dest_lat: float
+) -> Tuple[float, float, float, float, float, str]:
+    """
+    The (rounded) home and destination coordinates, zoom and size of the
+    map for a pair of locations.
+    """
+    home_lon = round(float(home_lon), COORD_PRECISION)
+    home_lat = round(float(home_lat), COORD_PRECISION)
+    dest_lon = round(float(dest_lon), COORD_PRECISION)
+    dest_lat = round(float(dest_lat), COORD_PRECISION)
+
+    # Pick a reasonable zoom level for the map, since mapbox pushes
+    # the markers to the very edge of the map.
+    #
+    # mapbox zoom levels are 1-20, and go by power of 2: +1 zoom means
+    # 1/4 of the map area.
+    d = max(abs(dest_lon - home_lon), abs(dest_lat - home_lat))
+    # (the same point, at our precision)
+    d = max(d, 10 ** -COORD_PRECISION)
+    logd = math.log2(1.0 / d)
+    zoom = logd + 7.5
+
+    if HIRES:
+        size = "512x512"
+    else:
+        size = "256x256"
+        zoom -= 1.0
+
+    return home_lon, home_lat, dest_lon, dest_lat, round(zoom, ZOOM_PRECISION), size
+
+
+def map_key(params: Tuple[float, float, float, float, float, str]) -> str:
+    h = hashlib.sha256(repr(params).encode()).hexdigest()
+    return f"{settings.MMS_MAP_PREFIX}{h}"
+
+
+def map_url(key: str) -> str:
+    return f"https://{settings.MMS_ATTACHMENT_BUCKET}.s3.amazonaws.com/{key}"
+
+
+def map_stored(key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=settings.MMS_ATTACHMENT_BUCKET, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+            raise
+        return False
+
+
+@tracer.wrap()
+def get_map(
+    home_lon: float, home_lat: float, dest_lon: float, dest_lat: float
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get a (public) URL for a map of home and destination; returns
+    (error, url).
+    """
+    params = map_params(home_lon, home_lat, dest_lon, dest_lat)
+    key = map_key(params)
+    cache_key = f"mms_map:{key}"
+    if cache.get(cache_key):
+        statsd.increment("turnout.smsbot.maps.map_cache.hit")
+        return None, map_url(key)
+    if map_stored(key):
+        statsd.increment("turnout.smsbot.maps.map_cache.stored")
+        cache.set(cache_key, True, settings.MMS_MAP_CACHE_SECONDS)
+        return None, map_url(key)
+    statsd.increment("turnout.smsbot.maps.map_cache.miss")
+
+    home_lon, home_lat, dest_lon, dest_lat, zoom, size = params
+    centerx = (dest_lon + home_lon) / 2
+    centery = (dest_lat + home_lat) / 2
+    map_loc = f"{centerx},{centery},{zoom}"
+
+    # fetch map
+    url = f"https://api.mapbox.com/styles/v1/mapbox/streets-v11/static/pin-s-home+00f({home_lon},{home_lat}),pin-s-p+f00({dest_lon},{dest_lat})/{map_loc}/{size}?access_token={settings.MAPBOX_KEY}"
+    response = get_session("mapbox").get(url)
+    if response.status_code != 200:
+        logger.warning(f"Failed to fetch map, got status code {response.status_code}")
+        return "Failed to fetch map", None
+
+    # store map in s3
+    upload = s3_client.put_object(
+        Bucket=settings.MMS_ATTACHMENT_BUCKET,
+        Key=key,
+        ContentType=response.headers["content-type"],
+        ACL="public-read",
+        Body=response.content,
+    )
+    if upload.get("ResponseMetadata", {}).get("HTTPStatusCode") != 200:
+        logger.warning(f"Unable to push {key} to {settings.MMS_ATTACHMENT_BUCKET}")
+        return "Unable to upload map", None
+
+    cache.set(cache_key, True, settings.MMS_MAP_CACHE_SECONDS)
+    return None, map_url(key)
+
+
+def _prefetch_destinations(home: Tuple[str, str]) -> bool:
+    # runs on a worker thread; don't leave that thread's db connections
+    # open behind us
+    address, state = home
+    try:
+        return get_destinations(address, state) is not None
+    except Exception as e:
+        logger.warning(f"Failed to prefetch destinations for {address}: {e}")
+        return False
+    finally:
+        connections.close_all()
+
+
+@tracer.wrap()
+def prefetch_destinations(addresses: Iterable[str]) -> int:
+    """
+    Look up (and cache) the destinations for many addresses at once: the
+    addresses are geocoded in bulk (which also warms the geocode cache),
+    then their destinations are looked up MMS_PREFETCH_CONCURRENCY at a
+    time.  Returns the number of addresses with destinations.
+    """
+    found = 0
+    addresses = iter(addresses)
+    with ThreadPoolExecutor(max_workers=settings.MMS_PREFETCH_CONCURRENCY) as executor:
+        while True:
+            # (executor.map would queue up every address at once)
+            chunk = list(itertools.islice(addresses, PREFETCH_CHUNK_SIZE))
+            if not chunk:
+                break
+            homes = [
+                (address, results[0]["address_components"]["state"])
+                for address, (results, _) in zip(
+                    chunk, geocode_batch([{"q": address} for address in chunk])
+                )
+                if results
+            ]
+            found += sum(executor.map(_prefetch_destinations, homes))
+    return found
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.17 on 2021-01-08 18:42
+
+import common.enums
+import common.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsbot', '0011_blast_new_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blast',
+            name='failed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blast',
+            name='queued_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blast',
+            name='recipient_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blast',
+            name='sent_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blast',
+            name='skipped_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blast',
+            name='snapshot_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='BlastRecipient',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region=None)),
+                ('map_type', models.TextField(blank=True, null=True)),
+                ('address_full', models.TextField(blank=True, null=True)),
+                ('status', common.fields.TurnoutEnumField(default='pending', enum=common.enums.BlastRecipientStatus)),
+                ('blast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='smsbot.Blast')),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('blast', 'phone')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='blastrecipient',
+            index=models.Index(fields=['blast', 'status', 'id'], name='blastrecipient_dispatch_idx'),
+        ),
+    ]
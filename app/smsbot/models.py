@@ -1,16 +1,24 @@
 import logging
 import time
 import uuid
+from typing import List, Tuple
 
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
-from django.db import connections, models
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 from requests.exceptions import ConnectionError
 from twilio.rest import Client as TwilioClient
 
+from common.analytics import statsd
 from common.apm import tracer
-from common.enums import BlastType, MessageDirectionType, SMSDeliveryStatus
+from common.enums import (
+    BlastRecipientStatus,
+    BlastType,
+    MessageDirectionType,
+    SMSDeliveryStatus,
+)
 from common.fields import TurnoutEnumField
 from common.utils.models import TimestampModel, UUIDModel
 
@@ -109,6 +117,26 @@ class Number(TimestampModel):
                         f"Failed to send via twilio (attempt {tries}): {e} ({msg})"
                     )
                     time.sleep(tries)
+            return msg
+
+
+# recipients in these states have not been handed to twilio yet
+DISPATCHABLE_RECIPIENT_STATUSES = [
+    BlastRecipientStatus.PENDING,
+    BlastRecipientStatus.QUEUED,
+]
+
+# recipients already texted for a blast (e.g., before the blast's audience
+# was snapshotted) are marked sent rather than texted again
+MARK_ALREADY_SENT_SQL = """
+UPDATE smsbot_blastrecipient r
+SET status = %s, modified_at = now()
+FROM smsbot_smsmessage m
+WHERE r.blast_id = %s
+  AND r.status = %s
+  AND m.blast_id = r.blast_id
+  AND m.phone_id = r.phone
+"""
 
 
 class Blast(TimestampModel, UUIDModel):
@@ -118,6 +146,14 @@ class Blast(TimestampModel, UUIDModel):
     campaign = models.CharField(max_length=100, null=True)
     blast_type = TurnoutEnumField(BlastType, null=True)
 
+    # audience snapshot and dispatch progress
+    snapshot_at = models.DateTimeField(null=True, blank=True)
+    recipient_count = models.IntegerField(default=0)
+    queued_count = models.IntegerField(default=0)
+    sent_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+
     class Meta(object):
         ordering = ["-created_at"]
 
@@ -133,42 +169,187 @@ class Blast(TimestampModel, UUIDModel):
             return cursor.fetchall()[0][0]
 
     @tracer.wrap()
-    def enqueue(self, test_phone: str = None):
-        from .tasks import trigger_blast_sms, trigger_blast_mms_map
+    def snapshot(self) -> None:
+        """
+        Materialize the blast's audience as BlastRecipient rows.
+
+        The blast query is streamed from the replica with a server-side
+        cursor and written in batches of BLAST_SNAPSHOT_BATCH_SIZE.  The
+        (blast, phone) unique constraint drops duplicate numbers, so an
+        interrupted snapshot can simply be run again.  Once complete
+        (snapshot_at is set) the audience is fixed.
+        """
+        if self.snapshot_at:
+            return
+
+        logger.info(f"Snapshotting audience for {self}")
+        total = 0
+        with transaction.atomic(using="readonly"):
+            with connections["readonly"].chunked_cursor() as cursor:
+                cursor.execute(self.sql.format(blast_id=str(self.uuid),))
+                columns = [col[0] for col in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(settings.BLAST_SNAPSHOT_BATCH_SIZE)
+                    if not rows:
+                        break
+                    recipients = []
+                    for row in rows:
+                        r = dict(zip(columns, row))
+                        if not r.get("phone"):
+                            continue
+                        recipients.append(
+                            BlastRecipient(
+                                blast=self,
+                                phone=r["phone"],
+                                map_type=r.get("map_type"),
+                                address_full=r.get("address_full"),
+                            )
+                        )
+                    BlastRecipient.objects.bulk_create(
+                        recipients, ignore_conflicts=True
+                    )
+                    total += len(rows)
+                    logger.info(f"Snapshotted {total} rows for {self}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                MARK_ALREADY_SENT_SQL,
+                [
+                    BlastRecipientStatus.SENT.value,
+                    self.pk,
+                    BlastRecipientStatus.PENDING.value,
+                ],
+            )
+            already_sent = cursor.rowcount
+
+        self.recipient_count = self.recipients.count()
+        self.sent_count = self.recipients.filter(
+            status=BlastRecipientStatus.SENT
+        ).count()
+        self.snapshot_at = timezone.now()
+        self.save(
+            update_fields=[
+                "recipient_count",
+                "sent_count",
+                "snapshot_at",
+                "modified_at",
+            ]
+        )
+        statsd.increment("turnout.smsbot.blast.snapshot_recipients", total)
+        logger.info(
+            f"Snapshotted {self.recipient_count} recipients for {self} ({already_sent} already sent)"
+        )
+
+    def dispatch_ranges(self, statuses, step: int = None) -> List[Tuple[int, int]]:
+        """
+        Split the recipients in the given statuses into (at most)
+        BLAST_DISPATCH_SHARDS contiguous id ranges [lo, hi), or, with step,
+        into ranges of that many ids.
+        """
+        bounds = self.recipients.filter(status__in=statuses).aggregate(
+            lo=models.Min("id"), hi=models.Max("id")
+        )
+        if bounds["lo"] is None:
+            return []
+        lo, hi = bounds["lo"], bounds["hi"] + 1
+        if not step:
+            step = max(1, -(-(hi - lo) // settings.BLAST_DISPATCH_SHARDS))
+        return [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+    @tracer.wrap()
+    def enqueue(self, test_phone: str = None, requeue: bool = False):
+        """
+        Send the blast.
+
+        The audience is snapshotted (if it has not been already) and its
+        pending recipients are split across BLAST_DISPATCH_SHARDS dispatch
+        tasks.  Calling this again resumes the blast: only recipients that
+        are still pending are dispatched.  With requeue, recipients that
+        were queued but never sent (e.g., because their tasks were lost),
+        and those whose send stalled for BLAST_SENDING_TIMEOUT seconds
+        (e.g., because the worker died), are dispatched again too; a
+        recipient is only ever sent once.
+        """
+        from .tasks import (
+            trigger_blast_mms_map,
+            trigger_blast_prefetch,
+            trigger_blast_sms,
+        )
 
         if self.blast_type == BlastType.SMS and test_phone:
             trigger_blast_sms.delay(self.pk, test_phone, force_dup=True)
             return
 
-        with connections["readonly"].cursor() as cursor:
-            cursor.execute(self.sql.format(blast_id=str(self.uuid),))
-            columns = [col[0] for col in cursor.description]
-            if test_phone:
-                logger.info(f"Enqueueing test message for {self} to {test_phone}")
-            else:
-                logger.info(f"Enqueueing {cursor.rowcount} messages for {self}")
-            for row in cursor.fetchall():
+        if test_phone:
+            if self.blast_type != BlastType.MMS_MAP:
+                logger.error(f"unrecognized blast_type {self.blast_type} for {self}")
+                return
+            with connections["readonly"].cursor() as cursor:
+                cursor.execute(self.sql.format(blast_id=str(self.uuid),))
+                columns = [col[0] for col in cursor.description]
+                row = cursor.fetchone()
+            if row:
                 r = dict(zip(columns, row))
-                if self.blast_type == BlastType.SMS:
-                    trigger_blast_sms.delay(self.pk, r["phone"])  # type: ignore
-                elif self.blast_type == BlastType.MMS_MAP:
-                    if test_phone:
-                        trigger_blast_mms_map.delay(
-                            self.pk,
-                            test_phone,
-                            r["map_type"],  # type: ignore
-                            r["address_full"],  # type: ignore
-                            force_dup=True,
-                        )
-                    else:
-                        trigger_blast_mms_map.delay(
-                            self.pk, r["phone"], r["map_type"], r["address_full"]  # type: ignore
-                        )
-                else:
-                    logger.error(
-                        f"unrecognized blast_type {self.blast_type} for {self}"
-                    )
-                if test_phone:
-                    break
-            if not test_phone:
-                logger.info(f"Done enqueueing {cursor.rowcount} messages for {self}")
+                logger.info(f"Enqueueing test message for {self} to {test_phone}")
+                trigger_blast_mms_map.delay(
+                    self.pk,
+                    test_phone,
+                    r["map_type"],
+                    r["address_full"],
+                    force_dup=True,
+                )
+            return
+
+        if self.blast_type not in (BlastType.SMS, BlastType.MMS_MAP):
+            logger.error(f"unrecognized blast_type {self.blast_type} for {self}")
+            return
+
+        self.snapshot()
+
+        statuses = [BlastRecipientStatus.PENDING.value]
+        if requeue:
+            statuses.append(BlastRecipientStatus.QUEUED.value)
+            statuses.append(BlastRecipientStatus.SENDING.value)
+        if self.blast_type == BlastType.MMS_MAP:
+            # look up destinations ahead of the sends, in parallel with them;
+            # this is best-effort, and a send looks up anything it missed
+            ranges = self.dispatch_ranges(
+                statuses, step=settings.MMS_PREFETCH_SHARD_SIZE
+            )
+            for lo, hi in ranges:
+                trigger_blast_prefetch.delay(self.pk, statuses, lo, hi)
+        self.dispatch(statuses)
+
+    def dispatch(self, statuses: List[str]) -> None:
+        from .tasks import dispatch_blast_recipients
+
+        ranges = self.dispatch_ranges(statuses)
+        for lo, hi in ranges:
+            dispatch_blast_recipients.delay(self.pk, lo, hi, statuses)
+        logger.info(f"Dispatching {self} in {len(ranges)} shards")
+
+
+class BlastRecipient(TimestampModel):
+    id = models.BigAutoField(primary_key=True)
+    blast = models.ForeignKey(
+        Blast, on_delete=models.deletion.CASCADE, related_name="recipients"
+    )
+    phone = PhoneNumberField()
+    map_type = models.TextField(null=True, blank=True)
+    address_full = models.TextField(null=True, blank=True)
+    status = TurnoutEnumField(
+        BlastRecipientStatus, default=BlastRecipientStatus.PENDING
+    )
+
+    class Meta(object):
+        ordering = ["id"]
+        # a blast never texts a number twice
+        unique_together = [("blast", "phone")]
+        indexes = [
+            models.Index(
+                fields=["blast", "status", "id"], name="blastrecipient_dispatch_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"BlastRecipient - {self.blast_id} {self.phone} ({self.status})"
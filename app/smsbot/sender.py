@@ -0,0 +1,154 @@
+# Bulk sender for blast messages.
+#
+# Number.send_sms() does a db insert, a blocking twilio call and a db
+# update for each message.  send_messages() instead records a batch of
+# messages with one bulk insert and one bulk update, and submits them to
+# twilio concurrently (SMS_SEND_CONCURRENCY at a time) over a pooled
+# connection.  Submissions are paced by a token bucket that every worker
+# shares, sized to the messaging service's throughput (TWILIO_MPS), so
+# blasts go as fast as twilio allows no matter how many workers send
+# them.  When twilio throttles us anyway (429), the shared bucket is
+# paused, so every worker backs off, not just the one that got the 429.
+# Each kind of message can also have its own (lower) rate, e.g., for MMS:
+# see BLAST_SEND_RATES.
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from requests.exceptions import ConnectionError
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client as TwilioClient
+
+from common.analytics import statsd
+from common.apm import tracer
+from common.http import get_session
+from common.ratelimit import TokenBucket
+
+from .models import SMSMessage
+
+logger = logging.getLogger("smsbot")
+
+# the most we back off after a 429, in seconds
+MAX_BACKOFF = 30
+
+
+class SendError(Exception):
+    pass
+
+
+def get_bucket(rate_limit: str = None) -> TokenBucket:
+    """
+    The bucket shared by everything we send, or with rate_limit, the bucket
+    for that kind of message (a key of BLAST_SEND_RATES).
+    """
+    if rate_limit:
+        return TokenBucket(rate_limit, settings.BLAST_SEND_RATES[rate_limit])
+    return TokenBucket("twilio", settings.TWILIO_MPS)
+
+
+def get_client() -> TwilioClient:
+    http_client = TwilioHttpClient()
+    http_client.session = get_session("twilio")
+    return TwilioClient(
+        settings.TWILIO_ACCOUNT_SID,
+        settings.TWILIO_AUTH_TOKEN,
+        http_client=http_client,
+    )
+
+
+def submit(
+    client: TwilioClient,
+    bucket: TokenBucket,
+    msg: SMSMessage,
+    rate_bucket: TokenBucket = None,
+) -> str:
+    """
+    Submit one (already recorded) message to twilio; returns its sid.  The
+    message takes a token from rate_bucket (once), if given, and then from
+    bucket (on every attempt).
+    """
+    if rate_bucket and not rate_bucket.acquire(timeout=settings.SMS_SEND_TOKEN_TIMEOUT):
+        raise SendError(f"Timed out waiting for {rate_bucket.name} to send {msg}")
+    tries = 0
+    while True:
+        tries += 1
+        if not bucket.acquire(timeout=settings.SMS_SEND_TOKEN_TIMEOUT):
+            raise SendError(f"Timed out waiting for rate limit to send {msg}")
+        try:
+            r = client.messages.create(
+                to=str(msg.phone_id),
+                messaging_service_sid=settings.TWILIO_MESSAGING_SERVICE_SID,
+                body=msg.message,
+                status_callback=msg.delivery_status_webhook(),
+                **(msg.kwargs or {}),
+            )
+            return r.sid
+        except TwilioRestException as e:
+            if e.status != 429 or tries > settings.SMS_SEND_MAX_RETRIES:
+                raise
+            backoff = min(2 ** tries, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+            logger.info(
+                f"Throttled by twilio (attempt {tries}), backing off {backoff:.1f}s"
+            )
+            statsd.increment("turnout.smsbot.sender.throttled")
+            bucket.pause(backoff)
+        except ConnectionError as e:
+            if tries > settings.SMS_SEND_MAX_RETRIES:
+                raise
+            logger.info(f"Failed to send via twilio (attempt {tries}): {e} ({msg})")
+            time.sleep(tries)
+
+
+@tracer.wrap()
+def send_messages(
+    messages: List[SMSMessage], rate_limit: str = None
+) -> List[Optional[Exception]]:
+    """
+    Record and send a batch of (unsaved) outgoing messages, paced by the
+    rate_limit bucket (see get_bucket()) as well as twilio's.  Returns, for
+    each message, None if it was sent or the exception that kept it from
+    being sent.
+    """
+    if not messages:
+        return []
+
+    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
+        logger.warning(f"No twilio credentials, not sending {len(messages)} sms")
+        return [SendError("No twilio credentials") for _ in messages]
+
+    SMSMessage.objects.bulk_create(messages)
+
+    client = get_client()
+    bucket = get_bucket()
+    rate_bucket = get_bucket(rate_limit) if rate_limit else None
+    results: List[Optional[Exception]] = []
+    with ThreadPoolExecutor(
+        max_workers=min(settings.SMS_SEND_CONCURRENCY, len(messages))
+    ) as executor:
+        futures = [
+            executor.submit(submit, client, bucket, msg, rate_bucket)
+            for msg in messages
+        ]
+        for msg, future in zip(messages, futures):
+            try:
+                msg.twilio_sid = future.result()
+                results.append(None)
+            except Exception as e:
+                logger.warning(f"Failed to send {msg}: {e}")
+                results.append(e)
+
+    now = timezone.now()
+    sent = [msg for msg in messages if msg.twilio_sid]
+    for msg in sent:
+        msg.modified_at = now
+    SMSMessage.objects.bulk_update(sent, ["twilio_sid", "modified_at"])
+
+    statsd.increment("turnout.smsbot.sender.sent", len(sent))
+    if len(sent) < len(messages):
+        statsd.increment("turnout.smsbot.sender.error", len(messages) - len(sent))
+    return results
@@ -1,5 +1,6 @@
 import datetime
 import logging
+from typing import List
 
 from celery import shared_task
 from django.conf import settings
@@ -84,3 +85,49 @@ def trigger_blast_mms_map(
     blast = Blast.objects.get(uuid=blast_id)
     number, _ = Number.objects.get_or_create(pk=phone)
     send_blast_mms_map(blast, number, map_type, address_full, force_dup=force_dup)
+
+
+@shared_task
+@statsd.timed("turnout.smsbot.tasks.dispatch_blast_recipients")
+def dispatch_blast_recipients(blast_id: str, lo: int, hi: int, statuses: List[str]):
+    from .blast import dispatch_recipients
+
+    blast = Blast.objects.get(uuid=blast_id)
+    dispatch_recipients(blast, lo, hi, statuses)
+
+
+@shared_task(queue="geocode")
+@statsd.timed("turnout.smsbot.tasks.trigger_blast_prefetch")
+def trigger_blast_prefetch(
+    blast_id: str, statuses: List[str], lo: int = None, hi: int = None
+) -> None:
+    from .blast import prefetch_blast_destinations
+
+    blast = Blast.objects.get(uuid=blast_id)
+    try:
+        prefetch_blast_destinations(blast, statuses, lo, hi)
+    except Exception as e:
+        # the sends look up whatever we didn't get to
+        logger.warning(f"Failed to prefetch destinations for {blast}: {e}")
+    finally:
+        if lo is None:
+            # enqueued (for the whole blast) before blasts dispatched
+            # themselves; remove this after the next release
+            blast.dispatch(statuses)
+
+
+# routed to blast-sms or blast-mms (depending on the blast type) at dispatch
+@shared_task
+def trigger_blast_batch(recipient_ids: List[int]) -> None:
+    from .blast import send_blast_batch
+
+    send_blast_batch(recipient_ids)
+
+
+# Kept for the tasks already enqueued when blasts moved to batches; remove
+# it after the next release.
+@shared_task
+def trigger_blast_recipient(recipient_id: int) -> None:
+    from .blast import send_blast_batch
+
+    send_blast_batch([recipient_id])
@@ -0,0 +1,223 @@
+import datetime
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+from model_bakery import baker
+
+from common.enums import BlastRecipientStatus, BlastType, MessageDirectionType
+from smsbot.blast import dispatch_recipients, send_blast_batch
+from smsbot.models import Blast, BlastRecipient, Number, SMSMessage
+
+
+@pytest.fixture
+def blast():
+    return baker.make(
+        Blast, blast_type=BlastType.SMS, content="Go vote!", snapshot_at=timezone.now()
+    )
+
+
+def make_recipients(blast, count):
+    return [
+        BlastRecipient.objects.create(blast=blast, phone=f"+1617555{i:04d}")
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_dispatch_recipients(blast, mocker, settings):
+    settings.BLAST_DISPATCH_SHARDS = 1
+    settings.SMS_SEND_BATCH_SIZE = 2
+    trigger = mocker.patch("smsbot.tasks.trigger_blast_batch.apply_async")
+    recipients = make_recipients(blast, 5)
+    ids = [r.id for r in recipients]
+
+    assert dispatch_recipients(blast, ids[0], ids[3], ["pending"]) == 3
+    assert trigger.call_count == 2
+    trigger.assert_any_call(args=(ids[0:2],), queue="blast-sms")
+    trigger.assert_any_call(args=(ids[2:3],), queue="blast-sms")
+
+    # resuming only picks up what is still pending
+    ranges = blast.dispatch_ranges([BlastRecipientStatus.PENDING])
+    assert ranges == [(ids[3], ids[4] + 1)]
+    assert dispatch_recipients(blast, *ranges[0], ["pending"]) == 2
+    trigger.assert_any_call(args=(ids[3:5],), queue="blast-sms")
+
+    blast.refresh_from_db()
+    assert blast.queued_count == 5
+    assert not BlastRecipient.objects.filter(status=BlastRecipientStatus.PENDING)
+
+
+@pytest.mark.django_db
+def test_send_blast_batch(blast, mocker, settings):
+    settings.TWILIO_ACCOUNT_SID = "AC123"
+    settings.TWILIO_AUTH_TOKEN = "token"
+    client = mocker.patch("smsbot.sender.get_client").return_value
+    client.messages.create.return_value.sid = "SM123"
+    mocker.patch("smsbot.sender.get_bucket")
+
+    sent, opted_out = make_recipients(blast, 2)
+    Number.objects.create(phone=opted_out.phone, opt_out_time=timezone.now())
+
+    send_blast_batch([sent.id, opted_out.id])
+    # already claimed
+    send_blast_batch([sent.id, opted_out.id])
+
+    assert client.messages.create.call_count == 1
+    assert client.messages.create.call_args[1]["to"] == str(sent.phone)
+    msg = SMSMessage.objects.get(blast=blast)
+    assert msg.phone_id == sent.phone
+    assert msg.twilio_sid == "SM123"
+
+    sent.refresh_from_db()
+    assert sent.status == BlastRecipientStatus.SENT
+    opted_out.refresh_from_db()
+    assert opted_out.status == BlastRecipientStatus.SKIPPED
+    blast.refresh_from_db()
+    assert blast.sent_count == 1
+    assert blast.skipped_count == 1
+
+
+@pytest.mark.django_db
+def test_send_blast_batch_failed(blast, mocker, settings):
+    settings.TWILIO_ACCOUNT_SID = "AC123"
+    settings.TWILIO_AUTH_TOKEN = "token"
+    client = mocker.patch("smsbot.sender.get_client").return_value
+    client.messages.create.side_effect = Exception("nope")
+    mocker.patch("smsbot.sender.get_bucket")
+
+    recipient = make_recipients(blast, 1)[0]
+    send_blast_batch([recipient.id])
+
+    recipient.refresh_from_db()
+    assert recipient.status == BlastRecipientStatus.FAILED
+    blast.refresh_from_db()
+    assert blast.failed_count == 1
+
+
+@pytest.mark.django_db
+def test_send_blast_batch_stalled(blast, mocker, settings):
+    settings.TWILIO_ACCOUNT_SID = "AC123"
+    settings.TWILIO_AUTH_TOKEN = "token"
+    settings.BLAST_SENDING_TIMEOUT = 60
+    client = mocker.patch("smsbot.sender.get_client").return_value
+    client.messages.create.return_value.sid = "SM123"
+    mocker.patch("smsbot.sender.get_bucket")
+
+    sending, stalled, texted = make_recipients(blast, 3)
+    BlastRecipient.objects.filter(pk=sending.pk).update(
+        status=BlastRecipientStatus.SENDING
+    )
+    BlastRecipient.objects.filter(pk__in=[stalled.pk, texted.pk]).update(
+        status=BlastRecipientStatus.SENDING,
+        modified_at=timezone.now() - datetime.timedelta(seconds=120),
+    )
+    number = Number.objects.create(phone=texted.phone)
+    SMSMessage.objects.create(
+        phone=number,
+        direction=MessageDirectionType.OUT,
+        blast=blast,
+        message="Go vote!",
+    )
+
+    send_blast_batch([sending.id, stalled.id, texted.id])
+
+    # only the abandoned recipient that was never texted is sent again
+    assert client.messages.create.call_count == 1
+    assert client.messages.create.call_args[1]["to"] == str(stalled.phone)
+    sending.refresh_from_db()
+    assert sending.status == BlastRecipientStatus.SENDING
+    stalled.refresh_from_db()
+    assert stalled.status == BlastRecipientStatus.SENT
+    texted.refresh_from_db()
+    assert texted.status == BlastRecipientStatus.SENT
+
+
+@pytest.mark.django_db
+def test_snapshot(mocker, settings):
+    settings.BLAST_SNAPSHOT_BATCH_SIZE = 2
+    # there is no replica in tests
+    mocker.patch("smsbot.models.connections", {"readonly": connection})
+    mocker.patch("smsbot.models.transaction")
+    blast = baker.make(
+        Blast,
+        blast_type=BlastType.MMS_MAP,
+        content="Go",
+        sql="""
+SELECT * FROM (VALUES
+    ('+16175550000', 'pp', '1 Main St'),
+    ('+16175550001', 'ev', '2 Main St'),
+    ('+16175550000', 'pp', '1 Main St'),
+    (NULL, NULL, NULL),
+    ('+16175550002', 'pp', '3 Main St')
+) AS t (phone, map_type, address_full)
+WHERE '{blast_id}' <> ''
+""",
+    )
+    number = Number.objects.create(phone="+16175550002")
+    SMSMessage.objects.create(
+        phone=number, direction=MessageDirectionType.OUT, blast=blast, message="Go"
+    )
+
+    blast.snapshot()
+
+    recipients = list(blast.recipients.order_by("phone"))
+    assert [str(r.phone) for r in recipients] == [
+        "+16175550000",
+        "+16175550001",
+        "+16175550002",
+    ]
+    assert recipients[0].map_type == "pp"
+    assert recipients[0].address_full == "1 Main St"
+    assert [r.status for r in recipients] == [
+        BlastRecipientStatus.PENDING,
+        BlastRecipientStatus.PENDING,
+        BlastRecipientStatus.SENT,
+    ]
+    blast.refresh_from_db()
+    assert blast.snapshot_at
+    assert blast.recipient_count == 3
+    assert blast.sent_count == 1
+
+    # the audience is fixed once snapshotted
+    blast.sql = "SELECT '+16175550003' AS phone"
+    blast.snapshot()
+    assert blast.recipients.count() == 3
+
+
+@pytest.mark.django_db
+def test_enqueue_map_blast(mocker, settings):
+    settings.MMS_PREFETCH_SHARD_SIZE = 2
+    blast = baker.make(
+        Blast, blast_type=BlastType.MMS_MAP, content="Go", snapshot_at=timezone.now()
+    )
+    ids = [r.id for r in make_recipients(blast, 3)]
+    prefetch = mocker.patch("smsbot.tasks.trigger_blast_prefetch.delay")
+    dispatch = mocker.patch("smsbot.tasks.dispatch_blast_recipients.delay")
+
+    blast.enqueue()
+
+    # prefetching is chunked, and doesn't hold up the sends
+    assert prefetch.call_args_list == [
+        mocker.call(blast.pk, ["pending"], ids[0], ids[0] + 2),
+        mocker.call(blast.pk, ["pending"], ids[0] + 2, ids[2] + 1),
+    ]
+    assert dispatch.called
+
+
+@pytest.mark.django_db
+def test_prefetch_best_effort(mocker):
+    from smsbot.tasks import trigger_blast_prefetch
+
+    blast = baker.make(Blast, blast_type=BlastType.MMS_MAP, content="Go")
+    mocker.patch(
+        "smsbot.blast.prefetch_blast_destinations", side_effect=Exception("down")
+    )
+    dispatch = mocker.patch.object(Blast, "dispatch")
+
+    trigger_blast_prefetch(blast.pk, ["pending"], 1, 10)
+    dispatch.assert_not_called()
+
+    # a whole-blast prefetch enqueued before an upgrade still dispatches
+    trigger_blast_prefetch(blast.pk, ["pending"])
+    dispatch.assert_called_once_with(["pending"])
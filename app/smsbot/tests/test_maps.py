@@ -0,0 +1,107 @@
+import pytest
+from botocore.exceptions import ClientError
+from django.core.cache.backends.locmem import LocMemCache
+
+from smsbot.maps import (
+    DNC_API_ENDPOINT,
+    get_destinations,
+    get_map,
+    map_key,
+    map_params,
+    normalize_address,
+)
+
+DNC_RESPONSE = {
+    "data": {
+        "election_day_locations": [
+            {
+                "location_name": "Town Hall",
+                "address_line_1": "1 Main St",
+                "city": "Springfield",
+                "state": "MA",
+                "zip": "01101",
+                "dates_hours": "7am-8pm",
+                "lon": -72.59,
+                "lat": 42.10,
+            }
+        ],
+        "early_vote_locations": [],
+    }
+}
+
+
+@pytest.fixture
+def maps_cache(mocker):
+    cache = LocMemCache("maps", {})
+    mocker.patch("smsbot.maps.cache", cache)
+    yield cache
+
+
+def test_normalize_address():
+    assert (
+        normalize_address("  10 Main St ,Springfield,  MA 01101 ")
+        == "10 main st, springfield, ma 01101"
+    )
+
+
+def test_get_destinations_cached(requests_mock, maps_cache, mocker):
+    mocker.patch("smsbot.maps.get_feature_bool", return_value=True)
+    requests_mock.register_uri("GET", DNC_API_ENDPOINT, json=DNC_RESPONSE)
+
+    destinations = get_destinations("10 Main St, Springfield, MA 01101", "MA")
+    assert destinations["pp"]["name"] == "Town Hall"
+    assert destinations["pp"]["address"] == "1 Main St, Springfield, MA 01101"
+    assert destinations["ev"] is None
+
+    # the same address, formatted differently
+    assert get_destinations("10 MAIN ST,SPRINGFIELD, MA 01101", "MA") == destinations
+    assert requests_mock.call_count == 1
+
+
+def test_get_destinations_failure_not_cached(requests_mock, maps_cache, mocker):
+    mocker.patch("smsbot.maps.get_feature_bool", return_value=True)
+    requests_mock.register_uri("GET", DNC_API_ENDPOINT, status_code=500)
+
+    assert get_destinations("10 Main St, Springfield, MA 01101", "MA") is None
+    assert get_destinations("10 Main St, Springfield, MA 01101", "MA") is None
+    assert requests_mock.call_count == 2
+
+
+def test_map_params_rounded():
+    a = map_params(-72.5900001, 42.1000001, -72.58, 42.11)
+    b = map_params(-72.5900002, 42.1000002, -72.58, 42.11)
+    assert a == b
+    assert map_key(a) == map_key(b)
+
+
+def test_get_map_already_stored(maps_cache, mocker, settings):
+    settings.MMS_ATTACHMENT_BUCKET = "mms-bucket"
+    s3 = mocker.patch("smsbot.maps.s3_client")
+    fetch = mocker.patch("smsbot.maps.get_session")
+
+    error, url = get_map(-72.59, 42.10, -72.58, 42.11)
+    assert error is None
+    assert url.startswith("https://mms-bucket.s3.amazonaws.com/maps/")
+    s3.put_object.assert_not_called()
+    fetch.assert_not_called()
+
+    # and then we don't even check the bucket
+    assert get_map(-72.59, 42.10, -72.58, 42.11) == (None, url)
+    assert s3.head_object.call_count == 1
+
+
+def test_get_map_upload(maps_cache, mocker, settings):
+    settings.MMS_ATTACHMENT_BUCKET = "mms-bucket"
+    s3 = mocker.patch("smsbot.maps.s3_client")
+    s3.head_object.side_effect = ClientError({"Error": {"Code": "404"}}, "HeadObject")
+    s3.put_object.return_value = {"ResponseMetadata": {"HTTPStatusCode": 200}}
+    response = mocker.patch("smsbot.maps.get_session").return_value.get.return_value
+    response.status_code = 200
+    response.content = b"png"
+    response.headers = {"content-type": "image/png"}
+
+    error, url = get_map(-72.59, 42.10, -72.58, 42.11)
+    assert error is None
+    key = url.split(".com/")[1]
+    assert s3.put_object.call_args[1]["Key"] == key
+    assert s3.put_object.call_args[1]["Body"] == b"png"
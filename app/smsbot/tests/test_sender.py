@@ -0,0 +1,82 @@
+import pytest
+from twilio.base.exceptions import TwilioRestException
+
+from smsbot.models import SMSMessage
+from smsbot.sender import SendError, submit
+
+
+@pytest.fixture
+def msg():
+    return SMSMessage(phone_id="+16175550000", message="hello", kwargs={})
+
+
+def test_submit(mocker, msg):
+    client = mocker.Mock()
+    client.messages.create.return_value.sid = "SM123"
+    bucket = mocker.Mock()
+
+    assert submit(client, bucket, msg) == "SM123"
+    bucket.acquire.assert_called_once()
+    assert client.messages.create.call_args[1]["body"] == "hello"
+
+
+def test_submit_throttled(mocker, msg, settings):
+    settings.SMS_SEND_MAX_RETRIES = 3
+    client = mocker.Mock()
+    client.messages.create.side_effect = [
+        TwilioRestException(429, "uri"),
+        mocker.Mock(sid="SM123"),
+    ]
+    bucket = mocker.Mock()
+
+    assert submit(client, bucket, msg) == "SM123"
+    # the whole (shared) bucket backs off, not just this thread
+    bucket.pause.assert_called_once()
+    assert bucket.acquire.call_count == 2
+
+
+def test_submit_throttled_gives_up(mocker, msg, settings):
+    settings.SMS_SEND_MAX_RETRIES = 1
+    client = mocker.Mock()
+    client.messages.create.side_effect = TwilioRestException(429, "uri")
+
+    with pytest.raises(TwilioRestException):
+        submit(client, mocker.Mock(), msg)
+    assert client.messages.create.call_count == 2
+
+
+def test_submit_error(mocker, msg):
+    client = mocker.Mock()
+    client.messages.create.side_effect = TwilioRestException(400, "uri")
+    bucket = mocker.Mock()
+
+    with pytest.raises(TwilioRestException):
+        submit(client, bucket, msg)
+    bucket.pause.assert_not_called()
+
+
+def test_submit_rate_bucket(mocker, msg, settings):
+    settings.SMS_SEND_MAX_RETRIES = 3
+    client = mocker.Mock()
+    client.messages.create.side_effect = [
+        TwilioRestException(429, "uri"),
+        mocker.Mock(sid="SM123"),
+    ]
+    bucket = mocker.Mock()
+    rate_bucket = mocker.Mock()
+
+    assert submit(client, bucket, msg, rate_bucket) == "SM123"
+    # one token per message from the message type's bucket, however many
+    # attempts it takes
+    rate_bucket.acquire.assert_called_once()
+    assert bucket.acquire.call_count == 2
+
+
+def test_submit_rate_bucket_timeout(mocker, msg):
+    client = mocker.Mock()
+    rate_bucket = mocker.Mock()
+    rate_bucket.acquire.return_value = False
+
+    with pytest.raises(SendError):
+        submit(client, mocker.Mock(), msg, rate_bucket)
+    client.messages.create.assert_not_called()
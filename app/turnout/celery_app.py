@@ -5,6 +5,7 @@ import celery
 import ddtrace
 import psycopg2
 import redis
+from celery.signals import worker_process_init
 
 from common.apm import tracer
 
@@ -13,7 +14,8 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "turnout.settings")
 if os.environ.get("DATADOG_API_KEY"):
     ddtrace.patch_all()
 
-app = celery.Celery("turnout")
+# all of our tasks honor the rate limits in BULK_QUEUE_RATE_LIMITS
+app = celery.Celery("turnout", task_cls="common.ratelimit:RateLimitedTask")
 
 if os.environ.get("DATADOG_API_KEY"):
     ddtrace.Pin.override(psycopg2, tracer=tracer)
@@ -25,6 +27,16 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def warm_region_geom(**kwargs):
+    from django.conf import settings
+
+    if settings.OFFICIAL_REGION_GEOM_WARM:
+        from official.region_geom import warm
+
+        warm()
+
+
 @app.task(bind=True)
 def debug_task(self):
     time.sleep(3)
@@ -74,6 +74,12 @@ CACHES = {
     }
 }
 
+# how long (seconds) a process trusts its snapshot of state information if
+# it can't listen for invalidations (see election.snapshot)
+STATE_SNAPSHOT_MAX_AGE = env.int("STATE_SNAPSHOT_MAX_AGE", 60)
+# ... and even if it can, in case its connection has silently died
+STATE_SNAPSHOT_LISTENING_MAX_AGE = env.int("STATE_SNAPSHOT_LISTENING_MAX_AGE", 600)
+
 ##### END CACHE CONFIGURATION
 
 
@@ -136,6 +142,7 @@ FIRST_PARTY_APPS = [
     "celery_admin",
     "voter",
     "polling_place",
+    "cdn",
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + FIRST_PARTY_APPS
@@ -217,12 +224,20 @@ REST_FRAMEWORK = {
 
 #### CELERY CONFIGURATION
 
-# how often to recalculate subscriber stats
-CALC_STATS_INTERVAL = 5
+# how often to flush the subscriber stats counters (minutes)
+SUBSCRIBER_STATS_FLUSH_INTERVAL = 1
 NETLIFY_TRIGGER_INTERVAL = 10
+# edits trigger netlify builds this long (seconds) after the first of them
+NETLIFY_TRIGGER_DEBOUNCE_SECONDS = env.int("NETLIFY_TRIGGER_DEBOUNCE_SECONDS", 60)
 
 # how often to check for delayed tasks (minutes)
 DELAYED_TASKS_INTERVAL = 2
+# delayed tasks are claimed (and sent) in batches of this size, by up to
+# this many concurrent deliverers
+DELAYED_TASKS_BATCH_SIZE = env.int("DELAYED_TASKS_BATCH_SIZE", default=500)
+DELAYED_TASKS_DELIVERERS = env.int("DELAYED_TASKS_DELIVERERS", default=4)
+# how long to keep delivered delayed tasks (days)
+DELAYED_TASKS_RETENTION_DAYS = env.int("DELAYED_TASKS_RETENTION_DAYS", default=90)
 
 # specify a max_loop_interval AND lock timeout that ensure we don't
 # pause too long during/after a redeploy
@@ -242,13 +257,13 @@ CELERY_TASK_SERIALIZER = "json"
 # which means that all items effecively run at the rate of the slowest
 # rate limit.
 #
+# Instead, each of these queues has a token bucket in redis (see
+# common.ratelimit), refilled at one token per interval (seconds), and
+# each task delivered from one of them takes a token before it runs.
+#
 # Benefits:
 #  - a global rate limit, regardless of worker scale
 #  - rate limits can vary
-# Caveats:
-#  - very high rates are inefficient since we are generating tokens
-#    regardless of whether there is work to do.
-BULK_TOKEN_QUEUE = "tokens"
 BULK_QUEUE_RATE_LIMITS = {
     "voter": 1 / 10,
     "voter-wi": 1,
@@ -256,13 +271,11 @@ BULK_QUEUE_RATE_LIMITS = {
     "movers": 1 / 5,
     "geocode": 1 / 10,
     "lob-status-updates": 1 / 10,
-    "blast-mms": 1 / 14,
-    "blast-sms": 1 / 300,
 }
 
-BULK_QUEUE_TOKEN_SECONDS = 5  # schedule this far into the future for non-empty queues
-BULK_QUEUE_TOKEN_SLOP = 2  # overschedule a bit to accomodate jitter in beat
-BULK_QUEUE_SLACK = 1  # schedule slack
+# a task that waits this long (seconds) for a token goes to the back of its
+# queue, freeing up the worker for other queues
+BULK_QUEUE_MAX_WAIT = env.int("BULK_QUEUE_MAX_WAIT", 10)
 
 
 CELERY_TASK_DEFAULT_QUEUE = "default"
@@ -274,7 +287,6 @@ CELERY_TASK_QUEUES = {
     Queue("geocode", routing_key="geocode.#"),
     Queue("actionnetwork", routing_key="actionnetwork.#"),
     Queue("lob-status-updates", routing_key="lob.#"),
-    Queue(BULK_TOKEN_QUEUE),
 }
 
 CELERY_TASK_ROUTES = {
@@ -306,21 +318,26 @@ CELERY_BEAT_SCHEDULE = {
         "task": "election.tasks.trigger_netlify_if_updates",
         "schedule": crontab(minute=f"*/{NETLIFY_TRIGGER_INTERVAL}"),
     },
-    "trigger-calc-subscriber-stats": {
-        "task": "reporting.tasks.calc_all_subscriber_stats",
-        "schedule": crontab(minute=f"*/{CALC_STATS_INTERVAL}"),
+    "trigger-flush-subscriber-stats": {
+        "task": "reporting.tasks.flush_subscriber_stats",
+        "schedule": crontab(minute=f"*/{SUBSCRIBER_STATS_FLUSH_INTERVAL}"),
+    },
+    "trigger-reconcile-subscriber-stats": {
+        "task": "reporting.tasks.reconcile_subscriber_stats",
+        "schedule": crontab(minute=15, hour=9),
     },
     "trigger-deliver-delayed-tasks": {
         "task": "common.tasks.deliver_delayed_tasks",
         "schedule": crontab(minute=f"*/{DELAYED_TASKS_INTERVAL}"),
     },
-    "trigger-queue-bulk-tokens": {
-        "task": "common.tasks.enqueue_tokens",
-        "schedule": BULK_QUEUE_TOKEN_SECONDS,
-        "args": (BULK_QUEUE_TOKEN_SECONDS + BULK_QUEUE_TOKEN_SLOP, BULK_QUEUE_SLACK),
-    },
 }
 
+if DELAYED_TASKS_RETENTION_DAYS:
+    CELERY_BEAT_SCHEDULE["trigger-prune-delayed-tasks"] = {
+        "task": "common.tasks.prune_delayed_tasks",
+        "schedule": crontab(minute=50, hour=3),
+    }
+
 CELERY_TIMEZONE = "UTC"
 
 DJANGO_CELERY_RESULTS = {"ALLOW_EDITS": False}
@@ -455,6 +472,10 @@ CORS_ORIGIN_REGEX_WHITELIST = [
 CLOUDFLARE_ENABLED = env.bool("CLOUDFLARE_ENABLED", default=False)
 CLOUDFLARE_TOKEN = env.str("CLOUDFLARE_TOKEN", default="")
 CLOUDFLARE_ZONE = env.str("CLOUDFLARE_ZONE", default="")
+# Cloudflare accepts up to 30 cache tags per purge request
+CLOUDFLARE_PURGE_MAX_TAGS = 30
+# cache tag purges are queued and sent this long after the first of them
+CDN_PURGE_DEBOUNCE_SECONDS = env.int("CDN_PURGE_DEBOUNCE_SECONDS", default=10)
 
 #### END CLOUDFLARE CONFIGURATION
 
@@ -672,6 +693,17 @@ USVF_GEOCODE = env.bool("USVF_GEOCODE", default=False)
 USVF_SYNC = env.bool("USVF_SYNC", False)
 USVF_SYNC_HOUR = env.int("USVF_SYNC_HOUR", 6)
 USVF_SYNC_MINUTE = env.int("USVF_SYNC_MINUTE", 30)
+# changes are written in batches of this size, one transaction each
+USVF_SYNC_BATCH_SIZE = env.int("USVF_SYNC_BATCH_SIZE", 500)
+# how long to keep the journal of changes made by each sync
+USVF_SYNC_JOURNAL_DAYS = env.int("USVF_SYNC_JOURNAL_DAYS", 90)
+
+# how often each process checks whether its in-memory region index (and
+# region boundary layers) are stale
+OFFICIAL_REGION_INDEX_CHECK_SECONDS = env.int("OFFICIAL_REGION_INDEX_CHECK_SECONDS", 60)
+# load the region boundary layers when each celery worker process starts,
+# rather than on first use
+OFFICIAL_REGION_GEOM_WARM = env.bool("OFFICIAL_REGION_GEOM_WARM", False)
 
 if USVF_SYNC:
     CELERY_BEAT_SCHEDULE["trigger-usvf-sync"] = {
@@ -712,10 +744,36 @@ MANAGEMENT_NOTIFICATION_FROM = env.str(
 
 #### END MANAGEMENT INTERFACE CONFIGURATION
 
+#### REPORTING CONFIGURATION
+
+# rows fetched per round trip from the server-side report cursor
+REPORT_CURSOR_ITERSIZE = env.int("REPORT_CURSOR_ITERSIZE", 2000)
+# update Report.row_count every this many rows
+REPORT_PROGRESS_INTERVAL = env.int("REPORT_PROGRESS_INTERVAL", 10000)
+# incremental reports fall back to a full snapshot if the last one is older
+REPORT_INCREMENTAL_SNAPSHOT_DAYS = env.int("REPORT_INCREMENTAL_SNAPSHOT_DAYS", 7)
+# how often to refresh the materialized subscriber report views (minutes)
+REPORT_VIEW_REFRESH_INTERVAL = env.int("REPORT_VIEW_REFRESH_INTERVAL", 15)
+
+CELERY_BEAT_SCHEDULE["trigger-refresh-report-views"] = {
+    "task": "reporting.tasks.refresh_report_views",
+    "schedule": crontab(minute=f"*/{REPORT_VIEW_REFRESH_INTERVAL}"),
+}
+
+#### END REPORTING CONFIGURATION
+
 #### ACTION CONFIGURATION
 
 ACTION_CHECK_UNFINISHED_DELAY = env.int("ACTION_CHECK_UNFINISHED_DELAY", 900)
 
+# compare the action_details rollup with the events for recently active
+# actions (0 checks every action)
+ACTION_DETAILS_CHECK_DAYS = env.int("ACTION_DETAILS_CHECK_DAYS", 2)
+CELERY_BEAT_SCHEDULE["check-action-details"] = {
+    "task": "action.tasks.check_action_details",
+    "schedule": crontab(minute=35, hour=4),
+}
+
 #### END ACTION CONFIGURATION
 
 #### TWILIO CONFIGURATION
@@ -746,12 +804,67 @@ if SMS_OPTOUT_POLL:
     }
 
 MMS_ATTACHMENT_BUCKET = env.str("MMS_ATTACHMENT_BUCKET", None)
+# rendered maps are stored in the attachment bucket under this prefix
+MMS_MAP_PREFIX = env.str("MMS_MAP_PREFIX", "maps/")
+MMS_MAP_CACHE_SECONDS = env.int("MMS_MAP_CACHE_SECONDS", 60 * 60 * 24 * 7)
+# polling place/early vote site lookups, by home address
+MMS_DESTINATION_CACHE_SECONDS = env.int("MMS_DESTINATION_CACHE_SECONDS", 60 * 60 * 6)
+MMS_PREFETCH_CONCURRENCY = env.int("MMS_PREFETCH_CONCURRENCY", 10)
+# map blasts prefetch destinations in tasks covering this many recipient ids
+MMS_PREFETCH_SHARD_SIZE = env.int("MMS_PREFETCH_SHARD_SIZE", 10000)
+
+# throughput (messages/second) of the messaging service, shared by all
+# workers sending blasts
+TWILIO_MPS = env.float("TWILIO_MPS", 300)
+# Throughput (messages/second) for each kind of blast, by queue.  Blast
+# tasks send SMS_SEND_BATCH_SIZE messages each, so these are applied to each
+# message as it is sent (see smsbot.sender), not to the tasks as
+# BULK_QUEUE_RATE_LIMITS would.
+BLAST_SEND_RATES = {
+    "blast-mms": env.float("BLAST_MMS_MPS", 14),
+    "blast-sms": env.float("BLAST_SMS_MPS", 300),
+}
+# messages per blast send task, and how many of them are submitted at once
+SMS_SEND_BATCH_SIZE = env.int("SMS_SEND_BATCH_SIZE", 100)
+SMS_SEND_CONCURRENCY = env.int("SMS_SEND_CONCURRENCY", 20)
+# retries for a message twilio throttles (429) or we fail to reach
+SMS_SEND_MAX_RETRIES = env.int("SMS_SEND_MAX_RETRIES", 3)
+# give up on a message if we wait this long for the rate limit
+SMS_SEND_TOKEN_TIMEOUT = env.int("SMS_SEND_TOKEN_TIMEOUT", 60)
+# a blast recipient still being sent after this many seconds is assumed to
+# have been abandoned (e.g., its worker died), and a requeue picks it up
+BLAST_SENDING_TIMEOUT = env.int("BLAST_SENDING_TIMEOUT", 1800)
+
+# blast audiences are streamed from the replica in batches of this many rows
+BLAST_SNAPSHOT_BATCH_SIZE = env.int("BLAST_SNAPSHOT_BATCH_SIZE", 5000)
+# number of tasks a blast's recipients are split across for dispatch
+BLAST_DISPATCH_SHARDS = env.int("BLAST_DISPATCH_SHARDS", 8)
+# recipients claimed (and enqueued) per round trip by each dispatch task
+BLAST_DISPATCH_BATCH_SIZE = env.int("BLAST_DISPATCH_BATCH_SIZE", 1000)
 
 #### END TWILIO CONFIGURATION
 
 #### GEOCODIO CONFIGURATION
 
 GEOCODIO_KEY = env.str("GEOCODIO_KEY", default=None)
+# geocode_batch() sends this many addresses per request (geocod.io allows
+# up to 10k), with up to this many requests in flight
+GEOCODE_BATCH_SIZE = env.int("GEOCODE_BATCH_SIZE", 10000)
+GEOCODE_BATCH_CONCURRENCY = env.int("GEOCODE_BATCH_CONCURRENCY", 4)
+
+# cache geocode results (in redis, backed by the common_geocoderesult table)
+GEOCODE_CACHE_ENABLED = env.bool("GEOCODE_CACHE_ENABLED", default=False)
+GEOCODE_CACHE_TTL_SECONDS = env.int("GEOCODE_CACHE_TTL_SECONDS", 60 * 60 * 24 * 30)
+# how long to remember addresses geocod.io says are bogus
+GEOCODE_CACHE_NEGATIVE_TTL_SECONDS = env.int(
+    "GEOCODE_CACHE_NEGATIVE_TTL_SECONDS", 60 * 60 * 24
+)
+
+if GEOCODE_CACHE_ENABLED:
+    CELERY_BEAT_SCHEDULE["trigger-purge-expired-geocode-results"] = {
+        "task": "common.tasks.purge_expired_geocode_results",
+        "schedule": crontab(minute=20, hour=3),
+    }
 
 #### END GEOCODIO CONFIGURATION
 
@@ -761,6 +874,14 @@ PDF_GENERATION_LAMBDA_ENABLED = env.bool("PDF_GENERATION_LAMBDA_ENABLED", defaul
 PDF_GENERATION_LAMBDA_FUNCTION = env.str(
     "PDF_GENERATION_LAMBDA_FUNCTION", default="pdf-filler-local-fill"
 )
+# If set, templates are sent to the lambda by reference to this bucket
+# (see common.pdf.templatestore) rather than inline
+PDF_TEMPLATE_STORE_BUCKET = env.str("PDF_TEMPLATE_STORE_BUCKET", default="")
+PDF_TEMPLATE_STORE_PREFIX = env.str(
+    "PDF_TEMPLATE_STORE_PREFIX", default="pdf-templates/"
+)
+PDF_BATCH_CONCURRENCY = env.int("PDF_BATCH_CONCURRENCY", default=8)
+PDF_BATCH_SIZE = env.int("PDF_BATCH_SIZE", default=50)
 
 #### END PDF GENERATION CONFIGURATION
 
@@ -866,6 +987,9 @@ FAX_GATEWAY_SQS_QUEUE = env.str("FAX_GATEWAY_SQS_QUEUE", default=None)
 #### ACTIONNETWORK CONFIGURATION
 
 ACTIONNETWORK_KEY = env.str("ACTIONNETWORK_KEY", default=None)
+ACTIONNETWORK_API_URL = env.str(
+    "ACTIONNETWORK_API_URL", "https://actionnetwork.org/api/v2/"
+)
 ACTIONNETWORK_FORM_CACHE_TIMEOUT = env.int(
     "ACTIONNETWORK_FORM_CACHE_TIMEOUT", 24 * 60 * 60
 )
@@ -880,6 +1004,15 @@ ACTIONNETWORK_SYNC_MINUTE = env.int("ACTIONNETWORK_SYNC_MINUTE", 45)
 # sleep between (batch) syncs
 ACTIONNETWORK_SYNC_DELAY = env.float("ACTIONNETWORK_SYNC_DELAY", 0.5)
 
+# The batch sync posts to each key concurrently, but no faster than
+# ActionNetwork's per-key rate limit (requests/second), which it shares with
+# the realtime syncs and (un)subscribes to that key.  Each sync task
+# runs for at most ACTIONNETWORK_SYNC_MAX_SECONDS before requeueing itself.
+ACTIONNETWORK_SYNC_RATE = env.float("ACTIONNETWORK_SYNC_RATE", 4)
+ACTIONNETWORK_SYNC_CONCURRENCY = env.int("ACTIONNETWORK_SYNC_CONCURRENCY", 4)
+ACTIONNETWORK_SYNC_BATCH_SIZE = env.int("ACTIONNETWORK_SYNC_BATCH_SIZE", 500)
+ACTIONNETWORK_SYNC_MAX_SECONDS = env.int("ACTIONNETWORK_SYNC_MAX_SECONDS", 600)
+
 if ACTIONNETWORK_SYNC and ACTIONNETWORK_SYNC_DAILY:
     CELERY_BEAT_SCHEDULE["trigger-actionnetwork-sync"] = {
         "task": "integration.tasks.sync_actionnetwork",
@@ -964,6 +1097,11 @@ VOTER_RECHECK_INTERVAL_DAYS = 7
 # give up eventually
 VOTER_RECHECK_MAX_DAYS = 90
 
+# synchronous checks look up actions in batches, querying the voter files
+# with this many concurrent requests
+VOTER_LOOKUP_BATCH_SIZE = env.int("VOTER_LOOKUP_BATCH_SIZE", default=100)
+VOTER_LOOKUP_CONCURRENCY = env.int("VOTER_LOOKUP_CONCURRENCY", default=8)
+
 # CELERY_BEAT_SCHEDULE["trigger-voter-check-new-actions"] = {
 #     "task": "voter.tasks.check_new_actions",
 #     "schedule": crontab(minute=f"*/{VOTER_CHECK_INTERVAL_MINUTES}"),
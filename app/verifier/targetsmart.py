@@ -1,9 +1,9 @@
 import logging
 
-import requests
 from django.conf import settings
 
 from common.apm import tracer
+from common.http import get_session as get_http_session
 from common.utils.format import remove_special_characters
 
 # targetsmart says they only allow alphanumerics, but we should still include address punctuation
@@ -16,23 +16,9 @@ TARGETSMART_ENDPOINT = "https://api.targetsmart.com/voter/voter-registration-che
 
 
 def get_session():
-    from requests.adapters import HTTPAdapter
-    from requests.packages.urllib3.util.retry import Retry
-
-    session = requests.Session()
-    session.headers["x-api-key"] = settings.TARGETSMART_KEY
-    session.mount(
-        "https://",
-        HTTPAdapter(
-            max_retries=Retry(
-                total=1,
-                backoff_factor=1,
-                status_forcelist=[500, 502, 503, 504],
-                method_whitelist=["HEAD", "GET"],
-            )
-        ),
+    return get_http_session(
+        "targetsmart", headers={"x-api-key": settings.TARGETSMART_KEY}
     )
-    return session
 
 
 def query_targetsmart(serializer_data):
@@ -0,0 +1,350 @@
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import sentry_sdk
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+from action.models import Action
+from common.analytics import statsd
+from common.apm import tracer
+from smsbot.models import Number
+from verifier.targetsmart import query_targetsmart
+
+from .models import Voter
+from .state import lookup_state
+
+logger = logging.getLogger("voter")
+
+LOOKUP_ITEM_TYPES = ["BallotRequest", "Registration", "Lookup", "ReminderRequest"]
+
+# (ts_id, ts_result, state_voter_id, state_result)
+VoterfileMatch = Tuple[Optional[str], Optional[Dict[str, Any]], Optional[str], Any]
+
+# everything update_voter() may change
+VOTER_UPDATE_FIELDS = [
+    "ts_voterbase_id",
+    "state_voter_id",
+    "phone",
+    "email",
+    "registered",
+    "registration_date",
+    "last_registration_refresh",
+    "ts_result",
+    "last_ts_refresh",
+    "state_result",
+    "last_state_refresh",
+    "first_name",
+    "middle_name",
+    "last_name",
+    "suffix",
+    "date_of_birth",
+    "address_full",
+    "city",
+    "zipcode",
+    "modified_at",
+]
+
+
+def query_voterfiles(item) -> VoterfileMatch:
+    # targetsmart
+    ts_id = None
+    ts_result = None
+    ts = query_targetsmart(
+        {
+            "first_name": item.first_name,
+            "last_name": item.last_name,
+            "address1": item.address1,
+            "address2": item.address2,
+            "city": item.city,
+            "state": item.state_id,
+            "zipcode": item.zipcode,
+            "date_of_birth": item.date_of_birth,
+        }
+    )
+    for ts_result in ts.get("result_set", []):
+        ts_id = ts_result.get("vb.voterbase_id")
+        break
+
+    # per-state query?
+    state_voter_id, state_result = lookup_state(item)
+
+    # add future voterfile lookups here...
+
+    return ts_id, ts_result, state_voter_id, state_result
+
+
+def update_voter(voter: Voter, item, match: VoterfileMatch) -> None:
+    ts_id, ts_result, state_voter_id, state_result = match
+
+    # update external links
+    if ts_id:
+        if voter.ts_voterbase_id:
+            if voter.ts_voterbase_id != ts_id:
+                logger.warning(
+                    f"{voter} ts_voterbase_id {voter.ts_voterbase_id} -> {ts_id}"
+                )
+        else:
+            logger.info(f"Expanded {voter} match to include TS voterbase")
+        voter.ts_voterbase_id = ts_id
+
+    if state_voter_id:
+        if voter.state_voter_id:
+            if voter.state_voter_id != state_voter_id:
+                logger.warning(
+                    f"{voter} state_voter_id {voter.state_voter_id} -> {state_voter_id}"
+                )
+        else:
+            logger.info(
+                f"Expanded {voter} match to include {voter.state_voter_id} state_voter_id {state_voter_id}"
+            )
+        voter.state_voter_id = state_voter_id
+
+    # refresh voter info
+    if item.phone:
+        if voter.phone and voter.phone != item.phone:
+            logger.warning(f"Changed {voter} number {voter.phone} -> {item.phone}")
+        voter.phone = item.phone
+    if item.email:
+        if voter.email and voter.email != item.email:
+            logger.warning(f"Changed {voter} email {voter.email} -> {item.email}")
+        voter.email = item.email
+
+    # refresh registration
+    if ts_id:
+        try:
+            reg_date = datetime.datetime.strptime(
+                ts_result.get("vb.vf_registration_date"), "%Y%m%d"
+            ).replace(tzinfo=datetime.timezone.utc)
+            voter.refresh_registration_status(
+                ts_result.get("vb.voterbase_registration_status") == "Registered",
+                reg_date,
+                reg_date,  # we cannot assume this info is any newer than the date they first registered
+            )
+        except ValueError:
+            logger.warning(f"No registration date for {ts_id}: {ts_result}")
+        voter.ts_result = ts_result
+        voter.last_ts_refresh = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    if state_voter_id:
+        voter.last_state_refresh = datetime.datetime.now(tz=datetime.timezone.utc)
+        voter.refresh_registration_status(
+            state_result.active,
+            datetime.datetime(
+                state_result.registration_date.year,
+                state_result.registration_date.month,
+                state_result.registration_date.day,
+                0,
+                0,
+                0,
+                tzinfo=datetime.timezone.utc,
+            ),
+            voter.last_state_refresh,
+        )
+        voter.state_result = {k: str(v) for k, v in state_result.__dict__.items()}
+
+    # name
+    if ts_id:
+        voter.first_name = ts_result.get("vb.tsmart_first_name")
+        voter.middle_name = ts_result.get("vb.tsmart_middle_name")
+        voter.last_name = ts_result.get("vb.tsmart_last_name")
+        voter.suffix = ts_result.get("vb.tsmart_name_suffix")
+    elif state_voter_id:
+        # NOTE: we assume the first name has no space here...
+        names = state_result.full_name.split()
+        voter.first_name = names.pop(0)
+        voter.last_name = names.pop()
+        voter.middle_name = " ".join(names)
+
+    # other PII (prefer state)
+    if state_voter_id:
+        voter.date_of_birth = state_result.date_of_birth
+        voter.address_full = state_result.address
+        voter.city = state_result.city
+        voter.zipcode = state_result.zipcode
+    elif ts_id:
+        voter.date_of_birth = datetime.datetime.strptime(
+            ts_result.get("vb.voterbase_dob"), "%Y%m%d"
+        ).replace(tzinfo=datetime.timezone.utc)
+        voter.address_full = ts_result.get("vb.vf_reg_cass_address_full")
+        voter.city = ts_result.get("vb.vf_reg_cass_city")
+        voter.zipcode = ts_result.get("vb.vf_reg_cass_zip")
+
+
+@tracer.wrap()
+def lookup(item):
+    if type(item).__name__ not in LOOKUP_ITEM_TYPES:
+        return
+
+    match = query_voterfiles(item)
+    ts_id, _, state_voter_id, _ = match
+
+    # link
+    if ts_id or state_voter_id:
+        if item.phone:
+            Number.objects.get_or_create(phone=item.phone)
+
+        voter = None
+        if ts_id:
+            voter = Voter.objects.filter(
+                ts_voterbase_id=ts_id, state=item.state
+            ).first()
+        if state_voter_id and not voter:
+            voter = Voter.objects.filter(
+                state_voter_id=state_voter_id, state=item.state
+            ).first()
+
+        if not voter:
+            voter = Voter.objects.create(
+                ts_voterbase_id=ts_id, state_voter_id=state_voter_id, state=item.state,
+            )
+            logger.info(f"Matched new {voter} from action {item}")
+        else:
+            logger.info(f"Matched existing {voter} from action {item}")
+
+        update_voter(voter, item, match)
+        voter.save()
+
+        if item.action.voter != voter:
+            item.action.voter = voter
+
+    item.action.last_voter_lookup = datetime.datetime.now(tz=datetime.timezone.utc)
+    item.action.save()
+
+
+def _query_voterfiles(item) -> VoterfileMatch:
+    # runs on a worker thread; don't leave that thread's db connections
+    # (e.g., from the geocode cache) open behind us
+    try:
+        return query_voterfiles(item)
+    finally:
+        connections.close_all()
+
+
+class VoterIndex:
+    """
+    Voters matching a batch, by (state, ts_voterbase_id) and (state,
+    state_voter_id).  Like the single lookup, the newest voter wins.
+    """
+
+    def __init__(self, voters):
+        self.by_ts_id: Dict[Tuple[str, str], Voter] = {}
+        self.by_state_voter_id: Dict[Tuple[str, str], Voter] = {}
+        for voter in voters:
+            self.add(voter)
+
+    def add(self, voter: Voter) -> None:
+        if voter.ts_voterbase_id:
+            self.by_ts_id.setdefault((voter.state_id, voter.ts_voterbase_id), voter)
+        if voter.state_voter_id:
+            self.by_state_voter_id.setdefault(
+                (voter.state_id, voter.state_voter_id), voter
+            )
+
+    def get(self, state_id: str, ts_id: str, state_voter_id: str) -> Optional[Voter]:
+        voter = None
+        if ts_id:
+            voter = self.by_ts_id.get((state_id, ts_id))
+        if state_voter_id and not voter:
+            voter = self.by_state_voter_id.get((state_id, state_voter_id))
+        return voter
+
+
+@tracer.wrap()
+def lookup_batch(items: List[Any]) -> int:
+    """
+    Look up a batch of source items at once: the voter file queries run
+    concurrently (VOTER_LOOKUP_CONCURRENCY at a time), voters are resolved
+    with a single query, and all writes are done in bulk.
+
+    Each item's action should already be loaded (see
+    Action.get_source_items).  Items whose voter file queries fail are
+    skipped, and will be retried on a later run.  Returns the number of
+    items looked up.
+    """
+    items = [item for item in items if type(item).__name__ in LOOKUP_ITEM_TYPES]
+    if not items:
+        return 0
+
+    results: List[Tuple[Any, VoterfileMatch]] = []
+    with ThreadPoolExecutor(
+        max_workers=min(settings.VOTER_LOOKUP_CONCURRENCY, len(items))
+    ) as executor:
+        futures = [(item, executor.submit(_query_voterfiles, item)) for item in items]
+        for item, future in futures:
+            try:
+                results.append((item, future.result()))
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                logger.warning(f"Hit exception looking up {item}: {e}")
+                statsd.increment("turnout.voter.lookup_batch.error")
+
+    ts_ids = {match[0] for _, match in results if match[0]}
+    state_voter_ids = {match[2] for _, match in results if match[2]}
+    if ts_ids or state_voter_ids:
+        index = VoterIndex(
+            Voter.objects.filter(
+                Q(ts_voterbase_id__in=ts_ids) | Q(state_voter_id__in=state_voter_ids)
+            ).order_by("-created_at")
+        )
+    else:
+        index = VoterIndex([])
+
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    phones = set()
+    new_voters: Dict[Any, Voter] = {}
+    updated_voters: Dict[Any, Voter] = {}
+    actions = []
+    for item, match in results:
+        ts_id, _, state_voter_id, _ = match
+        action = item.action
+
+        if ts_id or state_voter_id:
+            if item.phone:
+                phones.add(item.phone)
+
+            voter = index.get(item.state_id, ts_id, state_voter_id)
+            if not voter:
+                voter = Voter(
+                    ts_voterbase_id=ts_id,
+                    state_voter_id=state_voter_id,
+                    state_id=item.state_id,
+                )
+                new_voters[voter.pk] = voter
+                logger.info(f"Matched new {voter} from action {item}")
+            else:
+                logger.info(f"Matched existing {voter} from action {item}")
+
+            update_voter(voter, item, match)
+            if voter.pk not in new_voters:
+                voter.modified_at = now
+                updated_voters[voter.pk] = voter
+            # later items in the batch may match on the ids we just added
+            index.add(voter)
+
+            action.voter = voter
+
+        action.last_voter_lookup = now
+        action.modified_at = now
+        actions.append(action)
+
+    with transaction.atomic():
+        if phones:
+            Number.objects.bulk_create(
+                [Number(phone=phone) for phone in phones], ignore_conflicts=True
+            )
+        if new_voters:
+            Voter.objects.bulk_create(new_voters.values())
+        if updated_voters:
+            Voter.objects.bulk_update(updated_voters.values(), VOTER_UPDATE_FIELDS)
+        if actions:
+            Action.objects.bulk_update(
+                actions, ["voter", "last_voter_lookup", "modified_at"]
+            )
+
+    statsd.increment("turnout.voter.lookup_batch.new_voter", len(new_voters))
+    statsd.increment("turnout.voter.lookup_batch.updated_voter", len(updated_voters))
+    return len(actions)
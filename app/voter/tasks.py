@@ -1,188 +1,39 @@
 import datetime
 import logging
+from typing import Iterable, List
 
 from celery import shared_task
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
 
 from action.models import Action
-from common.apm import tracer
 from common.rollouts import get_feature, get_feature_bool, get_feature_int
-from smsbot.models import Number
-from verifier.targetsmart import query_targetsmart
 
-from .models import Voter
-from .state import lookup_state
+from .lookup import lookup, lookup_batch
 
 logger = logging.getLogger("voter")
 
 
-@tracer.wrap()
-def lookup(item):
-    if type(item).__name__ not in [
-        "BallotRequest",
-        "Registration",
-        "Lookup",
-        "ReminderRequest",
-    ]:
-        return
-
-    # targetsmart
-    ts_id = None
-    ts = query_targetsmart(
-        {
-            "first_name": item.first_name,
-            "last_name": item.last_name,
-            "address1": item.address1,
-            "address2": item.address2,
-            "city": item.city,
-            "state": item.state_id,
-            "zipcode": item.zipcode,
-            "date_of_birth": item.date_of_birth,
-        }
-    )
-    for ts_result in ts.get("result_set", []):
-        ts_id = ts_result.get("vb.voterbase_id")
-        break
-
-    # per-state query?
-    state_voter_id, state_result = lookup_state(item)
-
-    # add future voterfile lookups here...
-
-    # link
-    if ts_id or state_voter_id:
-        if item.phone:
-            number, _ = Number.objects.get_or_create(phone=item.phone,)
-        else:
-            pass
-
-        voter = None
-
-        if ts_id and not voter:
-            try:
-                voter = Voter.objects.filter(
-                    ts_voterbase_id=ts_id, state=item.state
-                ).first()
-            except ObjectDoesNotExist:
-                pass
-        if state_voter_id and not voter:
-            try:
-                voter = Voter.objects.filter(
-                    state_voter_id=state_voter_id, state=item.state
-                ).first()
-            except ObjectDoesNotExist:
-                pass
-
-        if not voter:
-            voter = Voter.objects.create(
-                ts_voterbase_id=ts_id, state_voter_id=state_voter_id, state=item.state,
-            )
-            logger.info(f"Matched new {voter} from action {item}")
-        else:
-            logger.info(f"Matched existing {voter} from action {item}")
-
-        # update external links
-        if ts_id:
-            if voter.ts_voterbase_id:
-                if voter.ts_voterbase_id != ts_id:
-                    logger.warning(
-                        f"{voter} ts_voterbase_id {voter.ts_voterbase_id} -> {ts_id}"
-                    )
-            else:
-                logger.info(f"Expanded {voter} match to include TS voterbase")
-            voter.ts_voterbase_id = ts_id
-
-        if state_voter_id:
-            if voter.state_voter_id:
-                if voter.state_voter_id != state_voter_id:
-                    logger.warning(
-                        f"{voter} state_voter_id {voter.state_voter_id} -> {state_voter_id}"
-                    )
-            else:
-                logger.info(
-                    f"Expanded {voter} match to include {voter.state_voter_id} state_voter_id {state_voter_id}"
-                )
-            voter.state_voter_id = state_voter_id
-
-        # refresh voter info
-        if item.phone:
-            if voter.phone and voter.phone != item.phone:
-                logger.warning(f"Changed {voter} number {voter.phone} -> {item.phone}")
-            voter.phone = item.phone
-        if item.email:
-            if voter.email and voter.email != item.email:
-                logger.warning(f"Changed {voter} email {voter.email} -> {item.email}")
-            voter.email = item.email
-
-        # refresh registration
-        if ts_id:
-            try:
-                reg_date = datetime.datetime.strptime(
-                    ts_result.get("vb.vf_registration_date"), "%Y%m%d"
-                ).replace(tzinfo=datetime.timezone.utc)
-                voter.refresh_registration_status(
-                    ts_result.get("vb.voterbase_registration_status") == "Registered",
-                    reg_date,
-                    reg_date,  # we cannot assume this info is any newer than the date they first registered
-                )
-            except ValueError:
-                logger.warning(f"No registration date for {ts_id}: {ts_result}")
-            voter.ts_result = ts_result
-            voter.last_ts_refresh = datetime.datetime.now(tz=datetime.timezone.utc)
-
-        if state_voter_id:
-            voter.last_state_refresh = datetime.datetime.now(tz=datetime.timezone.utc)
-            voter.refresh_registration_status(
-                state_result.active,
-                datetime.datetime(
-                    state_result.registration_date.year,
-                    state_result.registration_date.month,
-                    state_result.registration_date.day,
-                    0,
-                    0,
-                    0,
-                    tzinfo=datetime.timezone.utc,
-                ),
-                voter.last_state_refresh,
-            )
-            voter.state_result = {k: str(v) for k, v in state_result.__dict__.items()}
-
-        # name
-        if ts_id:
-            voter.first_name = ts_result.get("vb.tsmart_first_name")
-            voter.middle_name = ts_result.get("vb.tsmart_middle_name")
-            voter.last_name = ts_result.get("vb.tsmart_last_name")
-            voter.suffix = ts_result.get("vb.tsmart_name_suffix")
-        elif state_voter_id:
-            # NOTE: we assume the first name has no space here...
-            names = state_result.full_name.split()
-            voter.first_name = names.pop(0)
-            voter.last_name = names.pop()
-            voter.middle_name = " ".join(names)
-
-        # other PII (prefer state)
-        if state_voter_id:
-            voter.date_of_birth = state_result.date_of_birth
-            voter.address_full = state_result.address
-            voter.city = state_result.city
-            voter.zipcode = state_result.zipcode
-        elif ts_id:
-            voter.date_of_birth = datetime.datetime.strptime(
-                ts_result.get("vb.voterbase_dob"), "%Y%m%d"
-            ).replace(tzinfo=datetime.timezone.utc)
-            voter.address_full = ts_result.get("vb.vf_reg_cass_address_full")
-            voter.city = ts_result.get("vb.vf_reg_cass_city")
-            voter.zipcode = ts_result.get("vb.vf_reg_cass_zip")
-
-        voter.save()
-
-        if item.action.voter != voter:
-            item.action.voter = voter
-
-    item.action.last_voter_lookup = datetime.datetime.now(tz=datetime.timezone.utc)
-    item.action.save()
+def lookup_actions(actions: Iterable[Action], stop: datetime.datetime) -> int:
+    """
+    Look up the actions' source items in batches of VOTER_LOOKUP_BATCH_SIZE,
+    until we run out of actions or time.  Returns the number of items
+    looked up.
+    """
+    checked = 0
+    batch: List[Action] = []
+    for action in actions:
+        batch.append(action)
+        if len(batch) < settings.VOTER_LOOKUP_BATCH_SIZE:
+            continue
+        checked += lookup_batch(Action.get_source_items(batch))
+        batch = []
+        if stop < datetime.datetime.utcnow():
+            logger.info(f"Hit max runtime at {stop}")
+            return checked
+    if batch:
+        checked += lookup_batch(Action.get_source_items(batch))
+    return checked
 
 
 @shared_task
@@ -235,25 +86,18 @@ def check_new_actions(
     query = query.order_by("created_at")
     if limit:
         query = query[:limit]
+    if not queue_async:
+        lookup_actions(query, stop)
+        return
     for action in query:
-        if queue_async:
-            if state == "WI":
-                voter_lookup_action.apply_async(
-                    args=(str(action.uuid),),
-                    expires=(max_minutes * 60),
-                    queue=f"voter-wi",
-                )
-            else:
-                voter_lookup_action.apply_async(
-                    args=(str(action.uuid),), expires=(max_minutes * 60)
-                )
+        if state == "WI":
+            voter_lookup_action.apply_async(
+                args=(str(action.uuid),), expires=(max_minutes * 60), queue=f"voter-wi",
+            )
         else:
-            item = action.get_source_item()
-            if item:
-                lookup(item)
-            if stop < datetime.datetime.utcnow():
-                logger.info(f"Hit max runtime ({max_minutes} minutes)")
-                break
+            voter_lookup_action.apply_async(
+                args=(str(action.uuid),), expires=(max_minutes * 60)
+            )
 
 
 @shared_task
@@ -379,28 +223,20 @@ def _recheck_old_actions(
     if limit:
         query = query[:limit]
 
+    if not queue_async:
+        return lookup_actions(query, stop)
+
     checked = 0
     for action in query:
-        if queue_async:
-            if state == "WI":
-                voter_lookup_action.apply_async(
-                    args=(str(action.uuid),),
-                    expires=(max_minutes * 60),
-                    queue=f"voter-wi",
-                )
-            else:
-                voter_lookup_action.apply_async(
-                    args=(str(action.uuid),), expires=(max_minutes * 60)
-                )
-            checked += 1
+        if state == "WI":
+            voter_lookup_action.apply_async(
+                args=(str(action.uuid),), expires=(max_minutes * 60), queue=f"voter-wi",
+            )
         else:
-            item = action.get_source_item()
-            if item:
-                lookup(item)
-                checked += 1
-            if stop < datetime.datetime.utcnow():
-                logger.info(f"Hit max runtime ({max_minutes} minutes)")
-                break
+            voter_lookup_action.apply_async(
+                args=(str(action.uuid),), expires=(max_minutes * 60)
+            )
+        checked += 1
 
     return checked
 
@@ -0,0 +1,81 @@
+import pytest
+from model_bakery import baker
+
+from action.models import Action
+from smsbot.models import Number
+from voter.lookup import lookup_batch
+from voter.models import Voter
+
+
+def ts_response(voterbase_id):
+    return {
+        "result_set": [
+            {
+                "vb.voterbase_id": voterbase_id,
+                "vb.vf_registration_date": "20100101",
+                "vb.voterbase_registration_status": "Registered",
+                "vb.tsmart_first_name": "FIRST",
+                "vb.tsmart_last_name": "LAST",
+                "vb.voterbase_dob": "19800101",
+            }
+        ]
+    }
+
+
+@pytest.fixture
+def voterfiles(mocker):
+    mocker.patch("voter.lookup.lookup_state", return_value=(None, None))
+    mocker.patch("voter.lookup.connections")
+    return mocker.patch("voter.lookup.query_targetsmart")
+
+
+@pytest.mark.django_db
+def test_lookup_batch(voterfiles):
+    state = baker.make_recipe("election.state", code="MA")
+    existing = Voter.objects.create(ts_voterbase_id="TS-1", state=state)
+
+    registrations = [
+        baker.make_recipe(
+            "register.registration",
+            state=state,
+            first_name=name,
+            phone="+16175551234" if name == "a" else None,
+        )
+        for name in ["a", "b", "c", "d"]
+    ]
+    responses = {
+        "a": ts_response("TS-1"),
+        "b": ts_response("TS-2"),
+        "c": ts_response("TS-2"),
+        "d": {"result_set": []},
+    }
+    voterfiles.side_effect = lambda data: responses[data["first_name"]]
+
+    items = Action.get_source_items([r.action for r in registrations])
+    assert lookup_batch(items) == 4
+
+    actions = {r.first_name: Action.objects.get(pk=r.action_id) for r in registrations}
+    assert actions["a"].voter == existing
+    # b and c match the same new voter
+    assert actions["b"].voter is not None
+    assert actions["b"].voter_id == actions["c"].voter_id
+    assert actions["d"].voter is None
+    assert all(a.last_voter_lookup for a in actions.values())
+
+    assert Voter.objects.count() == 2
+    existing.refresh_from_db()
+    assert existing.registered
+    assert existing.first_name == "FIRST"
+    assert str(existing.phone) == "+16175551234"
+    assert Number.objects.filter(phone="+16175551234").exists()
+
+
+@pytest.mark.django_db
+def test_lookup_batch_error(voterfiles):
+    registration = baker.make_recipe("register.registration", first_name="a")
+    voterfiles.side_effect = Exception("timeout")
+
+    assert lookup_batch(Action.get_source_items([registration.action])) == 0
+
+    registration.action.refresh_from_db()
+    assert registration.action.last_voter_lookup is None